@@ -0,0 +1,62 @@
+"""Micro-benchmark for perceptual-hash lookups in the media fingerprint index.
+
+Usage: python bench_fingerprints.py [stored_fingerprints] [max_distance]
+"""
+import random
+import sys
+import time
+
+from media_fingerprints import HASH_BITS, MultiIndexHashIndex
+
+
+def flip_bits(rng, value, count):
+    for bit in rng.sample(range(HASH_BITS), count):
+        value ^= 1 << bit
+    return value
+
+
+def brute_force(stored, query, max_distance):
+    best = None
+    for candidate, value in stored.items():
+        distance = (candidate ^ query).bit_count()
+        if distance <= max_distance and (best is None or distance < best[0]):
+            best = (distance, value)
+    return best
+
+
+def main():
+    stored_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    max_distance = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    rng = random.Random(99)
+
+    stored = {rng.getrandbits(HASH_BITS): rng.choice(("approved", "disapproved")) for _ in range(stored_count)}
+    start = time.perf_counter()
+    index = MultiIndexHashIndex(max_distance)
+    for hash_value, decision in stored.items():
+        index.add(hash_value, decision)
+    build_seconds = time.perf_counter() - start
+
+    stored_hashes = list(stored)
+    # Half the queries are near-duplicates of stored images, half are unseen.
+    queries = [
+        flip_bits(rng, rng.choice(stored_hashes), rng.randint(0, max_distance)) if i % 2 else rng.getrandbits(HASH_BITS)
+        for i in range(20_000)
+    ]
+
+    start = time.perf_counter()
+    results = [index.nearest(query) for query in queries]
+    per_lookup = (time.perf_counter() - start) / len(queries)
+
+    for query, result in zip(queries[:200], results):
+        expected = brute_force(stored, query, max_distance)
+        if (result and result[0]) != (expected and expected[0]):
+            raise SystemExit(f"❌ Index disagrees with brute force for {query:016x}: {result} vs {expected}.")
+
+    matched = sum(result is not None for result in results)
+    print(f"Stored fingerprints: {len(index)} (max distance {max_distance})")
+    print(f"Build:               {build_seconds:.2f}s")
+    print(f"Lookup:              {per_lookup * 1e6:.1f}µs ({matched}/{len(queries)} matched)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""Replay synthetic (or recorded) Discord traffic through on_message against a stub OpenAI server.
+
+Nothing here talks to Discord or OpenAI. Messages, members, channels and
+attachments are lightweight fakes. AsyncOpenAI is pointed at a local stub
+server with configurable latency and error rate, and the database defaults
+to a throwaway SQLite file (requires aiosqlite).
+
+Trace files are JSON Lines:
+
+    {"content": "hello", "author_id": 1, "channel_id": 10, "attachments": ["cat.png"]}
+
+Usage:
+    python bench_replay.py [--trace trace.jsonl] [--messages 2000] [--rate 200]
+                           [--latency-ms 400] [--jitter-ms 150] [--error-rate 0.01]
+                           [--flood off|8/10|default]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import socket
+import tempfile
+import time
+from collections import Counter
+
+BAD_MARKER = "badwordmarker"
+SYNTHETIC_CHATTER = ["lol", "gg", "ok", "thanks", "😂", "https://example.com/clip"]
+SYNTHETIC_WORDS = "the a game stream tonight anyone want to play later ranked match build patch server".split()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trace", help="JSONL message trace; synthetic traffic is generated when omitted")
+    parser.add_argument("--messages", type=int, default=2000, help="synthetic messages to generate")
+    parser.add_argument("--rate", type=float, default=200.0, help="target messages per second")
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="stub OpenAI mean latency")
+    parser.add_argument("--jitter-ms", type=float, default=150.0, help="stub OpenAI latency jitter (std dev)")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="fraction of stub requests that fail with 500")
+    parser.add_argument("--slow-fraction", type=float, default=0.03, help="fraction of stub requests that stall")
+    parser.add_argument("--slow-ms", type=float, default=5000.0, help="how long a stalled stub request takes")
+    parser.add_argument("--no-hedge", action="store_true", help="disable hedged moderation requests")
+    parser.add_argument(
+        "--flood", default="off",
+        help='flood limit for every member: "off" (default), messages/seconds like "8/10", or "default" for the bot\'s own limits',
+    )
+    parser.add_argument("--instrument", action="store_true", help="enable metrics and per-message traces")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--channels", type=int, default=12)
+    parser.add_argument("--media-fraction", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+STUB_PORT = free_port()
+WORKDIR = tempfile.mkdtemp(prefix="bench_replay-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(WORKDIR, 'bench.db')}")
+os.environ["OPENAI_API_KEY"] = "bench"
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}/v1"
+os.environ["MEDIA_SPOOL_DIR"] = os.path.join(WORKDIR, "media_spool")
+if ARGS.instrument:
+    os.environ["METRICS_PORT"] = str(free_port())
+    os.environ["TRACE_FILE"] = os.path.join(WORKDIR, "traces.jsonl")
+
+from aiohttp import web  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import discord  # noqa: E402
+import main  # noqa: E402
+from latency_stats import LatencyRecorder, format_ms  # noqa: E402
+
+
+class StubOpenAI:
+    """Answers chat completions like the moderation prompt expects, after a simulated delay."""
+
+    def __init__(self, latency_ms, jitter_ms, error_rate, slow_fraction, slow_ms, rng):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.slow_fraction = slow_fraction
+        self.slow_ms = slow_ms
+        self.rng = rng
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def chat_completions(self, request):
+        body = await request.json()
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = max(0.0, self.rng.gauss(self.latency_ms, self.jitter_ms)) / 1000
+            if self.rng.random() < self.slow_fraction:
+                delay = self.slow_ms / 1000
+            await asyncio.sleep(delay)
+            if self.rng.random() < self.error_rate:
+                self.errors += 1
+                return web.json_response({"error": {"message": "stub failure", "type": "server_error"}}, status=500)
+            return web.json_response(self.completion(body))
+        finally:
+            self.in_flight -= 1
+
+    async def media(self, request):
+        return web.Response(body=os.urandom(32 * 1024), content_type="image/png")
+
+    def completion(self, body):
+        system = body["messages"][0]["content"]
+        user = body["messages"][-1]["content"]
+        if "several independent messages" in system:
+            lines = []
+            for line in user.splitlines():
+                number, _, content = line.partition(": ")
+                lines.append(f"{number}: {'DELETE' if BAD_MARKER in content else 'SAFE'}")
+            reply = "\n".join(lines)
+        elif "summarize" in system.lower():
+            reply = "Stub summary."
+        else:
+            reply = "DELETE" if BAD_MARKER in user else "SAFE"
+        return {
+            "id": f"stub-{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": reply}}],
+            "usage": {"prompt_tokens": len(user) // 4 + 50, "completion_tokens": 2, "total_tokens": len(user) // 4 + 52},
+        }
+
+
+class FakeAvatar:
+    url = "https://cdn.example/avatar.png"
+
+
+class FakeRole:
+    def __init__(self, role_id):
+        self.id = role_id
+
+
+class FakeMember:
+    def __init__(self, member_id, guild, roles=()):
+        self.id = member_id
+        self.guild = guild
+        self.bot = False
+        self.name = f"user{member_id}"
+        self.roles = [FakeRole(role_id) for role_id in roles]
+        self.mention = f"<@{member_id}>"
+        self.display_avatar = FakeAvatar()
+        # Established members, so raid detection stays out of the way of the normal pipeline.
+        self.created_at = discord.utils.utcnow() - datetime.timedelta(days=365)
+        self.joined_at = self.created_at
+        self.dms = 0
+
+    async def send(self, *args, **kwargs):
+        self.dms += 1
+
+    async def add_roles(self, *roles, **kwargs):
+        pass
+
+    def __str__(self):
+        return self.name
+
+
+class FakeSentMessage:
+    _next_id = 10_000_000
+
+    def __init__(self, channel):
+        FakeSentMessage._next_id += 1
+        self.id = FakeSentMessage._next_id
+        self.channel = channel
+        self.jump_url = f"https://discord.com/channels/1/{channel.id}/{self.id}"
+
+    async def edit(self, **kwargs):
+        pass
+
+    async def reply(self, *args, **kwargs):
+        return FakeSentMessage(self.channel)
+
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+        self.mention = f"<#{channel_id}>"
+        self.category_id = None
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+        for file in kwargs.get("files") or ():
+            file.close()
+        return FakeSentMessage(self)
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    id = 1
+    name = "bench-guild"
+
+    def __init__(self):
+        self.review_channel = FakeChannel(main.MEDIA_REVIEW_CHANNEL_ID)
+
+    def get_role(self, role_id):
+        return None
+
+    def get_member(self, member_id):
+        return None
+
+    def get_channel(self, channel_id):
+        return None
+
+    async def fetch_channel(self, channel_id):
+        return self.review_channel
+
+
+class FakeAttachment:
+    def __init__(self, filename, size=32 * 1024):
+        self.filename = filename
+        self.url = f"http://127.0.0.1:{STUB_PORT}/media/{filename}"
+        self.size = size
+        self.content_type = "image/png" if filename.endswith(".png") else None
+
+
+class FakeMessage:
+    _next_id = 1
+
+    def __init__(self, content, author, channel, guild, attachments=()):
+        FakeMessage._next_id += 1
+        self.id = FakeMessage._next_id
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = guild
+        self.attachments = list(attachments)
+        self.deleted = False
+
+    async def delete(self):
+        self.deleted = True
+
+
+def synthetic_trace(rng, count, users, channels, media_fraction):
+    repeated = [" ".join(rng.choices(SYNTHETIC_WORDS, k=6)) for _ in range(20)]
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.35:
+            content = rng.choice(SYNTHETIC_CHATTER)
+        elif roll < 0.55:
+            content = rng.choice(repeated)
+        elif roll < 0.58:
+            content = f"you are a {BAD_MARKER} {rng.randint(0, 9)}"
+        else:
+            content = " ".join(rng.choices(SYNTHETIC_WORDS, k=rng.randint(3, 15))) + f" {i}"
+        record = {
+            "content": content,
+            "author_id": 1_000 + int(rng.paretovariate(1.2)) % users,
+            "channel_id": 100 + rng.randrange(channels),
+        }
+        if rng.random() < media_fraction:
+            record["attachments"] = [f"upload-{i}.png"]
+        yield record
+
+
+def load_trace(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+async def replay(records, rate, stub):
+    guild = FakeGuild()
+    members = {}
+    channels = {}
+    latency = LatencyRecorder(max_samples=1_000_000)
+    failures = Counter()
+
+    async def handle(record, due):
+        author = members.setdefault(record["author_id"], FakeMember(record["author_id"], guild))
+        channel = channels.setdefault(record["channel_id"], FakeChannel(record["channel_id"]))
+        attachments = [FakeAttachment(name) for name in record.get("attachments", ())]
+        message = FakeMessage(record["content"], author, channel, guild, attachments)
+        try:
+            await main.on_message(message)
+        except Exception as e:
+            failures[type(e).__name__] += 1
+        latency.record(time.perf_counter() - due)
+
+    start = time.perf_counter()
+    tasks = []
+    for i, record in enumerate(records):
+        due = start + i / rate
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(handle(record, due)))
+    await asyncio.gather(*tasks)
+    await main.moderation_queue.join()
+    await main.moderation_batcher.drain()
+    if main.moderation_rechecks:
+        await asyncio.gather(*main.moderation_rechecks, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    return len(tasks), elapsed, latency, failures, members
+
+
+async def run():
+    rng = random.Random(ARGS.seed)
+    stub = StubOpenAI(ARGS.latency_ms, ARGS.jitter_ms, ARGS.error_rate, ARGS.slow_fraction, ARGS.slow_ms, rng)
+    main.moderation_hedging.enabled = not ARGS.no_hedge
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", stub.chat_completions)
+    app.router.add_get("/media/{name}", stub.media)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", STUB_PORT).start()
+
+    queries = Counter()
+    event.listen(main.engine.sync_engine, "before_cursor_execute", lambda *args: queries.update(["total"]))
+
+    async def no_commands(message):
+        pass
+
+    log_channel = FakeChannel(main.LOG_CHANNEL_ID)
+    main.bot.process_commands = no_commands
+    main.bot.get_channel = lambda channel_id: log_channel if channel_id == main.LOG_CHANNEL_ID else None
+    main.moderation_queue.start()
+    main.log_writer.start()
+    main.evidence_store.start()
+    guild_config = main.legacy_guild_config()
+    if ARGS.flood != "default":
+        # Synthetic authors are Pareto-distributed, so the real limits would throttle most of the replay.
+        flood_limit = main.parse_flood_limit(ARGS.flood)
+        guild_config = guild_config.replace(flood_limits={"default": flood_limit, "exempt": flood_limit})
+    main.guild_configs.set(FakeGuild.id, guild_config)
+    if main.metrics.enabled:
+        main.install_metrics()
+    await main.init_db()
+    await main.load_whitelist()
+    await main.load_moderation_state()
+    await main.load_media_fingerprints()
+    setup_queries = queries["total"]
+
+    records = list(load_trace(ARGS.trace)) if ARGS.trace else list(
+        synthetic_trace(rng, ARGS.messages, ARGS.users, ARGS.channels, ARGS.media_fraction)
+    )
+    handled, elapsed, latency, failures, members = await replay(records, ARGS.rate, stub)
+    message_queries = queries["total"] - setup_queries
+    log_flush_started = time.perf_counter()
+    await main.log_writer.stop(timeout=None)
+    log_flush_seconds = time.perf_counter() - log_flush_started
+
+    print(f"Messages:            {handled} in {elapsed:.2f}s ({handled / elapsed:.0f} msg/s, target {ARGS.rate:.0f})")
+    print(
+        f"on_message latency:  p50 {format_ms(latency.percentile(50))} · "
+        f"p95 {format_ms(latency.percentile(95))} · p99 {format_ms(latency.percentile(99))}"
+    )
+    queue = main.moderation_queue.stats()
+    print(
+        f"Moderation latency:  p50 {format_ms(queue['p50'])} · p95 {format_ms(queue['p95'])} · "
+        f"p99 {format_ms(queue['p99'])} (queued → done, {queue['shed']} shed)"
+    )
+    verdicts = main.time_to_verdict
+    hedging = main.moderation_hedging.stats()
+    print(
+        f"Time to verdict:     p50 {format_ms(verdicts.percentile(50))} · "
+        f"p95 {format_ms(verdicts.percentile(95))} · p99 {format_ms(verdicts.percentile(99))} "
+        f"(hedging {'on' if hedging['enabled'] else 'off'}: {hedging['hedged']} hedged, {hedging['hedge_wins']} won)"
+    )
+    if main.moderation_fallbacks:
+        print(f"Deadline fallbacks:  {dict(main.moderation_fallbacks)}")
+    print(f"DB queries/message:  {message_queries / handled:.3f}")
+    print(f"OpenAI calls/message: {stub.calls / handled:.3f} ({stub.calls} calls, {stub.errors} stub errors, "
+          f"max {stub.max_in_flight} in flight)")
+    flood = main.flood_throttle.stats()
+    print(f"Flood throttle:      {flood['throttled']} messages throttled ({ARGS.flood}), {flood['users']} users tracked")
+    print(f"DMs sent:            {sum(member.dms for member in members.values())}")
+    log = main.log_writer.stats()
+    print(f"Log channel:         {log['sent_entries']} entries in {log_channel.sent} messages "
+          f"({log['dropped']} dropped, final flush {log_flush_seconds:.1f}s)")
+    if failures:
+        print(f"Handler exceptions:  {dict(failures)}")
+    if main.metrics.enabled:
+        exposition = main.metrics.render()
+        print(f"Instrumentation:     {main.tracer.written} traces written to {main.tracer.path}, "
+              f"{exposition.count(chr(10))} metric lines")
+
+    await main.moderation_queue.stop()
+    await main.evidence_store.stop()
+    main.tracer.close()
+    await main.media_spool.close()
+    await main.openai_client.close()
+    await main.engine.dispose()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
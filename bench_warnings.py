@@ -0,0 +1,75 @@
+"""Fire parallel violations for one user and check that no warning increments are lost.
+
+Runs against DATABASE_URL, or a throwaway SQLite file when it is unset
+(requires aiosqlite). Never point this at the production database: it
+rewrites the bench user's warning and jail rows.
+
+Usage: python bench_warnings.py [parallel_violations]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_warnings.db')}"
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import main  # noqa: E402
+
+BENCH_GUILD_ID = "bench-warnings-guild"
+BENCH_USER_ID = "bench-warnings-user"
+
+
+async def reset_user():
+    await main.set_warnings(BENCH_GUILD_ID, BENCH_USER_ID, 0)
+    await main.remove_from_jailed(BENCH_GUILD_ID, BENCH_USER_ID)
+
+
+async def fire(violations, jail_threshold):
+    await reset_user()
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        main.increment_warnings(BENCH_GUILD_ID, BENCH_USER_ID, jail_threshold=jail_threshold)
+        for _ in range(violations)
+    ))
+    elapsed = time.perf_counter() - start
+    async with main.AsyncSessionLocal() as session:
+        row = await session.get(main.Warning, (BENCH_GUILD_ID, BENCH_USER_ID))
+        jailed = await session.get(main.JailedUser, (BENCH_GUILD_ID, BENCH_USER_ID)) is not None
+    return results, (row.count if row else 0), jailed, elapsed
+
+
+async def run(violations):
+    await main.init_db()
+    await main.load_moderation_state()
+    failures = []
+
+    results, final_count, _, elapsed = await fire(violations, None)
+    print(f"No threshold:  {violations} increments in {elapsed * 1000:.0f}ms, final count {final_count}")
+    if final_count != violations or sorted(count for count, _ in results) != list(range(1, violations + 1)):
+        failures.append(f"expected counts 1..{violations} and final count {violations}, got final count {final_count}")
+
+    threshold = main.WARNING_JAIL_THRESHOLD
+    results, final_count, jailed, elapsed = await fire(violations, threshold)
+    jail_transitions = sum(1 for _, was_jailed in results if was_jailed)
+    print(
+        f"Threshold {threshold}:  {violations} increments in {elapsed * 1000:.0f}ms, "
+        f"final count {final_count}, jail transitions {jail_transitions}"
+    )
+    if jail_transitions != violations // threshold or final_count != violations % threshold or not jailed:
+        failures.append(
+            f"expected {violations // threshold} jail transitions and final count {violations % threshold}, "
+            f"got {jail_transitions} and {final_count}"
+        )
+
+    await reset_user()
+    await main.engine.dispose()
+    if failures:
+        raise SystemExit("❌ " + "; ".join(failures))
+    print("✅ No lost increments.")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 100))
@@ -0,0 +1,71 @@
+"""Micro-benchmark for the whitelist check: linear phrase scan vs. Aho-Corasick index.
+
+Usage: python bench_whitelist.py [messages_per_size]
+"""
+import random
+import string
+import sys
+import time
+
+from whitelist_index import WhitelistMatcher
+
+PHRASE_COUNTS = (10, 1_000, 50_000)
+
+
+def random_word(rng, min_len=3, max_len=9):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(min_len, max_len)))
+
+
+def build_messages(rng, phrases, count):
+    messages = []
+    phrase_list = list(phrases)
+    for i in range(count):
+        words = [random_word(rng) for _ in range(rng.randint(4, 30))]
+        # Roughly one message in ten contains a whitelisted phrase.
+        if i % 10 == 0:
+            words.insert(rng.randrange(len(words)), rng.choice(phrase_list))
+        messages.append(" ".join(words))
+    return messages
+
+
+def linear_scan(phrases, message_content):
+    return any(phrase in message_content for phrase in phrases)
+
+
+def time_per_message(check, messages):
+    start = time.perf_counter()
+    for message_content in messages:
+        check(message_content)
+    return (time.perf_counter() - start) / len(messages)
+
+
+def main():
+    message_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    rng = random.Random(1234)
+    print(f"{'phrases':>8} {'build':>10} {'linear/msg':>12} {'indexed/msg':>12} {'speedup':>8}")
+    for phrase_count in PHRASE_COUNTS:
+        phrases = {" ".join(random_word(rng) for _ in range(rng.randint(1, 3))) for _ in range(phrase_count)}
+        messages = build_messages(rng, phrases, message_count)
+
+        start = time.perf_counter()
+        matcher = WhitelistMatcher(phrases)
+        build_seconds = time.perf_counter() - start
+
+        phrase_list = list(phrases)
+        # The linear scan gets slow at 50k phrases; sample fewer messages for it.
+        linear_messages = messages[: max(50, message_count // max(1, phrase_count // 1_000))]
+        linear = time_per_message(lambda m: linear_scan(phrase_list, m), linear_messages)
+        indexed = time_per_message(matcher.matches, messages)
+
+        mismatches = sum(matcher.matches(m) != linear_scan(phrase_list, m) for m in messages[:200])
+        if mismatches:
+            raise SystemExit(f"❌ Index disagrees with linear scan on {mismatches} messages.")
+
+        print(
+            f"{phrase_count:>8} {build_seconds * 1e3:>8.1f}ms "
+            f"{linear * 1e6:>10.1f}µs {indexed * 1e6:>10.1f}µs {linear / indexed:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
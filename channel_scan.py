@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+DISCORD_EPOCH_MS = 1_420_070_400_000
+BULK_DELETE_MAX_MESSAGES = 100
+# Discord refuses to bulk delete anything older than 14 days; leave an hour of slack.
+BULK_DELETE_MAX_AGE_SECONDS = 14 * 24 * 60 * 60 - 60 * 60
+
+
+def snowflake_seconds(snowflake):
+    return ((snowflake >> 22) + DISCORD_EPOCH_MS) / 1000
+
+
+class ChannelScan:
+    """Moderates one channel's existing history, oldest first, in resumable pages.
+
+    ``fetch_page(after_id, limit)`` returns up to ``limit`` messages newer
+    than ``after_id`` and older than ``until_id``, oldest first. The next
+    page is fetched while the current one is classified, with at most
+    ``concurrency`` ``classify(message)`` calls in flight; it returns
+    ``"DELETE"`` for violations and anything else to keep the message.
+    Violations young enough are removed with ``bulk_delete(messages)`` in
+    groups of up to 100, older ones one at a time with ``delete(message)``.
+    ``checkpoint(last_id, scan)`` is awaited once every page is fully
+    handled, so a restarted scan resumes after the last finished page.
+    """
+
+    def __init__(
+        self,
+        fetch_page,
+        classify,
+        bulk_delete,
+        delete,
+        checkpoint,
+        *,
+        after_id,
+        until_id,
+        page_size=100,
+        concurrency=16,
+    ):
+        self._fetch_page = fetch_page
+        self._classify = classify
+        self._bulk_delete = bulk_delete
+        self._delete = delete
+        self._checkpoint = checkpoint
+        self.first_id = after_id
+        self.last_id = after_id
+        self.until_id = until_id
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.started = None
+        self.scanned = 0
+        self.flagged = 0
+        self.deleted = 0
+        self.failed = 0
+        self.finished = False
+
+    async def run(self):
+        self.started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        next_page = asyncio.create_task(self._fetch_page(self.last_id, self.page_size))
+        try:
+            while True:
+                page = await next_page
+                if not page:
+                    break
+                next_page = asyncio.create_task(self._fetch_page(page[-1].id, self.page_size))
+                await self._handle_page(page, semaphore)
+                self.last_id = page[-1].id
+                await self._checkpoint(self.last_id, self)
+        finally:
+            next_page.cancel()
+        self.finished = True
+        await self._checkpoint(self.last_id, self)
+
+    async def _handle_page(self, page, semaphore):
+        async def classify(message):
+            async with semaphore:
+                try:
+                    return await self._classify(message)
+                except Exception as e:
+                    print(f"⚠️ Scan failed to classify message {message.id}: {e}")
+                    self.failed += 1
+                    return None
+
+        verdicts = await asyncio.gather(*(classify(message) for message in page))
+        self.scanned += len(page)
+        violations = [message for message, verdict in zip(page, verdicts) if verdict == "DELETE"]
+        self.flagged += len(violations)
+        if violations:
+            await self._remove(violations)
+
+    async def _remove(self, violations):
+        cutoff = time.time() - BULK_DELETE_MAX_AGE_SECONDS
+        recent = [message for message in violations if snowflake_seconds(message.id) > cutoff]
+        old = [message for message in violations if snowflake_seconds(message.id) <= cutoff]
+        for start in range(0, len(recent), BULK_DELETE_MAX_MESSAGES):
+            group = recent[start:start + BULK_DELETE_MAX_MESSAGES]
+            try:
+                await self._bulk_delete(group)
+                self.deleted += len(group)
+            except Exception as e:
+                print(f"⚠️ Scan failed to bulk delete {len(group)} messages: {e}")
+                self.failed += len(group)
+        for message in old:
+            try:
+                await self._delete(message)
+                self.deleted += 1
+            except Exception as e:
+                print(f"⚠️ Scan failed to delete message {message.id}: {e}")
+                self.failed += 1
+
+    def fraction_done(self):
+        # Message IDs are timestamps, so how far through the time range we are stands in for a message count.
+        span = (self.until_id >> 22) - (self.first_id >> 22)
+        if self.finished or span <= 0:
+            return 1.0
+        return min(1.0, max(0.0, ((self.last_id >> 22) - (self.first_id >> 22)) / span))
+
+    def rate(self):
+        if not self.started:
+            return 0.0
+        elapsed = time.monotonic() - self.started
+        return self.scanned / elapsed if elapsed > 0 else 0.0
+
+    def eta_seconds(self):
+        fraction = self.fraction_done()
+        if fraction >= 1.0:
+            return 0.0
+        if not self.started or fraction <= 0.0:
+            return None
+        return (time.monotonic() - self.started) * (1 - fraction) / fraction
+
+    def stats(self):
+        return {
+            "scanned": self.scanned,
+            "flagged": self.flagged,
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "rate": self.rate(),
+            "fraction": self.fraction_done(),
+            "eta": self.eta_seconds(),
+            "finished": self.finished,
+        }
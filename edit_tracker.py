@@ -0,0 +1,89 @@
+import difflib
+import hashlib
+import re
+from collections import OrderedDict
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def content_hash(content):
+    """An 8-byte digest of the message text with whitespace differences ignored."""
+    normalized = WHITESPACE.sub(" ", content or "").strip()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+
+
+class EditTracker:
+    """Remembers a compact hash of recently moderated messages so edits that change no text are free.
+
+    Discord sends an edit event whenever a link embed resolves, and users
+    fix typos constantly; only edits whose normalized text differs from
+    what was last judged need moderating again. At most ``max_messages``
+    hashes are kept, least recently seen evicted first.
+
+    When the previous text is known and the edit is small, ``text_to_check``
+    narrows the text to the changed region plus ``context_chars`` on
+    either side, so unchanged text isn't judged again.
+    """
+
+    def __init__(self, *, max_messages=50_000, context_chars=40, small_edit_ratio=0.3):
+        self.max_messages = max_messages
+        self.context_chars = context_chars
+        self.small_edit_ratio = small_edit_ratio
+        self._hashes = OrderedDict()
+        self.unchanged = 0
+        self.partial = 0
+        self.full = 0
+
+    def remember(self, message_id, content):
+        self._hashes[message_id] = content_hash(content)
+        self._hashes.move_to_end(message_id)
+        if len(self._hashes) > self.max_messages:
+            self._hashes.popitem(last=False)
+
+    def text_changed(self, message_id, before, after):
+        """Whether ``after`` needs judging; ``before`` is the previous text if discord.py still had it cached."""
+        new_hash = content_hash(after)
+        old_hash = self._hashes.get(message_id)
+        if old_hash is None and before is not None:
+            old_hash = content_hash(before)
+        self.remember(message_id, after)
+        if old_hash == new_hash:
+            self.unchanged += 1
+            return False
+        return True
+
+    def text_to_check(self, before, after):
+        if not before:
+            self.full += 1
+            return after
+        matcher = difflib.SequenceMatcher(None, before, after, autojunk=False)
+        changed = [(start, end) for tag, _, _, start, end in matcher.get_opcodes() if tag != "equal"]
+        if not changed:
+            self.full += 1
+            return after
+        start = changed[0][0]
+        end = changed[-1][1]
+        if end - start > len(after) * self.small_edit_ratio:
+            self.full += 1
+            return after
+        start = max(0, start - self.context_chars)
+        end = min(len(after), end + self.context_chars)
+        # Widen to whole words so a slur split across the window boundary isn't cut in half.
+        while start > 0 and not after[start - 1].isspace():
+            start -= 1
+        while end < len(after) and not after[end].isspace():
+            end += 1
+        self.partial += 1
+        return after[start:end]
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def stats(self):
+        return {
+            "tracked": len(self._hashes),
+            "max_messages": self.max_messages,
+            "unchanged": self.unchanged,
+            "partial": self.partial,
+            "full": self.full,
+        }
@@ -0,0 +1,81 @@
+"""Replay a labeled corpus through the pre-filter and report how it compares with the LLM.
+
+The corpus is JSON Lines, one message per line:
+
+    {"content": "gg wp", "lenient": false, "verdict": "SAFE"}
+
+``verdict`` is the label the LLM (or a moderator) gave the message.
+
+Usage: python eval_prefilter.py corpus.jsonl [--lexicon prefilter_lexicon.txt] [--show-disagreements]
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter
+
+from prefilter import DELETE, ESCALATE, SAFE, Lexicon, Prefilter
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            verdict = str(record["verdict"]).strip().upper()
+            if verdict not in (SAFE, DELETE):
+                raise ValueError(f"Line {line_number}: verdict must be SAFE or DELETE, got {verdict!r}.")
+            yield record["content"], bool(record.get("lenient", False)), verdict
+
+
+def evaluate(prefilter, corpus):
+    outcomes = Counter()
+    disagreements = []
+    start = time.perf_counter()
+    for content, lenient, label in corpus:
+        verdict = prefilter.classify(content, lenient=lenient)
+        outcomes[(verdict, label)] += 1
+        if verdict is not ESCALATE and verdict != label:
+            disagreements.append((content, lenient, verdict, label))
+    return outcomes, disagreements, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus")
+    parser.add_argument("--lexicon", default=os.getenv("PREFILTER_LEXICON_PATH", "prefilter_lexicon.txt"))
+    parser.add_argument("--show-disagreements", action="store_true")
+    args = parser.parse_args()
+
+    lexicon = Lexicon.from_file(args.lexicon) if os.path.exists(args.lexicon) else Lexicon()
+    prefilter = Prefilter(lexicon=lexicon)
+    outcomes, disagreements, elapsed = evaluate(prefilter, load_corpus(args.corpus))
+
+    total = sum(outcomes.values())
+    if not total:
+        raise SystemExit("⚠️ Corpus is empty.")
+    escalated = sum(n for (verdict, _), n in outcomes.items() if verdict is ESCALATE)
+    settled = total - escalated
+    agreed = sum(n for (verdict, label), n in outcomes.items() if verdict is not ESCALATE and verdict == label)
+
+    print(f"Messages:          {total} ({lexicon.size} lexicon terms)")
+    print(f"Escalated to LLM:  {escalated} ({escalated / total:.1%})")
+    print(f"Settled locally:   {settled} ({settled / total:.1%})")
+    if settled:
+        print(f"Agreement w/ LLM:  {agreed}/{settled} ({agreed / settled:.1%})")
+    print(f"  SAFE  settled, LLM said DELETE: {outcomes[(SAFE, DELETE)]}")
+    print(f"  DELETE settled, LLM said SAFE:  {outcomes[(DELETE, SAFE)]}")
+    if escalated:
+        print(f"LLM call reduction: {total / escalated:.1f}x")
+    print(f"Pre-filter cost:   {elapsed / total * 1e6:.1f}µs/message")
+
+    if args.show_disagreements:
+        for content, lenient, verdict, label in disagreements:
+            mode = "lenient" if lenient else "strict"
+            print(f"- [{mode}] prefilter={verdict} llm={label}: {content!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+# Rough per-object costs (deque, dict slot, tuple, str header) so the byte budget tracks real memory.
+ENTRY_OVERHEAD_BYTES = 120
+USER_OVERHEAD_BYTES = 700
+
+
+class EvidenceStore:
+    """Recent flagged messages per user, bounded in memory and written behind to the database.
+
+    Each user keeps a ring of the last ``per_user`` entries. Users are
+    evicted least-recently-used first once there are more than
+    ``max_users`` of them, or once the estimated footprint passes
+    ``max_bytes``. ``record()`` never awaits: new entries are queued and
+    ``persist(batch)`` writes them every ``flush_interval`` seconds, or as
+    soon as ``max_batch`` are waiting. ``get()`` reloads an evicted user
+    through ``load(key, limit)``, so evidence survives both eviction and
+    restarts. A ring that ``record()`` started for a user who wasn't in
+    memory is partial until ``get()`` has merged it with the database.
+    """
+
+    def __init__(
+        self,
+        persist,
+        load,
+        *,
+        per_user=5,
+        max_users=50_000,
+        max_bytes=16 * 1024 * 1024,
+        max_entry_chars=1_000,
+        flush_interval=2.0,
+        max_batch=500,
+        max_pending=10_000,
+    ):
+        self._persist = persist
+        self._load = load
+        self.per_user = per_user
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.max_entry_chars = max_entry_chars
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._users = OrderedDict()
+        self._partial = set()
+        self._pending = deque()
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self.bytes = 0
+        self.evicted = 0
+        self.persisted = 0
+        self.rehydrated = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def record(self, key, entry):
+        entry = entry[:self.max_entry_chars]
+        if key not in self._users:
+            # Older entries may still be in the database; get() merges them in before answering.
+            self._partial.add(key)
+        self._remember(key, [entry])
+        self._pending.append((key, entry, int(time.time())))
+        if len(self._pending) > self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    async def get(self, key):
+        entries = self._users.get(key)
+        if entries is not None and key not in self._partial:
+            self._users.move_to_end(key)
+            return list(entries)
+
+        # Make sure anything still queued for this user is in the database before reading it back.
+        await self.flush()
+        entries = self._users.get(key)
+        if entries is not None and key not in self._partial:
+            return list(entries)
+        loaded = await self._load(key, self.per_user)
+        # Whatever couldn't be flushed yet is only in the queue, so it goes on top of what was loaded.
+        loaded = list(loaded) + [entry for pending_key, entry, _ in self._pending if pending_key == key]
+        loaded = loaded[-self.per_user:]
+        self._partial.discard(key)
+        if loaded:
+            self.rehydrated += 1
+            self._forget(key)
+            self._remember(key, loaded)
+        return loaded
+
+    def _remember(self, key, new_entries):
+        entries = self._users.get(key)
+        if entries is None:
+            entries = self._users[key] = deque(maxlen=self.per_user)
+            self.bytes += USER_OVERHEAD_BYTES
+        else:
+            self._users.move_to_end(key)
+        for entry in new_entries:
+            if len(entries) == entries.maxlen:
+                self.bytes -= self._entry_size(entries[0])
+            entries.append(entry)
+            self.bytes += self._entry_size(entry)
+        self._evict()
+
+    def _forget(self, key):
+        entries = self._users.pop(key, None)
+        if entries is not None:
+            self.bytes -= USER_OVERHEAD_BYTES + sum(self._entry_size(entry) for entry in entries)
+        self._partial.discard(key)
+
+    def _evict(self):
+        while self._users and (len(self._users) > self.max_users or self.bytes > self.max_bytes):
+            self._forget(next(iter(self._users)))
+            self.evicted += 1
+
+    @staticmethod
+    def _entry_size(entry):
+        return len(entry.encode("utf-8")) + ENTRY_OVERHEAD_BYTES
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+                try:
+                    await self._persist(batch)
+                except Exception as e:
+                    print(f"⚠️ Failed to persist {len(batch)} flagged messages; will retry: {e}")
+                    self._pending.extendleft(reversed(batch))
+                    while len(self._pending) > self.max_pending:
+                        self._pending.popleft()
+                        self.dropped += 1
+                    return
+                self.persisted += len(batch)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def __len__(self):
+        return len(self._users)
+
+    def stats(self):
+        return {
+            "users": len(self._users),
+            "max_users": self.max_users,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "pending": len(self._pending),
+            "persisted": self.persisted,
+            "rehydrated": self.rehydrated,
+            "evicted": self.evicted,
+            "dropped": self.dropped,
+        }
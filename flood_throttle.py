@@ -0,0 +1,55 @@
+import time
+from collections import OrderedDict
+
+
+class FloodThrottle:
+    """Per-user token buckets that allow ``messages`` per ``seconds``, with bursts up to ``messages``.
+
+    The limit is passed on every call, so it can depend on the member's
+    roles. Each active user costs one small bucket; buckets untouched for
+    ``idle_seconds`` are evicted oldest first (a full bucket behaves the
+    same as a missing one), and at most ``max_users`` are kept.
+    """
+
+    def __init__(self, *, idle_seconds=300.0, max_users=100_000):
+        self.idle_seconds = idle_seconds
+        self.max_users = max_users
+        self._buckets = OrderedDict()
+        self.throttled = 0
+        self.evicted = 0
+
+    def allow(self, key, messages, seconds, now=None):
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(messages), now]
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(float(messages), bucket[0] + (now - bucket[1]) * messages / seconds)
+            bucket[1] = now
+        self._evict(now)
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True
+        self.throttled += 1
+        return False
+
+    def _evict(self, now):
+        # Buckets are kept in last-used order, so only the front ever needs checking.
+        while self._buckets:
+            key, (_, updated_at) = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_users and now - updated_at < self.idle_seconds:
+                return
+            del self._buckets[key]
+            self.evicted += 1
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def stats(self):
+        return {
+            "users": len(self._buckets),
+            "max_users": self.max_users,
+            "throttled": self.throttled,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,88 @@
+from types import MappingProxyType
+
+
+class GuildConfig:
+    """Channel and role settings for one guild. Instances are never mutated; use ``replace()``."""
+
+    __slots__ = (
+        "log_channel_id",
+        "jail_role_id",
+        "review_channel_id",
+        "media_review_channel_id",
+        "ticket_category_id",
+        "media_review_exempt_role_id",
+        "staff_role_ids",
+        "flood_limits",
+    )
+
+    def __init__(
+        self,
+        *,
+        log_channel_id=None,
+        jail_role_id=None,
+        review_channel_id=None,
+        media_review_channel_id=None,
+        ticket_category_id=None,
+        media_review_exempt_role_id=None,
+        staff_role_ids=(),
+        flood_limits=None,
+    ):
+        self.log_channel_id = log_channel_id
+        self.jail_role_id = jail_role_id
+        self.review_channel_id = review_channel_id
+        self.media_review_channel_id = media_review_channel_id
+        self.ticket_category_id = ticket_category_id
+        self.media_review_exempt_role_id = media_review_exempt_role_id
+        self.staff_role_ids = frozenset(staff_role_ids)
+        # "default", "exempt" or a role ID -> (messages, seconds), or None for no limit.
+        self.flood_limits = MappingProxyType({
+            str(key): tuple(limit) if limit is not None else None
+            for key, limit in dict(flood_limits or {}).items()
+        })
+
+    def replace(self, **changes):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return GuildConfig(**values)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+DEFAULT_GUILD_CONFIG = GuildConfig()
+
+
+class GuildConfigStore:
+    """In-memory map of guild ID to GuildConfig, mirrored from the guild_settings table.
+
+    Lookups never touch the database; guilds without a row get an empty
+    config. Like the moderation state cache, writers update the database
+    first and then call ``set()``, and a periodic reload replaces the map
+    unless a write landed while the snapshot was being read.
+    """
+
+    def __init__(self):
+        self._configs = {}
+        self._writes = 0
+
+    def get(self, guild_id):
+        return self._configs.get(guild_id, DEFAULT_GUILD_CONFIG)
+
+    def set(self, guild_id, config):
+        self._writes += 1
+        self._configs[guild_id] = config
+
+    def snapshot_token(self):
+        return self._writes
+
+    def apply_snapshot(self, token, configs):
+        if token != self._writes:
+            return False
+        self._configs = dict(configs)
+        return True
+
+    def __contains__(self, guild_id):
+        return guild_id in self._configs
+
+    def __len__(self):
+        return len(self._configs)
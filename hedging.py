@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+from latency_stats import LatencyRecorder
+
+
+class HedgePolicy:
+    """Sends a duplicate request when the first one is slower than usual.
+
+    The hedge delay tracks a latency percentile of recent successful
+    attempts, so only the slow tail pays for a second request. Whichever
+    attempt succeeds first wins, and the other is cancelled.
+
+    ``make_attempt(sent)`` must call ``sent()`` when its request actually
+    goes out, so time spent waiting for admission (e.g. in a rate governor's
+    queue) doesn't count toward the delay. ``can_hedge()``, if given, is
+    asked before hedging; a saturated upstream should answer False rather
+    than take a second copy of the request.
+    """
+
+    def __init__(self, *, percentile=95, min_delay=0.25, max_delay=3.0, default_delay=1.0, min_samples=50):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.latency = LatencyRecorder()
+        self.enabled = True
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped = 0
+
+    def delay(self):
+        if self.latency.count < self.min_samples:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, self.latency.percentile(self.percentile)))
+
+    async def run(self, make_attempt, *, can_hedge=None):
+        self.calls += 1
+        if not self.enabled:
+            return await make_attempt(lambda: None)
+
+        sent_at = {}
+        first_sent = asyncio.Event()
+
+        def mark_first_sent():
+            sent_at.setdefault("first", time.perf_counter())
+            first_sent.set()
+
+        def finish(attempt, name):
+            result = attempt.result()
+            self.latency.record(time.perf_counter() - sent_at.get(name, time.perf_counter()))
+            return result
+
+        first = asyncio.ensure_future(make_attempt(mark_first_sent))
+        pending = {first}
+        errors = []
+        try:
+            sent = asyncio.ensure_future(first_sent.wait())
+            try:
+                await asyncio.wait({first, sent}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                sent.cancel()
+            if not first.done():
+                await asyncio.wait(pending, timeout=self.delay())
+            if first.done():
+                return finish(first, "first")
+            if can_hedge is not None and not can_hedge():
+                self.skipped += 1
+                await asyncio.wait(pending)
+                return finish(first, "first")
+
+            self.hedged += 1
+            second = asyncio.ensure_future(
+                make_attempt(lambda: sent_at.setdefault("second", time.perf_counter()))
+            )
+            names = {first: "first", second: "second"}
+            pending.add(second)
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is not first:
+                            self.hedge_wins += 1
+                        return finish(attempt, names[attempt])
+                    errors.append(attempt.exception())
+            raise errors[-1]
+        finally:
+            for attempt in pending:
+                attempt.cancel()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "skipped": self.skipped,
+            "delay": self.delay(),
+        }
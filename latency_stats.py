@@ -0,0 +1,29 @@
+from collections import deque
+
+
+class LatencyRecorder:
+    """Keeps the most recent latency samples (in seconds) for percentile reporting."""
+
+    def __init__(self, max_samples=2048):
+        self._samples = deque(maxlen=max_samples)
+        self.count = 0
+
+    def record(self, seconds):
+        self._samples.append(seconds)
+        self.count += 1
+
+    def percentile(self, pct):
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def summary(self, percentiles=(50, 95, 99)):
+        return {f"p{pct}": self.percentile(pct) for pct in percentiles}
+
+
+def format_ms(seconds):
+    if seconds is None:
+        return "n/a"
+    return f"{seconds * 1000:.0f}ms"
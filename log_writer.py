@@ -0,0 +1,202 @@
+import asyncio
+import time
+from collections import deque
+
+import discord
+
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6_000
+MAX_CONTENT_CHARS = 2_000
+
+
+class _ChannelLog:
+    def __init__(self, sends_per_window):
+        self.buffer = deque()
+        self.recent_sends = deque(maxlen=sends_per_window)
+        self.wake = asyncio.Event()
+        self.paused_until = 0.0
+        self.task = None
+
+
+class LogChannelWriter:
+    """Buffers log channel posts and sends them from a background task per channel.
+
+    ``post()`` never awaits, so moderation code is not held up by Discord's
+    per-channel rate limit. Queued entries are packed up to 10 embeds (and
+    2,000 characters of text) per message. Each channel flushes after
+    ``flush_delay`` seconds, or sooner once a full message is waiting.
+    Sends are paced locally to ``sends_per_window`` per ``window_seconds``
+    per channel. A 429 that escapes discord.py pauses that channel until the
+    bucket resets. When a channel's buffer is full, its oldest entries are
+    dropped and counted.
+    """
+
+    def __init__(
+        self,
+        resolve_channel,
+        *,
+        max_buffer=1_000,
+        flush_delay=1.0,
+        sends_per_window=5,
+        window_seconds=5.0,
+    ):
+        self._resolve_channel = resolve_channel
+        self.max_buffer = max_buffer
+        self.flush_delay = flush_delay
+        self.sends_per_window = sends_per_window
+        self.window_seconds = window_seconds
+        self._channels = {}
+        self._running = False
+        self._closing = False
+        self.posted = 0
+        self.sent_messages = 0
+        self.sent_entries = 0
+        self.dropped = 0
+        self.failed = 0
+        self.rate_limited = 0
+
+    def start(self):
+        self._running = True
+        self._closing = False
+        for channel_id, log in self._channels.items():
+            self._ensure_task(channel_id, log)
+
+    async def stop(self, timeout=5.0):
+        """Flush what is buffered (without the coalescing delay), giving up after ``timeout``."""
+        self._running = False
+        self._closing = True
+        tasks = [log.task for log in self._channels.values() if log.task]
+        for log in self._channels.values():
+            log.wake.set()
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for log in self._channels.values():
+            log.task = None
+
+    def post(self, channel_id, content=None, *, embed=None):
+        if channel_id is None or (content is None and embed is None):
+            return
+        log = self._channels.get(channel_id)
+        if log is None:
+            log = self._channels[channel_id] = _ChannelLog(self.sends_per_window)
+        if len(log.buffer) >= self.max_buffer:
+            log.buffer.popleft()
+            self.dropped += 1
+        log.buffer.append((content, embed))
+        self.posted += 1
+        log.wake.set()
+        if self._running:
+            self._ensure_task(channel_id, log)
+
+    def _ensure_task(self, channel_id, log):
+        if log.task is None or log.task.done():
+            log.task = asyncio.create_task(self._run(channel_id, log))
+
+    async def _run(self, channel_id, log):
+        while log.buffer or not self._closing:
+            if not log.buffer:
+                log.wake.clear()
+                await log.wake.wait()
+                continue
+            await self._coalesce(log)
+            await self._pace(log)
+            await self._send(channel_id, log, self._take_batch(log))
+
+    async def _coalesce(self, log):
+        deadline = time.monotonic() + self.flush_delay
+        while not self._closing and len(log.buffer) < MAX_EMBEDS_PER_MESSAGE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            log.wake.clear()
+            try:
+                await asyncio.wait_for(log.wake.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+
+    async def _pace(self, log):
+        now = time.monotonic()
+        wait = log.paused_until - now
+        if len(log.recent_sends) == log.recent_sends.maxlen:
+            wait = max(wait, log.recent_sends[0] + self.window_seconds - now)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _take_batch(self, log):
+        batch = []
+        lines = []
+        content_chars = embed_chars = embed_count = 0
+        while log.buffer:
+            content, embed = log.buffer[0]
+            added_content = len(content) + bool(lines) if content else 0
+            added_embed = len(embed) if embed is not None else 0
+            if batch and (
+                content_chars + added_content > MAX_CONTENT_CHARS
+                or embed_count + (embed is not None) > MAX_EMBEDS_PER_MESSAGE
+                or embed_chars + added_embed > MAX_EMBED_CHARS_PER_MESSAGE
+            ):
+                break
+            batch.append(log.buffer.popleft())
+            if content:
+                lines.append(content)
+                content_chars += added_content
+            if embed is not None:
+                embed_count += 1
+                embed_chars += added_embed
+        return batch
+
+    async def _send(self, channel_id, log, batch):
+        channel = self._resolve_channel(channel_id)
+        if channel is None:
+            self.dropped += len(batch)
+            return
+
+        content = "\n".join(content for content, _ in batch if content) or None
+        embeds = [embed for _, embed in batch if embed is not None]
+        log.recent_sends.append(time.monotonic())
+        try:
+            await channel.send(content=content, embeds=embeds)
+        except discord.HTTPException as e:
+            if e.status != 429:
+                print(f"⚠️ Failed to send {len(batch)} log entries to {channel_id}: {e}")
+                self.failed += len(batch)
+                return
+            # discord.py already waited and retried; back off for the bucket's reset window and try again.
+            self.rate_limited += 1
+            headers = e.response.headers if e.response is not None else {}
+            reset_after = headers.get("X-RateLimit-Reset-After") or headers.get("Retry-After")
+            try:
+                reset_after = float(reset_after)
+            except (TypeError, ValueError):
+                reset_after = self.window_seconds
+            log.paused_until = time.monotonic() + reset_after
+            log.buffer.extendleft(reversed(batch))
+            while len(log.buffer) > self.max_buffer:
+                log.buffer.popleft()
+                self.dropped += 1
+            return
+        except Exception as e:
+            print(f"⚠️ Failed to send {len(batch)} log entries to {channel_id}: {e}")
+            self.failed += len(batch)
+            return
+        self.sent_messages += 1
+        self.sent_entries += len(batch)
+
+    def __len__(self):
+        return sum(len(log.buffer) for log in self._channels.values())
+
+    def stats(self):
+        return {
+            "queued": len(self),
+            "channels": len(self._channels),
+            "max_buffer": self.max_buffer,
+            "posted": self.posted,
+            "sent_messages": self.sent_messages,
+            "sent_entries": self.sent_entries,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+        }
@@ -1,15 +1,45 @@
+import time
+# Taken before the heavy imports so the startup report can include them.
+PROCESS_STARTED = time.perf_counter()
 import discord
 from discord.ext import commands
 import os
-import time
+import hashlib
+import io
 import traceback
+from collections import Counter
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 import asyncio
-import io
+import json
+import re
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker
-from sqlalchemy import Column, String, Integer, delete, select
+from sqlalchemy import Column, Index, String, Integer, Text, delete, event, inspect, insert, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from whitelist_index import WhitelistMatcher
+from moderation_batcher import ModerationBatcher
+from verdict_cache import VerdictCache
+from prefilter import ESCALATE, Lexicon, Prefilter
+from state_cache import ModerationStateCache
+from media_spool import MediaSpool
+from media_fingerprints import FingerprintIndex, dhash_file
+from media_previews import VideoPreviewer, image_thumbnail
+from openai_governor import BACKGROUND, LIVE, PRIORITY_NAMES, STAFF, OpenAIGovernor
+from hedging import HedgePolicy
+from moderation_queue import ModerationQueue
+from log_writer import LogChannelWriter
+from guild_config import GuildConfig, GuildConfigStore
+from evidence_store import EvidenceStore
+from summarizer import MapReduceSummarizer
+from channel_scan import ChannelScan
+from migrations import run_migrations
+from raid_detector import STARTED, RaidDetector
+from flood_throttle import FloodThrottle
+from edit_tracker import EditTracker
+from metrics import NOOP_TIMER, MetricsRegistry, StageTimer, Tracer
+from latency_stats import LatencyRecorder
+from latency_stats import format_ms
 
 # Load environment variables
 load_dotenv()
@@ -17,8 +47,106 @@ load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 DATABASE_URL = os.getenv("DATABASE_URL")
+MODERATION_FAILURE_POLICY = os.getenv("MODERATION_FAILURE_POLICY", "recheck")  # open, closed or recheck
+PREFILTER_LEXICON_PATH = os.getenv("PREFILTER_LEXICON_PATH", "prefilter_lexicon.txt")
+MEDIA_SPOOL_DIR = os.getenv("MEDIA_SPOOL_DIR", "media_spool")
+EVIDENCE_STORE_MAX_BYTES = int(os.getenv("EVIDENCE_STORE_MAX_BYTES", 16 * 1024 * 1024))
+# Instrumentation is off unless METRICS_PORT (for /metrics) or TRACE_FILE (per-message JSONL traces) is set.
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+TRACE_FILE = os.getenv("TRACE_FILE")
+# Optional explicit sharding for running several processes, e.g. SHARD_COUNT=8 SHARD_IDS=0,1,2,3.
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+SHARD_IDS = os.getenv("SHARD_IDS")
+# Set to push slash commands to Discord even when their definitions look unchanged.
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "").lower() in ("1", "true", "yes")
+
+# Retries are owned by the governor so backoff is shared across every caller.
+openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+openai_governor = OpenAIGovernor(max_concurrency=8)
+moderation_hedging = HedgePolicy(percentile=95, min_delay=0.25, max_delay=3.0)
+
+metrics = MetricsRegistry(enabled=bool(METRICS_PORT))
+tracer = Tracer(TRACE_FILE)
+stage_seconds = metrics.histogram("aimod_stage_seconds", "Time spent in each moderation stage.", ("stage",))
+messages_moderated = metrics.counter("aimod_messages_moderated_total", "Messages moderated, by verdict.", ("verdict",))
+openai_request_seconds = metrics.histogram(
+    "aimod_openai_request_seconds", "OpenAI chat completion latency, including governor queueing.", ("priority",)
+)
+openai_tokens = metrics.counter("aimod_openai_tokens_total", "OpenAI tokens used.", ("kind",))
+db_connections = metrics.counter("aimod_db_connections_total", "Database connections checked out of the pool.")
+db_connection_seconds = metrics.histogram("aimod_db_connection_seconds", "How long each pooled connection was held.")
+db_query_seconds = metrics.histogram("aimod_db_query_seconds", "Database statement latency.")
+event_loop_lag_seconds = metrics.histogram(
+    "aimod_event_loop_lag_seconds", "How late a periodic timer fired; a proxy for a blocked event loop."
+)
+EVENT_LOOP_LAG_INTERVAL_SECONDS = 0.5
+
+
+def stage(name):
+    if not (metrics.enabled or tracer.enabled):
+        return NOOP_TIMER
+    return StageTimer(stage_seconds, tracer, name)
+
+
+def install_metrics():
+    """Register scrape-time gauges and database hooks; only called when metrics are enabled."""
+    metrics.callback("aimod_pending_media_reviews", "Media reviews awaiting a moderator.", lambda: len(pending_media_reviews))
+    metrics.callback("aimod_pending_jail_reviews", "Jail reviews awaiting a moderator.", lambda: len(pending_jail_reviews))
+    metrics.callback("aimod_verdict_cache_hit_ratio", "Verdict cache hit rate.", verdict_cache.hit_rate)
+    metrics.callback(
+        "aimod_verdict_cache_lookups_total", "Verdict cache lookups, by result.",
+        lambda: {(result,): verdict_cache.stats()[result] for result in ("hits", "misses", "coalesced")},
+        kind="counter", labelnames=("result",),
+    )
+    metrics.callback(
+        "aimod_prefilter_escalation_ratio", "Share of messages the pre-filter sent on to the LLM.",
+        lambda: prefilter.stats()["escalation_rate"],
+    )
+    metrics.callback("aimod_moderation_queue_depth", "Messages waiting for a moderation worker.", lambda: len(moderation_queue))
+    metrics.callback("aimod_log_writer_queued", "Log channel entries waiting to be sent.", lambda: len(log_writer))
+    metrics.callback("aimod_evidence_store_bytes", "Estimated memory held by the evidence store.", lambda: evidence_store.bytes)
+    metrics.callback("aimod_openai_in_flight", "OpenAI requests in flight.", lambda: openai_governor.in_flight)
+    metrics.callback(
+        "aimod_openai_queued", "OpenAI requests waiting in the governor, by priority.",
+        lambda: {(name,): depth for name, depth in openai_governor.queue_depths().items()},
+        labelnames=("priority",),
+    )
+    metrics.callback(
+        "aimod_moderation_fallbacks_total", "Messages handled by the failure policy, by reason.",
+        lambda: {(reason,): count for (reason, _), count in moderation_fallbacks.items()},
+        kind="counter", labelnames=("reason",),
+    )
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        db_connections.inc()
+
+    @event.listens_for(engine.sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            db_connection_seconds.observe(time.perf_counter() - checked_out_at)
 
-openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the per-statement context: a failed statement never reaches after_cursor_execute.
+        context._query_started_at = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started_at = getattr(context, "_query_started_at", None)
+        if started_at is not None:
+            db_query_seconds.observe(time.perf_counter() - started_at)
+
+
+async def monitor_event_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL_SECONDS)
+        event_loop_lag_seconds.observe(max(0.0, loop.time() - started - EVENT_LOOP_LAG_INTERVAL_SECONDS))
 
 intents = discord.Intents.default()
 intents.messages = True
@@ -26,9 +154,28 @@ intents.guilds = True
 intents.members = True
 intents.message_content = True
 
-class MyBot(commands.Bot):
+class MyBot(commands.AutoShardedBot):
     async def setup_hook(self):
         await init_db_with_retries()
+        mark_startup("database_ready")
+        await load_guild_configs()
+        await load_whitelist()
+        await load_moderation_state()
+        self.state_reconcile_task = asyncio.create_task(reconcile_moderation_state_periodically())
+        self.raid_check_task = asyncio.create_task(check_raid_modes_periodically())
+        await load_pending_media_reviews()
+        await load_pending_jail_reviews()
+        await load_media_fingerprints()
+        self.media_sweep_task = asyncio.create_task(sweep_media_spool_periodically())
+        moderation_queue.start()
+        log_writer.start()
+        evidence_store.start()
+        self.metrics_runner = None
+        if metrics.enabled:
+            install_metrics()
+            self.metrics_runner = await metrics.serve(METRICS_HOST, int(METRICS_PORT))
+            self.event_loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+            print(f"📈 Serving metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
         self.add_view(JailReviewView())
         self.add_view(MediaReviewView())
         for command in [
@@ -38,22 +185,52 @@ class MyBot(commands.Bot):
             whitelist_list,
             dm,
             summarize,
+            scan,
             commands,
             exempt,
             exemptremove,
             exempts_list,
+            config,
+            modstats,
         ]:
             self.tree.add_command(command)
+        mark_startup("setup_done")
 
     async def close(self):
+        self.state_reconcile_task.cancel()
+        self.media_sweep_task.cancel()
+        self.raid_check_task.cancel()
+        await moderation_queue.stop()
+        await moderation_batcher.drain()
+        for scan_task in list(channel_scan_tasks.values()):
+            scan_task.cancel()
+        await scan_batcher.drain()
+        await log_writer.stop()
+        await evidence_store.stop()
+        if self.metrics_runner:
+            self.event_loop_lag_task.cancel()
+            await self.metrics_runner.cleanup()
+        tracer.close()
         await super().close()
         await engine.dispose()
         await openai_client.close()
+        await media_spool.close()
 
-bot = MyBot(command_prefix="!", intents=intents)
+def shard_options():
+    # Without explicit settings AutoShardedBot asks Discord for the recommended shard count.
+    if not SHARD_COUNT:
+        return {}
+    options = {"shard_count": int(SHARD_COUNT)}
+    if SHARD_IDS:
+        options["shard_ids"] = [int(shard_id) for shard_id in SHARD_IDS.split(",")]
+    return options
+
+bot = MyBot(command_prefix="!", intents=intents, **shard_options())
 
 debug_guilds = []  # optionally add your guild ID(s) here for faster dev
 
+# Settings of the server the bot was originally written for. They seed its guild_settings
+# row the first time the bot sees it; every other guild is configured with /config.
 LOG_CHANNEL_ID = 1384748303845167185
 JAIL_ROLE_ID = 1292210864128004147
 REVIEW_CHANNEL_ID = 1457762507484565687
@@ -74,10 +251,18 @@ engine = create_async_engine(
 )
 AsyncSessionLocal = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
-flagged_messages = {}
 pending_jail_reviews = {}
 pending_jail_reviews_by_user = {}
 pending_media_reviews = {}
+whitelist_matchers = {}
+whitelist_locks = {}
+moderation_state = ModerationStateCache()
+guild_configs = GuildConfigStore()
+STATE_RECONCILE_INTERVAL_SECONDS = 5 * 60
+WARNING_JAIL_THRESHOLD = 3
+FLAGGED_MESSAGES_PER_USER = 5
+SUMMARIZE_MAX_MESSAGES = 5_000
+SUMMARIZE_PROGRESS_INTERVAL_SECONDS = 1.5
 
 PENDING_MEDIA_HEADER = "Media was attached to a message, pending moderator review."
 PENDING_MEDIA_SUBTEXT = "*If approved, this message will display the media.*"
@@ -86,24 +271,117 @@ VIDEO_EXTENSIONS = (
     ".mp4", ".mov", ".webm", ".mkv", ".avi", ".m4v",
     ".wmv", ".flv", ".mpeg", ".mpg", ".3gp",
 )
+MEDIA_SPOOL_MAX_FILE_BYTES = 100 * 1024 * 1024
+MEDIA_SPOOL_MAX_TOTAL_BYTES = 5 * 1024 * 1024 * 1024
+MEDIA_REVIEW_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+MEDIA_SPOOL_SWEEP_INTERVAL_SECONDS = 30 * 60
+MEDIA_DOWNLOAD_CONCURRENCY = 4
+MEDIA_DOWNLOAD_TIMEOUT_SECONDS = 60
+MEDIA_FINGERPRINT_MAX_DISTANCE = 4
+MEDIA_PREVIEW_CONCURRENCY = 2
+
+media_spool = MediaSpool(MEDIA_SPOOL_DIR, max_file_bytes=MEDIA_SPOOL_MAX_FILE_BYTES)
+media_download_semaphore = asyncio.Semaphore(MEDIA_DOWNLOAD_CONCURRENCY)
+media_preview_semaphore = asyncio.Semaphore(MEDIA_PREVIEW_CONCURRENCY)
+media_previewer = VideoPreviewer()
+media_review_channels = {}
+media_fingerprints = FingerprintIndex(MEDIA_FINGERPRINT_MAX_DISTANCE)
+log_writer = LogChannelWriter(lambda channel_id: bot.get_channel(channel_id))
 
 class JailedUser(Base):
     __tablename__ = 'jailed_users'
+    guild_id = Column(String, primary_key=True)
     user_id = Column(String, primary_key=True)
 
 class Warning(Base):
     __tablename__ = 'warnings'
+    guild_id = Column(String, primary_key=True)
     user_id = Column(String, primary_key=True)
     count = Column(Integer, default=0)
 
 class WhitelistEntry(Base):
     __tablename__ = 'whitelist'
+    guild_id = Column(String, primary_key=True)
     phrase = Column(String, primary_key=True)
 
 class ExemptUser(Base):
     __tablename__ = 'exempt_users'
+    guild_id = Column(String, primary_key=True)
     user_id = Column(String, primary_key=True)
 
+class GuildSettings(Base):
+    __tablename__ = 'guild_settings'
+    guild_id = Column(String, primary_key=True)
+    log_channel_id = Column(String, nullable=True)
+    jail_role_id = Column(String, nullable=True)
+    review_channel_id = Column(String, nullable=True)
+    media_review_channel_id = Column(String, nullable=True)
+    ticket_category_id = Column(String, nullable=True)
+    media_review_exempt_role_id = Column(String, nullable=True)
+    staff_role_ids = Column(Text, nullable=False, default="[]")
+    flood_limits = Column(Text, nullable=False, default="{}")
+
+class PendingMediaReview(Base):
+    __tablename__ = 'pending_media_reviews'
+    review_message_id = Column(String, primary_key=True)
+    channel_id = Column(String, nullable=False)
+    placeholder_id = Column(String, nullable=False)
+    author_id = Column(String, nullable=False)
+    author_mention = Column(String, nullable=False)
+    text = Column(Text, nullable=False, default="")
+    media = Column(Text, nullable=False)
+    created_at = Column(Integer, nullable=False)
+
+class PendingJailReview(Base):
+    __tablename__ = 'pending_jail_reviews'
+    __table_args__ = (Index('ix_pending_jail_reviews_guild_user', 'guild_id', 'user_id', unique=True),)
+    review_message_id = Column(String, primary_key=True)
+    guild_id = Column(String, nullable=False)
+    user_id = Column(String, nullable=False)
+    channel_id = Column(String, nullable=False)
+    created_at = Column(Integer, nullable=False)
+
+class MediaFingerprint(Base):
+    __tablename__ = 'media_fingerprints'
+    sha256 = Column(String, primary_key=True)
+    phash = Column(String, nullable=True)
+    decision = Column(String, nullable=False)
+    updated_at = Column(Integer, nullable=False)
+
+class FlaggedMessage(Base):
+    __tablename__ = 'flagged_messages'
+    __table_args__ = (Index('ix_flagged_messages_guild_user', 'guild_id', 'user_id', 'id'),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    guild_id = Column(String, nullable=False)
+    user_id = Column(String, nullable=False)
+    entry = Column(Text, nullable=False)
+    created_at = Column(Integer, nullable=False)
+
+class ChannelSummary(Base):
+    __tablename__ = 'channel_summaries'
+    channel_id = Column(String, primary_key=True)
+    guild_id = Column(String, nullable=False)
+    last_message_id = Column(String, nullable=False)
+    summary = Column(Text, nullable=False)
+    updated_at = Column(Integer, nullable=False)
+
+class ScanCheckpoint(Base):
+    __tablename__ = 'scan_checkpoints'
+    channel_id = Column(String, primary_key=True)
+    guild_id = Column(String, nullable=False)
+    last_message_id = Column(String, nullable=False)
+    until_message_id = Column(String, nullable=False)
+    scanned = Column(Integer, nullable=False, default=0)
+    deleted = Column(Integer, nullable=False, default=0)
+    finished = Column(Integer, nullable=False, default=0)
+    updated_at = Column(Integer, nullable=False)
+
+class CommandSync(Base):
+    __tablename__ = 'command_syncs'
+    scope = Column(String, primary_key=True)
+    payload_hash = Column(String, nullable=False)
+    synced_at = Column(Integer, nullable=False)
+
 class DatabaseMigration(Base):
     __tablename__ = 'database_migrations'
     migration_id = Column(String, primary_key=True)
@@ -112,32 +390,73 @@ class DatabaseMigration(Base):
 WARNINGS_AND_JAILED_RESET_MIGRATION = "2026-07-29-reset-warnings-and-jailed-users"
 
 
-async def reset_warnings_and_jailed_users_once():
+async def reset_warnings_and_jailed_users(conn):
     """Clear moderation history once, while preserving all other bot data."""
-    async with AsyncSessionLocal.begin() as session:
-        completed = await session.get(
-            DatabaseMigration,
-            WARNINGS_AND_JAILED_RESET_MIGRATION,
-        )
-        if completed:
-            return
+    warnings_result = await conn.execute(delete(Warning))
+    jailed_result = await conn.execute(delete(JailedUser))
+    print(
+        "🧹 One-time moderation reset complete: "
+        f"removed {warnings_result.rowcount} warning records and "
+        f"{jailed_result.rowcount} jailed-user records."
+    )
+
+GUILD_SCOPED_ROWS_MIGRATION = "2026-10-17-guild-scoped-moderation-rows"
+GUILD_SCOPED_MODELS = (JailedUser, Warning, WhitelistEntry, ExemptUser)
+# Rows from before multi-guild support, until the original server claims them in adopt_legacy_guild().
+UNCLAIMED_GUILD_ID = ""
 
-        warnings_result = await session.execute(delete(Warning))
-        jailed_result = await session.execute(delete(JailedUser))
-        session.add(DatabaseMigration(
-            migration_id=WARNINGS_AND_JAILED_RESET_MIGRATION,
-        ))
 
-        print(
-            "🧹 One-time moderation reset complete: "
-            f"removed {warnings_result.rowcount} warning records and "
-            f"{jailed_result.rowcount} jailed-user records."
+async def scope_rows_by_guild(conn):
+    """Rebuild the single-server tables with a guild_id in their primary key, keeping every row."""
+    quote = conn.dialect.identifier_preparer.quote
+    for model in GUILD_SCOPED_MODELS:
+        table = model.__table__
+        columns = await conn.run_sync(
+            lambda sync_conn: [column["name"] for column in inspect(sync_conn).get_columns(table.name)]
         )
+        if "guild_id" in columns:
+            continue
+
+        # Neither Postgres nor SQLite can widen a primary key in place, so copy out and back.
+        legacy_table = quote(f"{table.name}_pre_guild")
+        column_list = ", ".join(quote(column) for column in columns)
+        await conn.execute(text(f"CREATE TABLE {legacy_table} AS SELECT * FROM {quote(table.name)}"))
+        await conn.run_sync(table.drop)
+        await conn.run_sync(table.create)
+        result = await conn.execute(
+            text(
+                f"INSERT INTO {quote(table.name)} ({quote('guild_id')}, {column_list}) "
+                f"SELECT :guild_id, {column_list} FROM {legacy_table}"
+            ),
+            {"guild_id": UNCLAIMED_GUILD_ID},
+        )
+        await conn.execute(text(f"DROP TABLE {legacy_table}"))
+        print(f"🗂️ Scoped {result.rowcount} {table.name} rows by guild.")
+
+
+GUILD_FLOOD_LIMITS_MIGRATION = "2026-10-17-guild-settings-flood-limits"
+
+
+async def add_guild_flood_limits(conn):
+    columns = await conn.run_sync(
+        lambda sync_conn: [column["name"] for column in inspect(sync_conn).get_columns(GuildSettings.__tablename__)]
+    )
+    if "flood_limits" not in columns:
+        await conn.execute(text("ALTER TABLE guild_settings ADD COLUMN flood_limits TEXT NOT NULL DEFAULT '{}'"))
+
+
+# Applied in order, once each; add new entries at the end and never rename old ones.
+SCHEMA_MIGRATIONS = [
+    (WARNINGS_AND_JAILED_RESET_MIGRATION, reset_warnings_and_jailed_users),
+    (GUILD_SCOPED_ROWS_MIGRATION, scope_rows_by_guild),
+    (GUILD_FLOOD_LIMITS_MIGRATION, add_guild_flood_limits),
+]
+
 
 async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    await reset_warnings_and_jailed_users_once()
+    applied = await run_migrations(engine, Base.metadata, DatabaseMigration.__table__, SCHEMA_MIGRATIONS)
+    if applied:
+        print(f"🗂️ Applied migrations: {', '.join(applied)}")
 
 
 async def init_db_with_retries(retry_delay_seconds: int = 5):
@@ -155,23 +474,121 @@ async def init_db_with_retries(retry_delay_seconds: int = 5):
             print(f"🔁 Retrying database initialization in {retry_delay_seconds}s...")
             await asyncio.sleep(retry_delay_seconds)
 
+def guild_config(guild):
+    return guild_configs.get(guild.id)
+
+
 def is_staff(member):
-    return any(role.id in STAFF_ROLE_IDS for role in member.roles)
+    staff_role_ids = guild_config(member.guild).staff_role_ids
+    return any(role.id in staff_role_ids for role in member.roles)
 
 
 def is_media_review_exempt(member):
     if is_staff(member):
         return True
-    return any(role.id == MEDIA_REVIEW_EXEMPT_ROLE_ID for role in member.roles)
+    exempt_role_id = guild_config(member.guild).media_review_exempt_role_id
+    return exempt_role_id is not None and any(role.id == exempt_role_id for role in member.roles)
+
+
+def legacy_guild_config():
+    return GuildConfig(
+        log_channel_id=LOG_CHANNEL_ID,
+        jail_role_id=JAIL_ROLE_ID,
+        review_channel_id=REVIEW_CHANNEL_ID,
+        media_review_channel_id=MEDIA_REVIEW_CHANNEL_ID,
+        ticket_category_id=TICKET_CATEGORY_ID,
+        media_review_exempt_role_id=MEDIA_REVIEW_EXEMPT_ROLE_ID,
+        staff_role_ids=STAFF_ROLE_IDS,
+    )
+
+
+def optional_id(value):
+    return int(value) if value else None
+
+
+def guild_config_from_row(row):
+    return GuildConfig(
+        log_channel_id=optional_id(row.log_channel_id),
+        jail_role_id=optional_id(row.jail_role_id),
+        review_channel_id=optional_id(row.review_channel_id),
+        media_review_channel_id=optional_id(row.media_review_channel_id),
+        ticket_category_id=optional_id(row.ticket_category_id),
+        media_review_exempt_role_id=optional_id(row.media_review_exempt_role_id),
+        staff_role_ids=json.loads(row.staff_role_ids or "[]"),
+        flood_limits=json.loads(row.flood_limits or "{}"),
+    )
+
 
-async def get_warnings(user_id):
+async def load_guild_configs():
+    token = guild_configs.snapshot_token()
     async with AsyncSessionLocal() as session:
-        result = await session.get(Warning, user_id)
-        return result.count if result else 0
+        rows = (await session.execute(select(GuildSettings))).scalars().all()
+    return guild_configs.apply_snapshot(token, {int(row.guild_id): guild_config_from_row(row) for row in rows})
+
+
+async def save_guild_config(guild_id, config):
+    values = {
+        name: str(value) if value is not None else None
+        for name, value in config.as_dict().items()
+        if name not in ("staff_role_ids", "flood_limits")
+    }
+    values["staff_role_ids"] = json.dumps(sorted(config.staff_role_ids))
+    values["flood_limits"] = json.dumps(dict(config.flood_limits), sort_keys=True)
+    async with AsyncSessionLocal.begin() as session:
+        await session.execute(
+            upsert(GuildSettings)
+            .values(guild_id=str(guild_id), **values)
+            .on_conflict_do_update(index_elements=[GuildSettings.guild_id], set_=values)
+        )
+    guild_configs.set(guild_id, config)
+    media_review_channels.pop(guild_id, None)
+
+
+async def adopt_legacy_guild(guild):
+    """Give the original server its hard-coded settings and every row from before multi-guild support."""
+    await save_guild_config(guild.id, legacy_guild_config())
+    async with AsyncSessionLocal.begin() as session:
+        for model in GUILD_SCOPED_MODELS:
+            await session.execute(
+                update(model)
+                .where(model.guild_id == UNCLAIMED_GUILD_ID)
+                .values(guild_id=str(guild.id))
+            )
+    await load_moderation_state()
+    await load_whitelist()
+    print(f"🏠 Adopted {guild.name} ({guild.id}) as the original server.")
+
+
+def member_key(guild_id, user_id):
+    return (str(guild_id), str(user_id))
+
+
+async def load_moderation_state():
+    token = moderation_state.snapshot_token()
+    async with AsyncSessionLocal() as session:
+        jailed = (await session.execute(select(JailedUser.guild_id, JailedUser.user_id))).all()
+        exempt = (await session.execute(select(ExemptUser.guild_id, ExemptUser.user_id))).all()
+    return moderation_state.apply_snapshot(
+        token,
+        jailed=[member_key(guild_id, user_id) for guild_id, user_id in jailed],
+        exempt=[member_key(guild_id, user_id) for guild_id, user_id in exempt],
+    )
 
-async def set_warnings(user_id, count):
+async def reconcile_moderation_state_periodically():
+    while True:
+        await asyncio.sleep(STATE_RECONCILE_INTERVAL_SECONDS)
+        try:
+            if not await load_moderation_state():
+                print("🔁 Skipped moderation state reconcile; a write landed mid-snapshot.")
+            # Picks up /config changes made by other shard processes.
+            await load_guild_configs()
+        except Exception as e:
+            print(f"⚠️ Failed to reconcile moderation state: {e}")
+
+async def set_warnings(guild_id, user_id, count):
+    key = member_key(guild_id, user_id)
     async with AsyncSessionLocal() as session:
-        obj = await session.get(Warning, user_id)
+        obj = await session.get(Warning, key)
         if count <= 0:
             if obj:
                 await session.delete(obj)
@@ -180,119 +597,414 @@ async def set_warnings(user_id, count):
         if obj:
             obj.count = count
         else:
-            obj = Warning(user_id=user_id, count=count)
+            obj = Warning(guild_id=key[0], user_id=key[1], count=count)
             session.add(obj)
         await session.commit()
 
-async def add_to_jailed(user_id):
+def upsert(model):
+    # Postgres in production, SQLite for local test setups; both support ON CONFLICT ... RETURNING.
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    if engine.dialect.name == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"Upserts are not supported on {engine.dialect.name}.")
+
+async def increment_warnings(guild_id, user_id, *, jail_threshold=WARNING_JAIL_THRESHOLD):
+    """Add one warning in a single statement, jailing the user in the same transaction at the threshold."""
+    key = member_key(guild_id, user_id)
+    async with AsyncSessionLocal.begin() as session:
+        result = await session.execute(
+            upsert(Warning)
+            .values(guild_id=key[0], user_id=key[1], count=1)
+            .on_conflict_do_update(
+                index_elements=[Warning.guild_id, Warning.user_id],
+                set_={"count": Warning.count + 1},
+            )
+            .returning(Warning.count)
+        )
+        count = result.scalar_one()
+        jailed = jail_threshold is not None and count >= jail_threshold
+        if jailed:
+            await session.execute(
+                delete(Warning).where(Warning.guild_id == key[0], Warning.user_id == key[1])
+            )
+            await session.execute(
+                upsert(JailedUser)
+                .values(guild_id=key[0], user_id=key[1])
+                .on_conflict_do_nothing(index_elements=[JailedUser.guild_id, JailedUser.user_id])
+            )
+
+    if jailed:
+        moderation_state.set_jailed(key, True)
+    return count, jailed
+
+async def add_to_jailed(guild_id, user_id):
+    key = member_key(guild_id, user_id)
     async with AsyncSessionLocal() as session:
-        if not await session.get(JailedUser, user_id):
-            session.add(JailedUser(user_id=user_id))
+        if not await session.get(JailedUser, key):
+            session.add(JailedUser(guild_id=key[0], user_id=key[1]))
             await session.commit()
+    moderation_state.set_jailed(key, True)
 
-async def remove_from_jailed(user_id):
+async def remove_from_jailed(guild_id, user_id):
+    key = member_key(guild_id, user_id)
     async with AsyncSessionLocal() as session:
-        record = await session.get(JailedUser, user_id)
+        record = await session.get(JailedUser, key)
         if record:
             await session.delete(record)
             await session.commit()
+    moderation_state.set_jailed(key, False)
 
-async def is_jailed(user_id):
-    async with AsyncSessionLocal() as session:
-        return await session.get(JailedUser, user_id) is not None
+async def is_jailed(guild_id, user_id):
+    return moderation_state.is_jailed(member_key(guild_id, user_id))
 
-async def is_whitelisted(message_content):
+async def load_whitelist():
+    phrases_by_guild = {}
     async with AsyncSessionLocal() as session:
-        result = await session.execute(select(WhitelistEntry))
-        phrases = [row[0].phrase for row in result.all()]
-        return any(phrase in message_content for phrase in phrases)
+        result = await session.execute(select(WhitelistEntry.guild_id, WhitelistEntry.phrase))
+        for guild_id, phrase in result.all():
+            if guild_id != UNCLAIMED_GUILD_ID:
+                phrases_by_guild.setdefault(int(guild_id), []).append(phrase)
+    for guild_id in set(whitelist_matchers) - set(phrases_by_guild):
+        del whitelist_matchers[guild_id]
+    for guild_id, phrases in phrases_by_guild.items():
+        async with whitelist_lock(guild_id):
+            await rebuild_whitelist(guild_id, phrases)
+    total = sum(len(phrases) for phrases in phrases_by_guild.values())
+    print(f"📃 Loaded {total} whitelisted phrases across {len(phrases_by_guild)} guilds.")
+
+async def rebuild_whitelist(guild_id, phrases):
+    matcher = whitelist_matchers.get(guild_id)
+    if matcher is None:
+        matcher = whitelist_matchers[guild_id] = WhitelistMatcher()
+    # Building the automaton for a large whitelist takes a while; keep it off the event loop.
+    await asyncio.to_thread(matcher.rebuild, phrases)
+    verdict_cache.invalidate()
+
+def whitelist_lock(guild_id):
+    lock = whitelist_locks.get(guild_id)
+    if lock is None:
+        lock = whitelist_locks[guild_id] = asyncio.Lock()
+    return lock
+
+async def refresh_whitelist(guild_id):
+    # Re-read under the lock so the last rebuild always reflects the latest committed phrases.
+    async with whitelist_lock(guild_id):
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(WhitelistEntry.phrase).where(WhitelistEntry.guild_id == str(guild_id))
+            )
+            phrases = frozenset(result.scalars().all())
+        if phrases != whitelisted_phrases(guild_id):
+            await rebuild_whitelist(guild_id, phrases)
 
-async def is_exempt(user_id):
-    async with AsyncSessionLocal() as session:
-        return await session.get(ExemptUser, user_id) is not None
+def whitelisted_phrases(guild_id):
+    matcher = whitelist_matchers.get(guild_id)
+    return matcher.phrases if matcher else frozenset()
+
+def is_whitelisted(guild_id, message_content):
+    matcher = whitelist_matchers.get(guild_id)
+    return matcher is not None and matcher.matches(message_content)
+
+async def is_exempt(guild_id, user_id):
+    return moderation_state.is_exempt(member_key(guild_id, user_id))
 
-async def add_exempt_user(user_id):
+async def add_exempt_user(guild_id, user_id):
+    key = member_key(guild_id, user_id)
     async with AsyncSessionLocal() as session:
-        if not await session.get(ExemptUser, user_id):
-            session.add(ExemptUser(user_id=user_id))
+        if not await session.get(ExemptUser, key):
+            session.add(ExemptUser(guild_id=key[0], user_id=key[1]))
             await session.commit()
+    moderation_state.set_exempt(key, True)
 
-async def remove_exempt_user(user_id):
+async def remove_exempt_user(guild_id, user_id):
+    key = member_key(guild_id, user_id)
     async with AsyncSessionLocal() as session:
-        record = await session.get(ExemptUser, user_id)
+        record = await session.get(ExemptUser, key)
         if record:
             await session.delete(record)
             await session.commit()
+    moderation_state.set_exempt(key, False)
+
+async def list_exempt_users(guild_id):
+    guild_id = str(guild_id)
+    return sorted(user_id for exempt_guild_id, user_id in moderation_state.exempt if exempt_guild_id == guild_id)
+
+LENIENT_MODERATION_PROMPT = (
+    "You are an AI content moderation system for a Discord server.\n\n"
+    "Flag messages only when they contain explicit, unmistakable racist or hate-filled language.\n"
+    "Ignore mild profanity, jokes, or context unless the message clearly includes outright racism or hate speech.\n\n"
+    "If the message is explicitly racist or hate speech, respond only with: DELETE\n"
+    "If it is not, respond only with: SAFE\n"
+    "Do not explain your decision."
+)
+STRICT_MODERATION_PROMPT = (
+    "You are an AI content moderation system for a Discord server.\n\n"
+    "Flag messages that contain clear or strongly implied:\n"
+    "- Racism, hate speech, or slurs (even if censored)\n"
+    "- Ableism, transphobia, homophobia, or sexism\n"
+    "- Harassment, threats, incitement, or targeted bullying\n"
+    "- Known dog whistles or coded hate terms\n\n"
+    "Be alert for attempts to bypass filters using misspellings, emojis, slang, acronyms, or indirect phrasing — but do not flag unless the message is *reasonably likely* to be harmful or targeted.\n\n"
+    "If the message violates these guidelines, respond only with: DELETE\n"
+    "If it does not, respond only with: SAFE\n"
+    "Do not explain your decision."
+)
+BATCH_MODERATION_INSTRUCTIONS = (
+    "\n\nYou will receive several independent messages, each on its own line as "
+    "<number>: <JSON-encoded message>. Judge each message on its own.\n"
+    "Respond with exactly one line per message in the form <number>: DELETE or <number>: SAFE, "
+    "and nothing else."
+)
+BATCH_VERDICT_PATTERN = re.compile(r"^\s*(\d+)\s*[:.)-]\s*(DELETE|SAFE)\b", re.IGNORECASE | re.MULTILINE)
+
+MODERATION_BATCH_WINDOW_SECONDS = 0.1
+MODERATION_BATCH_MAX_SIZE = 20
+VERDICT_CACHE_MAX_ENTRIES = 50_000
+VERDICT_CACHE_TTL_SECONDS = 60 * 60
+MODERATION_DEADLINE_SECONDS = 6
+MODERATION_RECHECK_DELAY_SECONDS = 30
+MODERATION_RECHECK_ATTEMPTS = 3
+MODERATION_WORKERS = 64
+MODERATION_MAX_BACKLOG = 5_000
+SCAN_BATCH_WINDOW_SECONDS = 0.5
+SCAN_PAGE_SIZE = 100
+SCAN_CONCURRENCY = 40
+SCAN_PROGRESS_INTERVAL_SECONDS = 5
+# Messages allowed per number of seconds, unless /config overrides them.
+DEFAULT_FLOOD_LIMITS = {"default": (8, 10), "exempt": (15, 10)}
+FLOOD_WARNING_DELAY_SECONDS = 10
+RAID_NEW_ACCOUNT_AGE_SECONDS = 7 * 24 * 60 * 60
+RAID_RECENT_JOIN_SECONDS = 30 * 60
+RAID_CHECK_INTERVAL_SECONDS = 10
+RAID_BAN_INTERVAL_SECONDS = 1.0
+
+time_to_verdict = LatencyRecorder()
+moderation_fallbacks = Counter()
+moderation_rechecks = set()
+
+
+def estimate_tokens(messages, completion_tokens=16):
+    # Roughly four characters per token plus per-message overhead; the governor corrects with real usage.
+    return sum(len(message["content"]) // 4 + 4 for message in messages) + completion_tokens
+
+
+async def create_chat_completion(*, priority=LIVE, completion_tokens=16, hedge=False, **kwargs):
+    def attempt(sent=None):
+        def request():
+            # Called once the governor admits the request, which is when the hedge clock starts.
+            if sent is not None:
+                sent()
+            return openai_client.chat.completions.with_raw_response.create(**kwargs)
+
+        return openai_governor.call(
+            request,
+            priority=priority,
+            estimated_tokens=estimate_tokens(kwargs["messages"], completion_tokens),
+        )
+
+    with openai_request_seconds.time(PRIORITY_NAMES[priority]):
+        if hedge:
+            # A queued-up governor means we're at capacity; a second copy would only add to the queue.
+            response = await moderation_hedging.run(attempt, can_hedge=lambda: not openai_governor.has_backlog())
+        else:
+            response = await attempt()
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        openai_tokens.inc("prompt", amount=usage.prompt_tokens)
+        openai_tokens.inc("completion", amount=usage.completion_tokens)
+    return response
+
+
+def moderation_prompt(lenient):
+    return LENIENT_MODERATION_PROMPT if lenient else STRICT_MODERATION_PROMPT
+
+
+async def classify_message(message_content, *, lenient=False, priority=LIVE):
+    response = await create_chat_completion(
+        priority=priority,
+        hedge=priority == LIVE,
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": moderation_prompt(lenient)},
+            {"role": "user", "content": message_content}
+        ],
+        temperature=0
+    )
+    return response.choices[0].message.content.strip().upper()
 
-async def list_exempt_users():
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(select(ExemptUser))
-        return [row[0].user_id for row in result.all()]
 
-async def moderate_message(message_content, *, lenient=False):
-    if await is_whitelisted(message_content):
+async def classify_message_batch(message_contents, *, lenient=False, priority=LIVE):
+    if len(message_contents) == 1:
+        return [await classify_message(message_contents[0], lenient=lenient, priority=priority)]
+
+    numbered = "\n".join(
+        f"{index}: {json.dumps(content, ensure_ascii=False)}"
+        for index, content in enumerate(message_contents, start=1)
+    )
+    response = await create_chat_completion(
+        priority=priority,
+        completion_tokens=8 * len(message_contents),
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": moderation_prompt(lenient) + BATCH_MODERATION_INSTRUCTIONS},
+            {"role": "user", "content": numbered}
+        ],
+        temperature=0
+    )
+    reply = response.choices[0].message.content
+
+    verdicts = [None] * len(message_contents)
+    for number, verdict in BATCH_VERDICT_PATTERN.findall(reply):
+        index = int(number) - 1
+        if 0 <= index < len(verdicts):
+            verdicts[index] = verdict.upper()
+
+    # Anything the model skipped or garbled gets classified on its own.
+    missing = [index for index, verdict in enumerate(verdicts) if verdict is None]
+    if missing:
+        print(f"⚠️ Batch reply was missing {len(missing)} of {len(verdicts)} verdicts; retrying individually.")
+        retried = await asyncio.gather(*(
+            classify_message(message_contents[index], lenient=lenient, priority=priority) for index in missing
+        ))
+        for index, verdict in zip(missing, retried):
+            verdicts[index] = verdict
+    return verdicts
+
+
+moderation_batcher = ModerationBatcher(
+    classify_message_batch,
+    window_seconds=MODERATION_BATCH_WINDOW_SECONDS,
+    max_batch_size=MODERATION_BATCH_MAX_SIZE,
+)
+# Retroactive scans share the verdict cache but wait behind live traffic at the governor.
+scan_batcher = ModerationBatcher(
+    lambda message_contents, lenient: classify_message_batch(message_contents, lenient=lenient, priority=BACKGROUND),
+    window_seconds=SCAN_BATCH_WINDOW_SECONDS,
+    max_batch_size=MODERATION_BATCH_MAX_SIZE,
+)
+
+def load_prefilter():
+    if not os.path.exists(PREFILTER_LEXICON_PATH):
+        print(f"⚠️ Pre-filter lexicon {PREFILTER_LEXICON_PATH} not found; only obviously safe messages will skip the LLM.")
+        return Prefilter()
+    lexicon = Lexicon.from_file(PREFILTER_LEXICON_PATH)
+    print(f"🧰 Loaded {lexicon.size} pre-filter lexicon terms.")
+    return Prefilter(lexicon=lexicon)
+
+
+prefilter = load_prefilter()
+verdict_cache = VerdictCache(
+    max_entries=VERDICT_CACHE_MAX_ENTRIES,
+    ttl_seconds=VERDICT_CACHE_TTL_SECONDS,
+)
+
+
+async def moderate_message(message_content, *, guild_id, lenient=False, batcher=None):
+    with stage("whitelist"):
+        whitelisted = is_whitelisted(guild_id, message_content)
+    if whitelisted:
         return "SAFE"
-    try:
-        if lenient:
-            system_prompt = (
-                "You are an AI content moderation system for a Discord server.\n\n"
-                "Flag messages only when they contain explicit, unmistakable racist or hate-filled language.\n"
-                "Ignore mild profanity, jokes, or context unless the message clearly includes outright racism or hate speech.\n\n"
-                "If the message is explicitly racist or hate speech, respond only with: DELETE\n"
-                "If it is not, respond only with: SAFE\n"
-                "Do not explain your decision."
-            )
-        else:
-            system_prompt = (
-                "You are an AI content moderation system for a Discord server.\n\n"
-                "Flag messages that contain clear or strongly implied:\n"
-                "- Racism, hate speech, or slurs (even if censored)\n"
-                "- Ableism, transphobia, homophobia, or sexism\n"
-                "- Harassment, threats, incitement, or targeted bullying\n"
-                "- Known dog whistles or coded hate terms\n\n"
-                "Be alert for attempts to bypass filters using misspellings, emojis, slang, acronyms, or indirect phrasing — but do not flag unless the message is *reasonably likely* to be harmful or targeted.\n\n"
-                "If the message violates these guidelines, respond only with: DELETE\n"
-                "If it does not, respond only with: SAFE\n"
-                "Do not explain your decision."
-            )
-        response = await openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": message_content}
-            ],
-            temperature=0
+    with stage("prefilter"):
+        verdict = prefilter.classify(message_content, lenient=lenient)
+    if verdict is not ESCALATE:
+        return verdict
+    with stage("llm"):
+        return await verdict_cache.get_or_compute(
+            message_content,
+            lenient,
+            lambda: (batcher or moderation_batcher).submit(message_content, lenient=lenient),
         )
-        return response.choices[0].message.content.strip().upper()
-    except Exception as e:
-        print(f"Moderation error: {e}")
-        return "SAFE"
+
+startup_marks = {}
+STARTUP_PHASES = (
+    ("imported", "import"),
+    ("database_ready", "DB init"),
+    ("setup_done", "setup"),
+    ("ready", "login"),
+    ("commands_synced", "command sync"),
+    ("first_message", "first message"),
+)
+
+
+def mark_startup(phase):
+    if phase in startup_marks:
+        return
+    startup_marks[phase] = time.perf_counter() - PROCESS_STARTED
+    if phase in ("commands_synced", "first_message"):
+        print(format_startup_report())
+
+
+def format_startup_report():
+    parts = []
+    previous = 0.0
+    for phase, label in STARTUP_PHASES:
+        if phase not in startup_marks:
+            continue
+        parts.append(f"{label} {format_ms(startup_marks[phase] - previous)}")
+        previous = startup_marks[phase]
+    return "⏱️ Startup: " + " · ".join(parts) + f" · total {format_ms(previous)}"
+
+
+def command_tree_hash():
+    payload = sorted((command.to_dict() for command in bot.tree.get_commands()), key=lambda command: command["name"])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+async def sync_commands_if_changed():
+    """Sync the global command tree only when its payload differs from the last successful sync."""
+    payload_hash = command_tree_hash()
+    async with AsyncSessionLocal() as session:
+        last_sync = await session.get(CommandSync, "global")
+    if last_sync and last_sync.payload_hash == payload_hash and not FORCE_COMMAND_SYNC:
+        print("🔁 Slash commands unchanged since the last sync; skipping.")
+        return
+    synced = await bot.tree.sync()
+    values = {"scope": "global", "payload_hash": payload_hash, "synced_at": int(time.time())}
+    async with AsyncSessionLocal.begin() as session:
+        await session.execute(
+            upsert(CommandSync)
+            .values(**values)
+            .on_conflict_do_update(index_elements=[CommandSync.scope], set_=values)
+        )
+    print(f"🔁 Synced {len(synced)} slash commands.")
+
 
 @bot.event
 async def on_ready():
+    # on_ready fires again after every gateway reconnect; the once-per-process work is skipped then.
+    first_ready = "ready" not in startup_marks
+    mark_startup("ready")
     print(f"✅ Bot connected as {bot.user}")
     await bot.change_presence(
         status=discord.Status.online,
         activity=discord.Activity(type=discord.ActivityType.watching, name="for hate speech 👀")
     )
+    for guild in bot.guilds:
+        if guild.id not in guild_configs and guild.get_channel(LOG_CHANNEL_ID):
+            await adopt_legacy_guild(guild)
+    await resume_channel_scans()
+    print(f"🌐 Serving {len(bot.guilds)} guilds on {bot.shard_count or 1} shards ({len(guild_configs)} configured).")
+    if not first_ready:
+        return
     try:
-        synced = await bot.tree.sync()
-        print(f"🔁 Synced {len(synced)} slash commands.")
+        await sync_commands_if_changed()
     except Exception as e:
         print(f"❌ Failed to sync commands: {e}")
+    mark_startup("commands_synced")
 
 @bot.event
 async def on_message(message):
     if message.author.bot:
         return
 
-    if isinstance(message.channel, discord.TextChannel):
-        if (
-            message.channel.category_id == TICKET_CATEGORY_ID
-            and message.channel.name.startswith("ticket")
-        ):
-            await bot.process_commands(message)
-            return
+    if message.guild is None:
+        await bot.process_commands(message)
+        return
+
+    if is_ticket_channel(message.channel):
+        await bot.process_commands(message)
+        return
 
     if has_media_attachments(message) and not is_media_review_exempt(message.author):
         await handle_media_message(message)
@@ -302,20 +1014,196 @@ async def on_message(message):
         await bot.process_commands(message)
         return
 
-    user_id = str(message.author.id)
-    lenient = await is_exempt(user_id)
-    verdict = await moderate_message(message.content, lenient=lenient)
+    new_account = is_new_account(message.author)
+    transition, repeats = raid_detector.record_message(message.guild.id, message.content, new_account=new_account)
+    if transition == STARTED:
+        announce_raid(message.guild)
+    if new_account and raid_detector.active_raid(message.guild.id):
+        await handle_raid_message(message, repeats)
+        await bot.process_commands(message)
+        return
+
+    limit = flood_limit(message.author)
+    if limit and not flood_throttle.allow(member_key(message.guild.id, message.author.id), *limit):
+        await handle_flood_message(message)
+        await bot.process_commands(message)
+        return
+
+    # Moderation runs on the queue's workers so commands aren't stuck behind an LLM round trip.
+    edit_tracker.remember(message.id, message.content)
+    moderation_queue.submit(message.channel.id, message.author.id, message)
+    await bot.process_commands(message)
+
 
-    if verdict == "DELETE":
-        try:
+def is_ticket_channel(channel):
+    if not isinstance(channel, discord.TextChannel):
+        return False
+    ticket_category_id = guild_config(channel.guild).ticket_category_id
+    return (
+        ticket_category_id is not None
+        and channel.category_id == ticket_category_id
+        and channel.name.startswith("ticket")
+    )
+
+
+edit_tracker = EditTracker()
+
+
+class EditedMessage:
+    """Queue job for an edit: the edited message, plus the part of its text that still needs judging."""
+
+    __slots__ = ("message", "content")
+
+    def __init__(self, message, content):
+        self.message = message
+        self.content = content
+
+
+def unwrap_queued_message(job):
+    if isinstance(job, EditedMessage):
+        return job.message, job.content
+    return job, job.content
+
+
+@bot.event
+async def on_message_edit(before, after):
+    await moderate_edited_message(after, before.content)
+
+
+@bot.event
+async def on_raw_message_edit(payload):
+    # Cached messages are handled by on_message_edit, which also has the text from before the edit.
+    if payload.cached_message is not None or payload.guild_id is None or "content" not in payload.data:
+        return
+    if not edit_tracker.text_changed(payload.message_id, None, payload.data["content"]):
+        return
+    channel = bot.get_channel(payload.channel_id)
+    if channel is None:
+        return
+    try:
+        message = await channel.fetch_message(payload.message_id)
+    except (discord.NotFound, discord.Forbidden):
+        return
+    await moderate_edited_message(message, None, text_checked=True)
+
+
+async def moderate_edited_message(message, before_content, *, text_checked=False):
+    """Queue an edit for moderation, unless its text didn't really change or it's exempt like new messages."""
+    if message.author.bot or message.guild is None or not isinstance(message.author, discord.Member):
+        return
+    if is_ticket_channel(message.channel) or is_staff(message.author):
+        return
+    if has_media_attachments(message) and not is_media_review_exempt(message.author):
+        return
+    if not text_checked and not edit_tracker.text_changed(message.id, before_content, message.content):
+        return
+    limit = flood_limit(message.author)
+    if limit and not flood_throttle.allow(member_key(message.guild.id, message.author.id), *limit):
+        await handle_flood_message(message)
+        return
+    content = edit_tracker.text_to_check(before_content, message.content)
+    moderation_queue.submit(message.channel.id, message.author.id, EditedMessage(message, content))
+
+
+async def classify_queued_message(job):
+    message, content = unwrap_queued_message(job)
+    tracer.begin(
+        message_id=message.id,
+        guild_id=message.guild.id,
+        channel_id=message.channel.id,
+        edited=message is not job,
+    )
+    with stage("exempt"):
+        lenient = await is_exempt(message.guild.id, message.author.id)
+    return await moderate_message_with_deadline(message, lenient=lenient, content=content)
+
+
+async def act_on_queued_message(job, verdict):
+    message, _ = unwrap_queued_message(job)
+    messages_moderated.inc(verdict)
+    try:
+        if verdict == "DELETE":
+            await act_on_violation(message)
+    finally:
+        tracer.finish(verdict=verdict)
+        mark_startup("first_message")
+
+
+def shed_queued_message(message):
+    moderation_fallbacks[("shed", "open")] += 1
+
+
+async def act_on_violation(message):
+    try:
+        with stage("delete"):
             await message.delete()
-            await log_violation(message)
-            if not is_staff(message.author):
+        with stage("log"):
+            log_violation(message)
+        if not is_staff(message.author):
+            with stage("warn"):
                 await warn_user(message.author, message.guild)
-        except discord.Forbidden:
-            print("⚠️ Missing permissions to delete message or manage roles.")
+    except discord.NotFound:
+        pass
+    except discord.Forbidden:
+        print("⚠️ Missing permissions to delete message or manage roles.")
 
-    await bot.process_commands(message)
+
+async def moderate_message_with_deadline(message, *, lenient=False, content=None):
+    """Return a verdict within MODERATION_DEADLINE_SECONDS, applying MODERATION_FAILURE_POLICY otherwise."""
+    content = message.content if content is None else content
+    started = time.perf_counter()
+    try:
+        verdict = await asyncio.wait_for(
+            moderate_message(content, guild_id=message.guild.id, lenient=lenient),
+            timeout=MODERATION_DEADLINE_SECONDS,
+        )
+        time_to_verdict.record(time.perf_counter() - started)
+        return verdict
+    except asyncio.TimeoutError:
+        reason = "timeout"
+    except Exception as e:
+        print(f"Moderation error: {e}")
+        reason = "error"
+
+    time_to_verdict.record(time.perf_counter() - started)
+    moderation_fallbacks[(reason, MODERATION_FAILURE_POLICY)] += 1
+    if MODERATION_FAILURE_POLICY == "closed":
+        # Hide the message but don't warn: nobody has actually judged it yet.
+        try:
+            await message.delete()
+        except (discord.NotFound, discord.Forbidden):
+            pass
+        return "SAFE"
+    if MODERATION_FAILURE_POLICY == "recheck":
+        task = asyncio.create_task(recheck_message(message, lenient=lenient, content=content))
+        moderation_rechecks.add(task)
+        task.add_done_callback(moderation_rechecks.discard)
+    return "SAFE"
+
+
+async def recheck_message(message, *, lenient=False, content=None):
+    content = message.content if content is None else content
+    for attempt in range(1, MODERATION_RECHECK_ATTEMPTS + 1):
+        try:
+            # An in-flight or cached verdict from the original attempt is reused here.
+            verdict = await moderate_message(content, guild_id=message.guild.id, lenient=lenient)
+        except Exception as e:
+            print(f"Moderation recheck {attempt}/{MODERATION_RECHECK_ATTEMPTS} failed: {e}")
+            await asyncio.sleep(MODERATION_RECHECK_DELAY_SECONDS)
+            continue
+        if verdict == "DELETE":
+            await act_on_violation(message)
+        return
+    print(f"⚠️ Giving up on moderating message {message.id} after {MODERATION_RECHECK_ATTEMPTS} rechecks.")
+
+
+moderation_queue = ModerationQueue(
+    classify_queued_message,
+    act_on_queued_message,
+    workers=MODERATION_WORKERS,
+    max_backlog=MODERATION_MAX_BACKLOG,
+    on_shed=shed_queued_message,
+)
 
 
 def has_media_attachments(message: discord.Message):
@@ -374,6 +1262,200 @@ def build_approved_media_message(author_mention: str, text: str):
     return author_mention
 
 
+async def load_pending_media_reviews():
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(select(PendingMediaReview))).scalars().all()
+    for row in rows:
+        pending_media_reviews[int(row.review_message_id)] = {
+            "channel_id": int(row.channel_id),
+            "placeholder_id": int(row.placeholder_id),
+            "author_id": int(row.author_id),
+            "author_mention": row.author_mention,
+            "text": row.text,
+            "media": json.loads(row.media),
+            "created_at": row.created_at,
+        }
+    if rows:
+        print(f"🖼️ Restored {len(rows)} pending media reviews.")
+
+
+async def save_pending_media_review(review_message_id, payload):
+    async with AsyncSessionLocal() as session:
+        session.add(PendingMediaReview(
+            review_message_id=str(review_message_id),
+            channel_id=str(payload["channel_id"]),
+            placeholder_id=str(payload["placeholder_id"]),
+            author_id=str(payload["author_id"]),
+            author_mention=payload["author_mention"],
+            text=payload["text"],
+            media=json.dumps(payload["media"]),
+            created_at=payload["created_at"],
+        ))
+        await session.commit()
+
+
+async def delete_pending_media_reviews(review_message_ids):
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            delete(PendingMediaReview)
+            .where(PendingMediaReview.review_message_id.in_([str(i) for i in review_message_ids]))
+        )
+        await session.commit()
+
+
+def referenced_media_digests():
+    # Uploads still being handled hold their files too, even before any review references them.
+    return media_spool.held_digests() | {
+        media["sha256"]
+        for payload in pending_media_reviews.values()
+        for media in payload["media"]
+    }
+
+
+def unhold_media(media_items):
+    for media in media_items:
+        media_spool.release(media["sha256"])
+    release_media({"media": media_items})
+
+
+def release_media(payload):
+    still_referenced = referenced_media_digests()
+    for media in payload["media"]:
+        if media["sha256"] not in still_referenced:
+            media_spool.remove(media["sha256"])
+
+
+async def sweep_media_spool():
+    now = int(time.time())
+    expired = {
+        review_id
+        for review_id, payload in pending_media_reviews.items()
+        if now - payload["created_at"] > MEDIA_REVIEW_MAX_AGE_SECONDS
+    }
+
+    # Then drop the oldest reviews until the files they hold fit the size budget.
+    refcounts = Counter()
+    sizes = {}
+    for review_id, payload in pending_media_reviews.items():
+        if review_id in expired:
+            continue
+        for media in payload["media"]:
+            refcounts[media["sha256"]] += 1
+            sizes[media["sha256"]] = media["size"]
+    spooled_bytes = sum(sizes.values())
+
+    over_budget = set()
+    oldest_first = sorted(
+        (review_id for review_id in pending_media_reviews if review_id not in expired),
+        key=lambda review_id: pending_media_reviews[review_id]["created_at"],
+    )
+    for review_id in oldest_first:
+        if spooled_bytes <= MEDIA_SPOOL_MAX_TOTAL_BYTES:
+            break
+        over_budget.add(review_id)
+        for media in pending_media_reviews[review_id]["media"]:
+            refcounts[media["sha256"]] -= 1
+            if refcounts[media["sha256"]] == 0:
+                spooled_bytes -= sizes[media["sha256"]]
+
+    evicted = expired | over_budget
+    if evicted:
+        await delete_pending_media_reviews(evicted)
+        for review_id in evicted:
+            pending_media_reviews.pop(review_id, None)
+        print(f"🧹 Evicted {len(expired)} expired and {len(over_budget)} over-budget media reviews.")
+
+    freed = await asyncio.to_thread(media_spool.prune, referenced_media_digests())
+    if freed:
+        print(f"🧹 Freed {freed / (1024 * 1024):.1f} MiB from the media spool.")
+
+
+async def sweep_media_spool_periodically():
+    while True:
+        try:
+            await sweep_media_spool()
+        except Exception as e:
+            print(f"⚠️ Failed to sweep media spool: {e}")
+        await asyncio.sleep(MEDIA_SPOOL_SWEEP_INTERVAL_SECONDS)
+
+
+async def resolve_media_review_channel(guild):
+    channel = media_review_channels.get(guild.id)
+    if channel:
+        return channel
+    channel_id = guild_config(guild).media_review_channel_id
+    if channel_id is None:
+        print(f"⚠️ No media review channel configured for {guild.name} ({guild.id}).")
+        return None
+
+    channel = bot.get_channel(channel_id)
+    if not channel:
+        try:
+            channel = await guild.fetch_channel(channel_id)
+        except (discord.NotFound, discord.Forbidden) as e:
+            print(f"⚠️ Unable to access media review channel {channel_id}: {e}")
+            return None
+
+    media_review_channels[guild.id] = channel
+    return channel
+
+
+async def spool_media_attachment(attachment):
+    async with media_download_semaphore:
+        try:
+            return await asyncio.wait_for(
+                media_spool.store_attachment(attachment),
+                timeout=MEDIA_DOWNLOAD_TIMEOUT_SECONDS,
+            )
+        except asyncio.TimeoutError:
+            print(f"⚠️ Timed out spooling media attachment {attachment.filename}.")
+        except Exception as e:
+            print(f"⚠️ Failed to spool media attachment {attachment.filename}: {e}")
+    return None
+
+
+async def load_media_fingerprints():
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(
+            select(MediaFingerprint.sha256, MediaFingerprint.phash, MediaFingerprint.decision)
+        )).all()
+    for sha256, phash, decision in rows:
+        media_fingerprints.record(sha256, int(phash, 16) if phash else None, decision)
+    print(f"🧬 Loaded {len(rows)} media fingerprints.")
+
+
+async def fingerprint_media(media):
+    if media.get("phash") is None and media["filename"].lower().endswith(IMAGE_EXTENSIONS):
+        phash = await asyncio.to_thread(dhash_file, media_spool.path_for(media["sha256"]))
+        media["phash"] = f"{phash:016x}" if phash is not None else None
+    return media
+
+
+def lookup_media_decision(media):
+    phash = media.get("phash")
+    return media_fingerprints.lookup(media["sha256"], int(phash, 16) if phash else None)
+
+
+async def record_media_fingerprints(media_items, decision):
+    # Jailing is a judgement about the poster, not the file; repeats are just disapproved.
+    decision = "approved" if decision == "approved" else "disapproved"
+    now = int(time.time())
+    for media in media_items:
+        phash = media.get("phash")
+        media_fingerprints.record(media["sha256"], int(phash, 16) if phash else None, decision)
+    try:
+        async with AsyncSessionLocal.begin() as session:
+            for media in media_items:
+                values = {"phash": media.get("phash"), "decision": decision, "updated_at": now}
+                await session.execute(
+                    upsert(MediaFingerprint)
+                    .values(sha256=media["sha256"], **values)
+                    .on_conflict_do_update(index_elements=[MediaFingerprint.sha256], set_=values)
+                )
+    except Exception as e:
+        print(f"⚠️ Failed to persist media fingerprints: {e}")
+
+
 async def handle_media_message(message: discord.Message):
     media_attachments = []
     for attachment in message.attachments:
@@ -397,25 +1479,18 @@ async def handle_media_message(message: discord.Message):
     text = message.content or ""
     pending_content = build_pending_media_message()
 
-    stored_media = []
-    for attachment in media_attachments:
-        try:
-            stored_media.append({
-                "filename": attachment.filename,
-                "bytes": await attachment.read(),
-            })
-        except Exception as e:
-            print(f"⚠️ Failed to cache media attachment {attachment.filename}: {e}")
-
-    if not stored_media:
-        print("⚠️ No media attachments could be cached for media review.")
-        await bot.process_commands(message)
-        return
+    # Start fetching right away (the CDN copy can vanish once the message is gone),
+    # but hide the original without waiting for the downloads to finish.
+    downloads = [asyncio.create_task(spool_media_attachment(attachment)) for attachment in media_attachments]
 
     try:
         await message.delete()
     except discord.Forbidden:
         print("⚠️ Missing permissions to delete media message.")
+        for download in downloads:
+            download.cancel()
+        finished = await asyncio.gather(*downloads, return_exceptions=True)
+        unhold_media([media for media in finished if isinstance(media, dict)])
         await bot.process_commands(message)
         return
 
@@ -424,19 +1499,53 @@ async def handle_media_message(message: discord.Message):
         allowed_mentions=discord.AllowedMentions.none(),
     )
 
-    review_channel = bot.get_channel(MEDIA_REVIEW_CHANNEL_ID)
-    if not review_channel and message.guild:
-        review_channel = message.guild.get_channel(MEDIA_REVIEW_CHANNEL_ID)
+    with stage("media_download"):
+        stored_media = [media for media in await asyncio.gather(*downloads) if media]
+    try:
+        await review_media_message(message, placeholder, text, stored_media)
+    finally:
+        # Files a pending review references stay; anything else goes once this upload is done.
+        unhold_media(stored_media)
+
+
+async def review_media_message(message, placeholder, text, stored_media):
+    if not stored_media:
+        print("⚠️ No media attachments could be cached for media review.")
+        await placeholder.edit(
+            content=build_approved_media_message(message.author.mention, text) + "\n*Media could not be processed.*",
+            allowed_mentions=discord.AllowedMentions(everyone=False, roles=False),
+        )
+        return
 
-    if not review_channel and message.guild:
+    await asyncio.gather(*(fingerprint_media(media) for media in stored_media))
+    known_decisions = [lookup_media_decision(media) for media in stored_media]
+    auto_approve = all(decision == "approved" for decision in known_decisions)
+    if auto_approve and text.strip():
+        # Known media can carry a new caption; it's reposted under the author's name, so it must pass moderation.
         try:
-            review_channel = await message.guild.fetch_channel(MEDIA_REVIEW_CHANNEL_ID)
-        except (discord.NotFound, discord.Forbidden) as e:
-            print(f"⚠️ Unable to access media review channel {MEDIA_REVIEW_CHANNEL_ID}: {e}")
-            return
+            verdict = await asyncio.wait_for(
+                moderate_message(text, guild_id=message.guild.id),
+                timeout=MODERATION_DEADLINE_SECONDS,
+            )
+            auto_approve = verdict == "SAFE"
+        except asyncio.TimeoutError:
+            auto_approve = False
+        except Exception as e:
+            print(f"⚠️ Failed to moderate the caption of known media; sending it to review: {e}")
+            auto_approve = False
+    if "disapproved" in known_decisions or auto_approve:
+        decision = "disapproved" if "disapproved" in known_decisions else "approved"
+        media_fingerprints.auto_resolved += 1
+        print(f"🧬 Auto-{decision} media from {message.author} matching earlier review decisions.")
+        await apply_media_decision(placeholder, {
+            "author_mention": message.author.mention,
+            "text": text,
+            "media": stored_media,
+        }, decision)
+        return
 
+    review_channel = await resolve_media_review_channel(message.guild)
     if not review_channel:
-        print(f"⚠️ Media review channel {MEDIA_REVIEW_CHANNEL_ID} not found.")
         return
 
     embed = discord.Embed(
@@ -452,22 +1561,82 @@ async def handle_media_message(message: discord.Message):
         embed.add_field(name="Message Text", value=sanitize_message_content(text), inline=False)
     embed.set_author(name=str(message.author), icon_url=message.author.display_avatar.url)
     embed.add_field(name="Jump Link", value=f"[Open message location]({placeholder.jump_url})", inline=False)
-    review_files = [
-        discord.File(io.BytesIO(image["bytes"]), filename=image["filename"])
-        for image in stored_media
-    ]
+    with stage("media_preview"):
+        previews = await asyncio.gather(*(
+            build_media_preview(media, index) for index, media in enumerate(stored_media, start=1)
+        ))
+    review_files = [review_file for review_file, _ in previews]
+    embed.add_field(
+        name="Attachments",
+        value="\n".join(
+            f"- {media['filename']} ({media['size'] / (1024 * 1024):.1f} MB)"
+            + (" · preview shown" if is_preview else "")
+            for media, (_, is_preview) in zip(stored_media, previews)
+        )[:1024],
+        inline=False,
+    )
     if review_files:
         embed.set_image(url=f"attachment://{review_files[0].filename}")
 
     review_message = await review_channel.send(embed=embed, files=review_files, view=MediaReviewView())
-    pending_media_reviews[review_message.id] = {
+    payload = {
         "channel_id": message.channel.id,
         "placeholder_id": placeholder.id,
         "author_id": message.author.id,
         "author_mention": message.author.mention,
         "text": text,
         "media": stored_media,
+        "created_at": int(time.time()),
     }
+    pending_media_reviews[review_message.id] = payload
+    try:
+        await save_pending_media_review(review_message.id, payload)
+    except Exception as e:
+        print(f"⚠️ Failed to persist media review {review_message.id}; it will not survive a restart: {e}")
+
+
+async def build_media_preview(media, index):
+    """The file to show reviewers for ``media``: a small preview when one can be made, else the original.
+
+    Originals are then uploaded only once, to the placeholder, if the media is approved.
+    """
+    path = media_spool.path_for(media["sha256"])
+    filename = media["filename"].lower()
+    preview = None
+    async with media_preview_semaphore:
+        if filename.endswith(IMAGE_EXTENSIONS):
+            preview = await asyncio.to_thread(image_thumbnail, path)
+        elif filename.endswith(VIDEO_EXTENSIONS):
+            preview = await media_previewer.contact_sheet(path)
+    if preview is None or len(preview) >= media["size"]:
+        return discord.File(path, filename=media["filename"]), False
+    return discord.File(io.BytesIO(preview), filename=f"preview_{index}.jpg"), True
+
+
+async def apply_media_decision(placeholder, payload, decision):
+    if decision == "approved":
+        files = []
+        for media in payload["media"]:
+            if media_spool.exists(media["sha256"]):
+                files.append(discord.File(media_spool.path_for(media["sha256"]), filename=media["filename"]))
+
+        await placeholder.edit(
+            content=build_approved_media_message(payload["author_mention"], payload["text"]),
+            attachments=files,
+            allowed_mentions=discord.AllowedMentions(everyone=False, roles=False),
+        )
+    elif decision == "disapproved_jail":
+        await placeholder.edit(
+            content=f"{payload['author_mention']}: Media was disapproved and you were jailed by moderators.",
+            attachments=[],
+            allowed_mentions=discord.AllowedMentions(everyone=False, roles=False),
+        )
+    else:
+        await placeholder.edit(
+            content=f"{payload['author_mention']}: Media was not approved by moderators.",
+            attachments=[],
+            allowed_mentions=discord.AllowedMentions(everyone=False, roles=False),
+        )
 
 
 async def handle_media_review_decision(interaction: discord.Interaction, decision: str):
@@ -484,6 +1653,10 @@ async def handle_media_review_decision(interaction: discord.Interaction, decisio
     await interaction.response.defer(ephemeral=True)
 
     payload = pending_media_reviews.pop(message.id)
+    try:
+        await delete_pending_media_reviews([message.id])
+    except Exception as e:
+        print(f"⚠️ Failed to delete persisted media review {message.id}: {e}")
     channel = bot.get_channel(payload["channel_id"])
     if channel is None and interaction.guild:
         channel = interaction.guild.get_channel(payload["channel_id"])
@@ -504,37 +1677,17 @@ async def handle_media_review_decision(interaction: discord.Interaction, decisio
                 target_member = None
 
         if target_member:
-            jail_role = interaction.guild.get_role(JAIL_ROLE_ID)
+            jail_role_id = guild_config(interaction.guild).jail_role_id
+            jail_role = interaction.guild.get_role(jail_role_id) if jail_role_id else None
             if jail_role:
                 try:
                     await target_member.add_roles(jail_role)
-                    await add_to_jailed(str(target_member.id))
+                    await add_to_jailed(interaction.guild.id, target_member.id)
                 except discord.Forbidden:
                     print("⚠️ Missing permission to add jail role during media review.")
 
     if placeholder:
-        if decision == "approved":
-            files = []
-            for media in payload["media"]:
-                files.append(discord.File(io.BytesIO(media["bytes"]), filename=media["filename"]))
-
-            await placeholder.edit(
-                content=build_approved_media_message(payload["author_mention"], payload["text"]),
-                attachments=files,
-                allowed_mentions=discord.AllowedMentions(everyone=False, roles=False),
-            )
-        elif decision == "disapproved_jail":
-            await placeholder.edit(
-                content=f"{payload['author_mention']}: Media was disapproved and you were jailed by moderators.",
-                attachments=[],
-                allowed_mentions=discord.AllowedMentions(everyone=False, roles=False),
-            )
-        else:
-            await placeholder.edit(
-                content=f"{payload['author_mention']}: Media was not approved by moderators.",
-                attachments=[],
-                allowed_mentions=discord.AllowedMentions(everyone=False, roles=False),
-            )
+        await apply_media_decision(placeholder, payload, decision)
 
     if decision == "approved":
         status = "Approved ✅"
@@ -543,6 +1696,8 @@ async def handle_media_review_decision(interaction: discord.Interaction, decisio
     else:
         status = "Disapproved ❌"
 
+    await record_media_fingerprints(payload["media"], decision)
+    release_media(payload)
     await message.edit(content=f"{status} by {moderator.mention}", embed=message.embeds[0] if message.embeds else None, view=None)
     await interaction.followup.send("✅ Media review updated.", ephemeral=True)
 
@@ -589,86 +1744,351 @@ class MediaReviewView(discord.ui.View):
 
 @bot.event
 async def on_member_join(member):
-    if await is_jailed(str(member.id)):
+    if raid_detector.record_join(member.guild.id) == STARTED:
+        announce_raid(member.guild)
+    if await is_jailed(member.guild.id, member.id):
+        raid = raid_detector.active_raid(member.guild.id)
+        if raid:
+            # Folded into the raid summary rather than logged one by one.
+            queue_raid_ban(member, "Attempted to bypass jail role by rejoining.")
+            return
         try:
             await member.ban(reason="Attempted to bypass jail role by rejoining.")
-            log_channel = bot.get_channel(LOG_CHANNEL_ID)
-            if log_channel:
-                await log_channel.send(f"🚫 {member.mention} was banned for rejoining after being jailed.")
+            log_writer.post(
+                guild_config(member.guild).log_channel_id,
+                f"🚫 {member.mention} was banned for rejoining after being jailed.",
+            )
         except Exception as e:
             print(f"Failed to auto-ban {member.name}: {e}")
 
-async def log_violation(message):
-    log_channel = bot.get_channel(LOG_CHANNEL_ID)
-    user_id = str(message.author.id)
-    entry = f"#{message.channel} ({message.channel.id}): {message.content}"
-    user_messages = flagged_messages.setdefault(user_id, [])
-    user_messages.append(entry)
-    if len(user_messages) > 5:
-        flagged_messages[user_id] = user_messages[-5:]
-    if log_channel:
-        embed = discord.Embed(
-            title="🛑 Message Deleted by AI Mod",
-            description=f"**User:** {message.author.mention}\n**Channel:** {message.channel.mention}\n**Content:** {message.content}",
-            color=discord.Color.red()
-        )
-        await log_channel.send(embed=embed)
+
+flood_throttle = FloodThrottle()
+flood_episodes = {}
+
+
+def flood_limit(member):
+    """The (messages, seconds) this member may post, or None when they aren't throttled."""
+    limits = guild_config(member.guild).flood_limits
+    role_limits = [limits[str(role.id)] for role in member.roles if str(role.id) in limits] if limits else []
+    if role_limits:
+        # A role without a limit wins; otherwise the most generous rate does.
+        if None in role_limits:
+            return None
+        return max(role_limits, key=lambda limit: limit[0] / limit[1])
+    tier = "exempt" if moderation_state.is_exempt(member_key(member.guild.id, member.id)) else "default"
+    return limits.get(tier, DEFAULT_FLOOD_LIMITS[tier])
+
+
+async def handle_flood_message(message):
+    """Delete an over-limit message without an LLM call, folding the burst into one warning."""
+    key = member_key(message.guild.id, message.author.id)
+    messages_moderated.inc("flood")
+    try:
+        await message.delete()
+    except (discord.NotFound, discord.Forbidden):
+        pass
+    except discord.HTTPException as e:
+        print(f"⚠️ Failed to delete flood message {message.id}: {e}")
+    evidence_store.record(key, f"#{message.channel} ({message.channel.id}): {message.content}")
+    episode = flood_episodes.get(key)
+    if episode is None:
+        episode = flood_episodes[key] = {"channel": message.channel, "deleted": 0}
+        episode["task"] = asyncio.create_task(finish_flood_episode(message.author, message.guild, key))
+    episode["deleted"] += 1
+
+
+async def finish_flood_episode(member, guild, key):
+    await asyncio.sleep(FLOOD_WARNING_DELAY_SECONDS)
+    episode = flood_episodes.pop(key)
+    log_writer.post(
+        guild_config(guild).log_channel_id,
+        f"🌊 Deleted {episode['deleted']} messages from {member.mention} for flooding {episode['channel'].mention}.",
+    )
+    try:
+        await warn_user(member, guild)
+    except discord.Forbidden:
+        print("⚠️ Missing permissions to warn a flooding member.")
+    except Exception as e:
+        # Nothing awaits this task, so anything not handled here would only surface at garbage collection.
+        print(f"⚠️ Failed to warn flooding member {member} ({member.id}): {e}")
+
+
+raid_detector = RaidDetector()
+raid_bans = {}
+raid_ban_tasks = {}
+
+
+def is_new_account(member):
+    now = discord.utils.utcnow()
+    if (now - member.created_at).total_seconds() < RAID_NEW_ACCOUNT_AGE_SECONDS:
+        return True
+    joined_at = getattr(member, "joined_at", None)
+    return joined_at is not None and (now - joined_at).total_seconds() < RAID_RECENT_JOIN_SECONDS
+
+
+def announce_raid(guild):
+    raid = raid_detector.active_raid(guild.id)
+    print(f"🚨 Raid mode on in {guild.name} ({guild.id}): {raid.trigger}.")
+    embed = discord.Embed(
+        title="🚨 Raid Mode Enabled",
+        description=(
+            f"**Trigger:** {raid.trigger}\n"
+            "Messages from new accounts are now judged by the pre-filter alone, repeated spam gets its "
+            "author banned, and individual deletions are summarized when raid mode ends."
+        ),
+        color=discord.Color.dark_red()
+    )
+    log_writer.post(guild_config(guild).log_channel_id, embed=embed)
+
+
+async def handle_raid_message(message, repeats):
+    """Judge a new account's message locally while the guild is being raided; no LLM call is made."""
+    raid = raid_detector.active_raid(message.guild.id)
+    if repeats >= raid_detector.duplicate_threshold:
+        verdict = "BAN"
+    elif is_whitelisted(message.guild.id, message.content):
+        verdict = "SAFE"
+    else:
+        # Anything the pre-filter would have escalated to the LLM is removed outright.
+        verdict = prefilter.classify(message.content, lenient=False)
+        if verdict is ESCALATE:
+            verdict = "DELETE"
+    messages_moderated.inc("raid_" + verdict.lower())
+    if verdict == "SAFE":
+        return
+    try:
+        await message.delete()
+    except (discord.NotFound, discord.Forbidden):
+        pass
+    raid.deleted += 1
+    evidence_store.record(
+        member_key(message.guild.id, message.author.id),
+        f"#{message.channel} ({message.channel.id}): {message.content}",
+    )
+    if verdict == "BAN":
+        queue_raid_ban(message.author, "Raid: repeated spam from a new account.")
+
+
+def queue_raid_ban(member, reason):
+    """Ban from one paced task per guild instead of firing a ban request per message."""
+    pending = raid_bans.setdefault(member.guild.id, {})
+    pending.setdefault(member.id, (member, reason))
+    task = raid_ban_tasks.get(member.guild.id)
+    if task is None or task.done():
+        raid_ban_tasks[member.guild.id] = asyncio.create_task(run_raid_bans(member.guild.id))
+
+
+async def run_raid_bans(guild_id):
+    pending = raid_bans[guild_id]
+    banned = set()
+    while pending:
+        user_id = next(iter(pending))
+        member, reason = pending.pop(user_id)
+        if user_id in banned:
+            continue
+        try:
+            await member.ban(reason=reason, delete_message_seconds=60 * 60)
+            banned.add(user_id)
+            raid = raid_detector.active_raid(guild_id)
+            if raid:
+                raid.banned += 1
+        except discord.NotFound:
+            pass
+        except Exception as e:
+            print(f"Failed to ban raider {member}: {e}")
+        await asyncio.sleep(RAID_BAN_INTERVAL_SECONDS)
+    raid_bans.pop(guild_id, None)
+
+
+async def check_raid_modes_periodically():
+    while True:
+        await asyncio.sleep(RAID_CHECK_INTERVAL_SECONDS)
+        for guild_id, raid in raid_detector.check():
+            guild = bot.get_guild(guild_id)
+            duration = time.monotonic() - raid.started_at
+            print(f"✅ Raid mode off in guild {guild_id} after {format_duration(duration)}.")
+            if guild is None:
+                continue
+            embed = discord.Embed(
+                title="✅ Raid Mode Ended",
+                description=(
+                    f"**Trigger:** {raid.trigger}\n"
+                    f"**Duration:** {format_duration(duration)}\n"
+                    f"**Joins during raid:** {raid.joined}\n"
+                    f"**Messages deleted:** {raid.deleted}\n"
+                    f"**Accounts banned:** {raid.banned}"
+                ),
+                color=discord.Color.green()
+            )
+            log_writer.post(guild_config(guild).log_channel_id, embed=embed)
+
+async def persist_flagged_messages(batch):
+    async with AsyncSessionLocal.begin() as session:
+        await session.execute(insert(FlaggedMessage), [
+            {"guild_id": guild_id, "user_id": user_id, "entry": entry, "created_at": created_at}
+            for (guild_id, user_id), entry, created_at in batch
+        ])
+        # Only the newest few per user are ever shown, so trim the rest as we go.
+        for guild_id, user_id in {key for key, _, _ in batch}:
+            keep = (
+                select(FlaggedMessage.id)
+                .where(FlaggedMessage.guild_id == guild_id, FlaggedMessage.user_id == user_id)
+                .order_by(FlaggedMessage.id.desc())
+                .limit(FLAGGED_MESSAGES_PER_USER)
+            )
+            await session.execute(
+                delete(FlaggedMessage)
+                .where(FlaggedMessage.guild_id == guild_id, FlaggedMessage.user_id == user_id)
+                .where(FlaggedMessage.id.not_in(keep.scalar_subquery()))
+            )
+
+
+async def load_flagged_messages(key, limit):
+    guild_id, user_id = key
+    async with AsyncSessionLocal() as session:
+        entries = (await session.execute(
+            select(FlaggedMessage.entry)
+            .where(FlaggedMessage.guild_id == guild_id, FlaggedMessage.user_id == user_id)
+            .order_by(FlaggedMessage.id.desc())
+            .limit(limit)
+        )).scalars().all()
+    return list(reversed(entries))
+
+
+evidence_store = EvidenceStore(
+    persist_flagged_messages,
+    load_flagged_messages,
+    per_user=FLAGGED_MESSAGES_PER_USER,
+    max_bytes=EVIDENCE_STORE_MAX_BYTES,
+)
+
+
+def log_violation(message):
+    key = member_key(message.guild.id, message.author.id)
+    evidence_store.record(key, f"#{message.channel} ({message.channel.id}): {message.content}")
+    embed = discord.Embed(
+        title="🛑 Message Deleted by AI Mod",
+        description=f"**User:** {message.author.mention}\n**Channel:** {message.channel.mention}\n**Content:** {message.content}",
+        color=discord.Color.red()
+    )
+    log_writer.post(guild_config(message.guild).log_channel_id, embed=embed)
 
 async def warn_user(member, guild):
-    user_id = str(member.id)
-    warnings = await get_warnings(user_id)
-    warnings += 1
-    await set_warnings(user_id, warnings)
+    # Without a jail role to apply, keep counting rather than recording a jail we can't enforce.
+    jail_role_id = guild_config(guild).jail_role_id
+    jail_role = guild.get_role(jail_role_id) if jail_role_id else None
+    warnings, jailed = await increment_warnings(
+        guild.id,
+        member.id,
+        jail_threshold=WARNING_JAIL_THRESHOLD if jail_role else None,
+    )
 
     try:
-        await member.send(f"⚠️ You have been warned for violating server rules. Warning {warnings}/3.")
+        await member.send(f"⚠️ You have been warned for violating server rules. Warning {warnings}/{WARNING_JAIL_THRESHOLD}.")
     except:
         pass
 
-    if warnings >= 3:
+    if jailed:
         try:
-            jail_role = guild.get_role(JAIL_ROLE_ID)
-            if jail_role:
-                await member.add_roles(jail_role)
-                await member.send(
-                    "🚨 You have been jailed for repeated rule violations. "
-                    "Your case is pending our moderation team's review. "
-                    "Expect a response soon, and if you have any further questions, "
-                    "please open a ticket."
-                )
-                await set_warnings(user_id, 0)
-                await add_to_jailed(user_id)
-                await request_jail_review(member, guild)
+            await member.add_roles(jail_role)
         except discord.Forbidden:
+            # Undo the jail recorded with the warning so a rejoin isn't treated as jail evasion.
             print("⚠️ Missing permission to modify roles.")
+            await remove_from_jailed(guild.id, member.id)
+            await set_warnings(guild.id, member.id, warnings)
+            return
+        try:
+            await member.send(
+                "🚨 You have been jailed for repeated rule violations. "
+                "Your case is pending our moderation team's review. "
+                "Expect a response soon, and if you have any further questions, "
+                "please open a ticket."
+            )
+        except discord.Forbidden:
+            pass
+        await request_jail_review(member, guild)
+
+async def load_pending_jail_reviews():
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(select(PendingJailReview))).scalars().all()
+    for row in rows:
+        pending_jail_reviews[int(row.review_message_id)] = row.user_id
+        pending_jail_reviews_by_user[member_key(row.guild_id, row.user_id)] = (int(row.review_message_id), int(row.channel_id))
+    if rows:
+        print(f"🚨 Restored {len(rows)} pending jail reviews.")
+
+
+async def save_pending_jail_review(review_message, key):
+    async with AsyncSessionLocal() as session:
+        session.add(PendingJailReview(
+            review_message_id=str(review_message.id),
+            guild_id=key[0],
+            user_id=key[1],
+            channel_id=str(review_message.channel.id),
+            created_at=int(time.time()),
+        ))
+        await session.commit()
+    pending_jail_reviews[review_message.id] = key[1]
+    pending_jail_reviews_by_user[key] = (review_message.id, review_message.channel.id)
+
+
+async def forget_pending_jail_review(review_message_id, key):
+    pending_jail_reviews.pop(review_message_id, None)
+    pending_jail_reviews_by_user.pop(key, None)
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            delete(PendingJailReview).where(PendingJailReview.review_message_id == str(review_message_id))
+        )
+        await session.commit()
+
 
 async def request_jail_review(member, guild):
-    review_channel = bot.get_channel(REVIEW_CHANNEL_ID) or guild.get_channel(REVIEW_CHANNEL_ID)
+    review_channel_id = guild_config(guild).review_channel_id
+    if review_channel_id is None:
+        print(f"⚠️ No jail review channel configured for {guild.name} ({guild.id}).")
+        return
+    review_channel = bot.get_channel(review_channel_id) or guild.get_channel(review_channel_id)
     if not review_channel:
         try:
-            review_channel = await guild.fetch_channel(REVIEW_CHANNEL_ID)
+            review_channel = await guild.fetch_channel(review_channel_id)
         except (discord.NotFound, discord.Forbidden) as e:
-            print(f"⚠️ Unable to access jail review channel {REVIEW_CHANNEL_ID}: {e}")
+            print(f"⚠️ Unable to access jail review channel {review_channel_id}: {e}")
             return
 
     user_id = str(member.id)
-    existing_message_id = pending_jail_reviews_by_user.get(user_id)
-    if existing_message_id:
+    key = member_key(guild.id, user_id)
+    if key in pending_jail_reviews_by_user:
+        existing_review = pending_jail_reviews_by_user[key]
+        if existing_review is None:
+            # Another trigger is posting this user's review right now.
+            return
+        existing_message_id, existing_channel_id = existing_review
         try:
-            existing_message = await review_channel.fetch_message(existing_message_id)
-        except discord.NotFound:
-            pending_jail_reviews.pop(existing_message_id, None)
-            pending_jail_reviews_by_user.pop(user_id, None)
-        else:
-            try:
-                await existing_message.reply(
-                    "⚠️ Additional jail trigger detected while review is pending.",
-                    mention_author=False,
-                )
-            except discord.Forbidden:
-                pass
+            # Reply where the review was posted, even if the review channel has changed since.
+            await bot.get_partial_messageable(existing_channel_id).get_partial_message(existing_message_id).reply(
+                "⚠️ Additional jail trigger detected while review is pending.",
+                mention_author=False,
+            )
+            return
+        except discord.Forbidden:
             return
-    messages = flagged_messages.get(user_id, [])
+        except discord.HTTPException as e:
+            # A deleted review fails with 400 "Unknown Message" on the reference; a deleted channel with 404.
+            if e.status not in (400, 404):
+                print(f"⚠️ Failed to reply to jail review {existing_message_id}: {e}")
+                return
+            await forget_pending_jail_review(existing_message_id, key)
+
+    pending_jail_reviews_by_user[key] = None
+    try:
+        await post_jail_review(member, review_channel, key)
+    finally:
+        if key in pending_jail_reviews_by_user and pending_jail_reviews_by_user[key] is None:
+            pending_jail_reviews_by_user.pop(key, None)
+
+
+async def post_jail_review(member, review_channel, key):
+    messages = await evidence_store.get(key)
     if messages:
         formatted_messages = "\n".join(f"- {entry}" for entry in messages)
     else:
@@ -688,8 +2108,7 @@ async def request_jail_review(member, guild):
     except discord.Forbidden as e:
         print(f"⚠️ Missing permission to send jail review message: {e}")
         return
-    pending_jail_reviews[review_message.id] = user_id
-    pending_jail_reviews_by_user[user_id] = review_message.id
+    await save_pending_jail_review(review_message, key)
 
 async def close_jail_review_message(channel, message_id, moderator, decision):
     try:
@@ -719,10 +2138,10 @@ async def handle_jail_review_decision(interaction: discord.Interaction, decision
         return
 
     target_user_id = pending_jail_reviews[message.id]
+    target_key = member_key(interaction.guild.id, target_user_id)
     target_member = interaction.guild.get_member(int(target_user_id))
     if not target_member:
-        pending_jail_reviews.pop(message.id, None)
-        pending_jail_reviews_by_user.pop(target_user_id, None)
+        await forget_pending_jail_review(message.id, target_key)
         await interaction.response.send_message("⚠️ User no longer in server; review cleared.", ephemeral=True)
         await close_jail_review_message(interaction.channel, message.id, moderator, "closed (user left)")
         return
@@ -730,11 +2149,12 @@ async def handle_jail_review_decision(interaction: discord.Interaction, decision
     await interaction.response.defer(ephemeral=True)
 
     if decision == "not warranted":
-        jail_role = interaction.guild.get_role(JAIL_ROLE_ID)
+        jail_role_id = guild_config(interaction.guild).jail_role_id
+        jail_role = interaction.guild.get_role(jail_role_id) if jail_role_id else None
         if jail_role:
             await target_member.remove_roles(jail_role)
-        await remove_from_jailed(target_user_id)
-        await add_exempt_user(target_user_id)
+        await remove_from_jailed(interaction.guild.id, target_user_id)
+        await add_exempt_user(interaction.guild.id, target_user_id)
         try:
             await target_member.send(
                 "✅ After review, you have been unjailed and added to our exempt list. "
@@ -752,8 +2172,7 @@ async def handle_jail_review_decision(interaction: discord.Interaction, decision
         except:
             pass
 
-    pending_jail_reviews.pop(message.id, None)
-    pending_jail_reviews_by_user.pop(target_user_id, None)
+    await forget_pending_jail_review(message.id, target_key)
     await close_jail_review_message(interaction.channel, message.id, moderator, decision)
     await interaction.followup.send("✅ Jail review updated.", ephemeral=True)
 
@@ -789,46 +2208,69 @@ class JailReviewView(discord.ui.View):
 
 from discord import app_commands
 
+
+def staff_only(*, allow_manage_guild=False):
+    """Slash command check against the invoking guild's configured staff roles.
+
+    ``allow_manage_guild`` also lets Manage Server holders in, so a new
+    server can run /config before it has any staff roles.
+    """
+    async def predicate(interaction: discord.Interaction):
+        return (
+            interaction.guild is not None
+            and isinstance(interaction.user, discord.Member)
+            and (
+                is_staff(interaction.user)
+                or (allow_manage_guild and interaction.user.guild_permissions.manage_guild)
+            )
+        )
+    return app_commands.check(predicate)
+
 @app_commands.command(name="removewarnings", description="Reset warnings for a user")
-@app_commands.checks.has_any_role(*STAFF_ROLE_IDS)
+@staff_only()
 async def removewarnings(interaction: discord.Interaction, member: discord.Member):
-    await set_warnings(str(member.id), 0)
+    await set_warnings(interaction.guild.id, member.id, 0)
     await interaction.response.send_message(f"✅ Warnings for {member.mention} have been cleared.", ephemeral=True)
 
 @app_commands.command(name="whitelist_add", description="Add a phrase to the whitelist")
-@app_commands.checks.has_any_role(*STAFF_ROLE_IDS)
+@staff_only()
 async def whitelist_add(interaction: discord.Interaction, phrase: str):
+    guild_id = interaction.guild.id
+    await interaction.response.defer(ephemeral=True)
     async with AsyncSessionLocal() as session:
-        if not await session.get(WhitelistEntry, phrase):
-            session.add(WhitelistEntry(phrase=phrase))
+        if not await session.get(WhitelistEntry, (str(guild_id), phrase)):
+            session.add(WhitelistEntry(guild_id=str(guild_id), phrase=phrase))
             await session.commit()
-    await interaction.response.send_message(f"✅ Added '{phrase}' to the whitelist.", ephemeral=True)
+    await refresh_whitelist(guild_id)
+    await interaction.followup.send(f"✅ Added '{phrase}' to the whitelist.", ephemeral=True)
 
 @app_commands.command(name="whitelist_remove", description="Remove a phrase from the whitelist")
-@app_commands.checks.has_any_role(*STAFF_ROLE_IDS)
+@staff_only()
 async def whitelist_remove(interaction: discord.Interaction, phrase: str):
+    guild_id = interaction.guild.id
+    await interaction.response.defer(ephemeral=True)
     async with AsyncSessionLocal() as session:
-        result = await session.get(WhitelistEntry, phrase)
+        result = await session.get(WhitelistEntry, (str(guild_id), phrase))
         if result:
             await session.delete(result)
             await session.commit()
-            await interaction.response.send_message(f"✅ Removed '{phrase}' from the whitelist.", ephemeral=True)
-        else:
-            await interaction.response.send_message("⚠️ That phrase isn't in the whitelist.", ephemeral=True)
+    await refresh_whitelist(guild_id)
+    if result:
+        await interaction.followup.send(f"✅ Removed '{phrase}' from the whitelist.", ephemeral=True)
+    else:
+        await interaction.followup.send("⚠️ That phrase isn't in the whitelist.", ephemeral=True)
 
 @app_commands.command(name="whitelist_list", description="List all whitelisted phrases")
-@app_commands.checks.has_any_role(*STAFF_ROLE_IDS)
+@staff_only()
 async def whitelist_list(interaction: discord.Interaction):
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(select(WhitelistEntry))
-        phrases = [row[0].phrase for row in result.all()]
+    phrases = sorted(whitelisted_phrases(interaction.guild.id))
     if not phrases:
         await interaction.response.send_message("⚠️ Whitelist is currently empty.", ephemeral=True)
     else:
         await interaction.response.send_message("📃 Whitelisted phrases:\n" + "\n".join(phrases), ephemeral=True)
 
 @app_commands.command(name="dm", description="Send a DM to a user")
-@app_commands.checks.has_any_role(*STAFF_ROLE_IDS)
+@staff_only()
 async def dm(interaction: discord.Interaction, user: discord.User, message: str):
     try:
         await user.send(message)
@@ -837,37 +2279,303 @@ async def dm(interaction: discord.Interaction, user: discord.User, message: str)
         await interaction.response.send_message("⚠️ Failed to send the message.", ephemeral=True)
         print(f"DM error: {e}")
 
+async def summarize_completion(system_prompt, text):
+    response = await create_chat_completion(
+        priority=STAFF,
+        completion_tokens=300,
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text}
+        ],
+        temperature=0.5
+    )
+    return response.choices[0].message.content.strip()
+
+
+channel_summarizer = MapReduceSummarizer(summarize_completion)
+
+
+async def load_channel_summary(channel_id):
+    async with AsyncSessionLocal() as session:
+        return await session.get(ChannelSummary, str(channel_id))
+
+
+async def save_channel_summary(channel, last_message_id, summary):
+    values = {
+        "channel_id": str(channel.id),
+        "guild_id": str(channel.guild.id),
+        "last_message_id": str(last_message_id),
+        "summary": summary,
+        "updated_at": int(time.time()),
+    }
+    async with AsyncSessionLocal.begin() as session:
+        await session.execute(
+            upsert(ChannelSummary)
+            .values(**values)
+            .on_conflict_do_update(index_elements=[ChannelSummary.channel_id], set_=values)
+        )
+
+
 @app_commands.command(name="summarize", description="Summarize recent messages in the channel")
-@app_commands.checks.has_any_role(*STAFF_ROLE_IDS)
-async def summarize(interaction: discord.Interaction, limit: int = 20):
-    if limit > 100:
-        await interaction.response.send_message("❌ You can only summarize up to 100 messages at a time.", ephemeral=True)
+@staff_only()
+async def summarize(interaction: discord.Interaction, limit: int = 200, fresh: bool = False):
+    if limit > SUMMARIZE_MAX_MESSAGES:
+        await interaction.response.send_message(
+            f"❌ You can only summarize up to {SUMMARIZE_MAX_MESSAGES} messages at a time.", ephemeral=True
+        )
         return
+    # Reading thousands of messages takes far longer than the 3 second interaction window.
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    channel = interaction.channel
     try:
-        messages = [msg async for msg in interaction.channel.history(limit=limit)]
-        content_to_summarize = "\n".join([
-            f"{msg.author.name}: {msg.content}"
-            for msg in reversed(messages) if not msg.author.bot and msg.content
-        ])
-        if not content_to_summarize.strip():
-            await interaction.response.send_message("⚠️ No messages to summarize.", ephemeral=True)
-            return
-        response = await openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Summarize the following Discord conversation in a short, clear paragraph."},
-                {"role": "user", "content": content_to_summarize}
-            ],
-            temperature=0.5
+        previous = None if fresh else await load_channel_summary(channel.id)
+        if previous:
+            # Only read what arrived since the rolling summary was last updated.
+            history = channel.history(limit=limit, after=discord.Object(int(previous.last_message_id)), oldest_first=True)
+        else:
+            history = channel.history(limit=limit)
+        newest_message_id = None
+        read_count = 0
+
+        async def conversation_lines():
+            nonlocal newest_message_id, read_count
+            async for msg in history:
+                read_count += 1
+                if newest_message_id is None or msg.id > newest_message_id:
+                    newest_message_id = msg.id
+                if not msg.author.bot and msg.content:
+                    yield f"{msg.author.name}: {msg.content}"
+
+        last_progress_edit = time.monotonic()
+
+        async def show_progress(progress):
+            nonlocal last_progress_edit
+            now = time.monotonic()
+            if now - last_progress_edit < SUMMARIZE_PROGRESS_INTERVAL_SECONDS:
+                return
+            last_progress_edit = now
+            try:
+                await interaction.edit_original_response(content=(
+                    f"⏳ Read {read_count} messages, "
+                    f"summarized {progress['summarized']}/{progress['chunks']} parts..."
+                ))
+            except discord.HTTPException:
+                pass
+
+        summary = await channel_summarizer.summarize(
+            conversation_lines(),
+            newest_first=previous is None,
+            previous_summary=previous.summary if previous else None,
+            on_progress=show_progress,
         )
-        summary = response.choices[0].message.content.strip()
-        await interaction.response.send_message(f"📝 **Summary of the last {limit} messages:**\n{summary}", ephemeral=True)
+        if newest_message_id is None or not summary:
+            if previous:
+                content = f"📝 **No new messages since the last summary:**\n{previous.summary}"
+            else:
+                content = "⚠️ No messages to summarize."
+            await interaction.edit_original_response(content=content[:2000])
+            return
+        await save_channel_summary(channel, newest_message_id, summary)
+        if previous:
+            header = f"📝 **Summary of {channel.mention}, updated with {read_count} new messages:**"
+        else:
+            header = f"📝 **Summary of the last {read_count} messages:**"
+        await interaction.edit_original_response(content=f"{header}\n{summary}"[:2000])
     except Exception as e:
-        await interaction.response.send_message("⚠️ Failed to summarize messages.", ephemeral=True)
+        try:
+            await interaction.edit_original_response(content="⚠️ Failed to summarize messages.")
+        except discord.HTTPException:
+            pass
         print("Summary error:", e)
 
+channel_scans = {}
+channel_scan_tasks = {}
+SCAN_INTERACTION_LIFETIME_SECONDS = 14 * 60
+
+
+async def load_scan_checkpoint(channel_id):
+    async with AsyncSessionLocal() as session:
+        return await session.get(ScanCheckpoint, str(channel_id))
+
+
+async def save_scan_checkpoint(channel, scan, *, scanned, deleted):
+    values = {
+        "channel_id": str(channel.id),
+        "guild_id": str(channel.guild.id),
+        "last_message_id": str(scan.last_id),
+        "until_message_id": str(scan.until_id),
+        "scanned": scanned,
+        "deleted": deleted,
+        "finished": int(scan.finished),
+        "updated_at": int(time.time()),
+    }
+    async with AsyncSessionLocal.begin() as session:
+        await session.execute(
+            upsert(ScanCheckpoint)
+            .values(**values)
+            .on_conflict_do_update(index_elements=[ScanCheckpoint.channel_id], set_=values)
+        )
+
+
+async def classify_scanned_message(message):
+    if message.author.bot or not message.content:
+        return None
+    # Members who have left come back as plain users and have no roles to check.
+    if isinstance(message.author, discord.Member) and is_staff(message.author):
+        return None
+    lenient = await is_exempt(message.guild.id, message.author.id)
+    return await moderate_message(message.content, guild_id=message.guild.id, lenient=lenient, batcher=scan_batcher)
+
+
+async def bulk_delete_scanned_messages(channel, messages):
+    await channel.delete_messages(messages, reason="Removed by a retroactive moderation scan")
+    for message in messages:
+        log_violation(message)
+
+
+async def delete_scanned_message(message):
+    try:
+        await message.delete()
+    except discord.NotFound:
+        pass
+    log_violation(message)
+
+
+async def start_channel_scan(channel, *, restart=False):
+    """Start (or resume) a scan of ``channel``'s history, unless one is already running."""
+    task = channel_scan_tasks.get(channel.id)
+    if task and not task.done():
+        return channel_scans[channel.id]
+
+    checkpoint = None if restart else await load_scan_checkpoint(channel.id)
+    if checkpoint and not checkpoint.finished:
+        after_id = int(checkpoint.last_message_id)
+        until_id = int(checkpoint.until_message_id)
+        scanned_before, deleted_before = checkpoint.scanned, checkpoint.deleted
+    else:
+        # Everything newer than this is moderated live, so the scan stops here.
+        after_id = channel.id
+        until_id = discord.utils.time_snowflake(discord.utils.utcnow())
+        scanned_before = deleted_before = 0
+
+    async def fetch_page(page_after_id, limit):
+        return [
+            message async for message in channel.history(
+                limit=limit,
+                after=discord.Object(page_after_id),
+                before=discord.Object(until_id),
+                oldest_first=True,
+            )
+        ]
+
+    async def checkpoint_scan(last_message_id, scan):
+        await save_scan_checkpoint(
+            channel,
+            scan,
+            scanned=scanned_before + scan.scanned,
+            deleted=deleted_before + scan.deleted,
+        )
+
+    scan = ChannelScan(
+        fetch_page,
+        classify_scanned_message,
+        lambda messages: bulk_delete_scanned_messages(channel, messages),
+        delete_scanned_message,
+        checkpoint_scan,
+        after_id=after_id,
+        until_id=until_id,
+        page_size=SCAN_PAGE_SIZE,
+        concurrency=SCAN_CONCURRENCY,
+    )
+    channel_scans[channel.id] = scan
+    channel_scan_tasks[channel.id] = asyncio.create_task(run_channel_scan(channel, scan))
+    return scan
+
+
+async def run_channel_scan(channel, scan):
+    print(f"🔎 Scanning history of #{channel} ({channel.id}).")
+    try:
+        await scan.run()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"⚠️ Scan of #{channel} stopped: {e}")
+        traceback.print_exc()
+        return
+    print(f"🔎 Finished scanning #{channel}: {scan.scanned} messages, {scan.deleted} deleted.")
+    log_writer.post(
+        guild_config(channel.guild).log_channel_id,
+        f"🔎 Scan of {channel.mention} finished: {scan.scanned} messages checked, {scan.deleted} deleted.",
+    )
+
+
+async def resume_channel_scans():
+    async with AsyncSessionLocal() as session:
+        checkpoints = (await session.execute(
+            select(ScanCheckpoint).where(ScanCheckpoint.finished == 0)
+        )).scalars().all()
+    for checkpoint in checkpoints:
+        # With several shards, each one resumes only the channels it can see.
+        channel = bot.get_channel(int(checkpoint.channel_id))
+        if channel is not None:
+            await start_channel_scan(channel)
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "unknown"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60}s"
+    return f"{seconds}s"
+
+
+def describe_channel_scan(channel_id, scan):
+    stats = scan.stats()
+    channel = bot.get_channel(channel_id)
+    name = channel.mention if channel else f"<#{channel_id}>"
+    status = "✅ done" if stats["finished"] else f"{stats['fraction']:.0%} · ETA {format_duration(stats['eta'])}"
+    return (
+        f"{name}: {status} · {stats['scanned']} checked · {stats['deleted']} deleted · "
+        f"{stats['failed']} failed · {stats['rate']:.1f} msg/s"
+    )
+
+
+@app_commands.command(name="scan", description="Moderate existing messages in one or more channels")
+@staff_only()
+async def scan(interaction: discord.Interaction, channels: str = None, restart: bool = False):
+    if channels:
+        targets = [interaction.guild.get_channel_or_thread(int(channel_id)) for channel_id in re.findall(r"<#(\d+)>", channels)]
+    else:
+        targets = [interaction.channel]
+    targets = [channel for channel in targets if isinstance(channel, (discord.TextChannel, discord.Thread))]
+    if not targets:
+        await interaction.response.send_message("⚠️ Mention at least one text channel to scan.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    for channel in targets:
+        await start_channel_scan(channel, restart=restart)
+
+    # Interaction tokens expire after 15 minutes; longer scans keep going and show up in /modstats.
+    deadline = time.monotonic() + SCAN_INTERACTION_LIFETIME_SECONDS
+    while True:
+        running = [channel_scan_tasks[channel.id] for channel in targets if not channel_scan_tasks[channel.id].done()]
+        lines = ["🔎 **Scanning history**"] + [describe_channel_scan(channel.id, channel_scans[channel.id]) for channel in targets]
+        if running and time.monotonic() >= deadline:
+            lines.append("Still running; check /modstats for progress.")
+        try:
+            await interaction.edit_original_response(content="\n".join(lines)[:2000])
+        except discord.HTTPException:
+            return
+        if not running or time.monotonic() >= deadline:
+            return
+        await asyncio.wait(running, timeout=SCAN_PROGRESS_INTERVAL_SECONDS)
+
 @app_commands.command(name="commands", description="List available staff commands")
-@app_commands.checks.has_any_role(*STAFF_ROLE_IDS)
+@staff_only()
 async def commands(interaction: discord.Interaction):
     cmds = [
         "/removewarnings @user - reset warnings",
@@ -875,35 +2583,38 @@ async def commands(interaction: discord.Interaction):
         "/whitelist_remove phrase",
         "/whitelist_list",
         "/dm @user message",
-        "/summarize [# of messages]",
+        "/summarize [# of messages] [fresh] - only new messages are read after the first run",
+        "/scan [#channels] [restart] - moderate existing history; resumes where it left off",
         "/exempt @user",
         "/exemptremove @user",
-        "/exemtplist"
+        "/exemtplist",
+        "/modstats",
+        "/config [settings] - view or change this server's channels and roles"
     ]
     await interaction.response.send_message("🛠️ **Available Staff Commands:**\n" + "\n".join(cmds), ephemeral=True)
 
 @app_commands.command(name="exempt", description="Give a user lenient moderation")
-@app_commands.checks.has_any_role(*STAFF_ROLE_IDS)
+@staff_only()
 async def exempt(interaction: discord.Interaction, member: discord.Member):
-    await add_exempt_user(str(member.id))
+    await add_exempt_user(interaction.guild.id, member.id)
     await interaction.response.send_message(
         f"✅ {member.mention} will now only be flagged for explicit hate speech.",
         ephemeral=True
     )
 
 @app_commands.command(name="exemptremove", description="Remove a user's lenient moderation")
-@app_commands.checks.has_any_role(*STAFF_ROLE_IDS)
+@staff_only()
 async def exemptremove(interaction: discord.Interaction, member: discord.Member):
-    await remove_exempt_user(str(member.id))
+    await remove_exempt_user(interaction.guild.id, member.id)
     await interaction.response.send_message(
         f"✅ {member.mention} is now subject to normal moderation.",
         ephemeral=True
     )
 
 @app_commands.command(name="exemtplist", description="List users with lenient moderation")
-@app_commands.checks.has_any_role(*STAFF_ROLE_IDS)
+@staff_only()
 async def exempts_list(interaction: discord.Interaction):
-    user_ids = await list_exempt_users()
+    user_ids = await list_exempt_users(interaction.guild.id)
     if not user_ids:
         await interaction.response.send_message("ℹ️ No users are currently exempt.", ephemeral=True)
         return
@@ -918,6 +2629,249 @@ async def exempts_list(interaction: discord.Interaction):
         ephemeral=True
     )
 
+def describe_guild_config(guild):
+    current = guild_config(guild)
+
+    def channel(channel_id):
+        return f"<#{channel_id}>" if channel_id else "not set"
+
+    def role(role_id):
+        return f"<@&{role_id}>" if role_id else "not set"
+
+    return "\n".join([
+        f"Log channel: {channel(current.log_channel_id)}",
+        f"Jail review channel: {channel(current.review_channel_id)}",
+        f"Media review channel: {channel(current.media_review_channel_id)}",
+        f"Ticket category: {channel(current.ticket_category_id)}",
+        f"Jail role: {role(current.jail_role_id)}",
+        f"Media review exempt role: {role(current.media_review_exempt_role_id)}",
+        "Staff roles: " + (", ".join(role(role_id) for role_id in sorted(current.staff_role_ids)) or "none"),
+        "Flood limits: " + ", ".join(
+            f"{role(key) if key.isdigit() else key} {format_flood_limit(limit)}"
+            for key, limit in sorted({**DEFAULT_FLOOD_LIMITS, **current.flood_limits}.items())
+        ),
+    ])
+
+
+def format_flood_limit(limit):
+    return f"{limit[0]}/{limit[1]}s" if limit else "off"
+
+
+def parse_flood_limit(value):
+    """Parse "8/10" (8 messages per 10 seconds) or "off"; "reset" returns the string itself."""
+    value = value.strip().lower()
+    if value in ("off", "reset"):
+        return None if value == "off" else value
+    messages, _, seconds = value.removesuffix("s").partition("/")
+    messages, seconds = int(messages), int(seconds)
+    if messages < 1 or seconds < 1:
+        raise ValueError(value)
+    return (messages, seconds)
+
+@app_commands.command(name="config", description="View or change this server's moderation channels and roles")
+@staff_only(allow_manage_guild=True)
+async def config(
+    interaction: discord.Interaction,
+    log_channel: discord.TextChannel = None,
+    review_channel: discord.TextChannel = None,
+    media_review_channel: discord.TextChannel = None,
+    ticket_category: discord.CategoryChannel = None,
+    jail_role: discord.Role = None,
+    media_review_exempt_role: discord.Role = None,
+    add_staff_role: discord.Role = None,
+    remove_staff_role: discord.Role = None,
+    flood_limit: str = None,
+    flood_limit_role: discord.Role = None,
+    exempt_flood_limit: str = None,
+):
+    changes = {}
+    if log_channel:
+        changes["log_channel_id"] = log_channel.id
+    if review_channel:
+        changes["review_channel_id"] = review_channel.id
+    if media_review_channel:
+        changes["media_review_channel_id"] = media_review_channel.id
+    if ticket_category:
+        changes["ticket_category_id"] = ticket_category.id
+    if jail_role:
+        changes["jail_role_id"] = jail_role.id
+    if media_review_exempt_role:
+        changes["media_review_exempt_role_id"] = media_review_exempt_role.id
+    if add_staff_role or remove_staff_role:
+        staff_role_ids = set(guild_config(interaction.guild).staff_role_ids)
+        if add_staff_role:
+            staff_role_ids.add(add_staff_role.id)
+        if remove_staff_role:
+            staff_role_ids.discard(remove_staff_role.id)
+        changes["staff_role_ids"] = staff_role_ids
+    if flood_limit or exempt_flood_limit:
+        # Limits look like "8/10" for 8 messages per 10 seconds, "off", or "reset" to go back to the default.
+        flood_limits = dict(guild_config(interaction.guild).flood_limits)
+        targets = []
+        if flood_limit:
+            targets.append((str(flood_limit_role.id) if flood_limit_role else "default", flood_limit))
+        if exempt_flood_limit:
+            targets.append(("exempt", exempt_flood_limit))
+        for key, value in targets:
+            try:
+                limit = parse_flood_limit(value)
+            except ValueError:
+                await interaction.response.send_message(
+                    f"⚠️ `{value}` isn't a flood limit; use messages/seconds like `8/10`, `off` or `reset`.",
+                    ephemeral=True
+                )
+                return
+            if limit == "reset":
+                flood_limits.pop(key, None)
+            else:
+                flood_limits[key] = limit
+        changes["flood_limits"] = flood_limits
+
+    if not changes:
+        await interaction.response.send_message(
+            "⚙️ **Server Settings:**\n" + describe_guild_config(interaction.guild),
+            ephemeral=True
+        )
+        return
+    if not interaction.user.guild_permissions.manage_guild:
+        await interaction.response.send_message("⚠️ Changing settings requires the Manage Server permission.", ephemeral=True)
+        return
+
+    await save_guild_config(interaction.guild.id, guild_config(interaction.guild).replace(**changes))
+    await interaction.response.send_message(
+        "✅ Settings updated.\n" + describe_guild_config(interaction.guild),
+        ephemeral=True
+    )
+
+@app_commands.command(name="modstats", description="Show moderation pipeline statistics")
+@staff_only()
+async def modstats(interaction: discord.Interaction):
+    batch = moderation_batcher.stats()
+    governor = openai_governor.stats()
+    queued = governor["queued"]
+    wait_p95 = governor["wait_p95"]
+    lines = [
+        "**OpenAI Governor**",
+        f"In flight: {governor['in_flight']}/{governor['max_concurrency']} · "
+        f"Queued: live {queued['live']} · staff {queued['staff']} · background {queued['background']}",
+        f"Wait p95: live {format_ms(wait_p95['live'])} · staff {format_ms(wait_p95['staff'])} · "
+        f"background {format_ms(wait_p95['background'])}",
+        f"Completed: {governor['completed']} · Retries: {governor['retries']} · "
+        f"429s: {governor['rate_limited']} · Failed: {governor['failures']}",
+        f"Limits: {governor['requests_per_minute']:.0f} req/min · {governor['tokens_per_minute']:.0f} tokens/min",
+    ]
+    if governor["paused_for"]:
+        lines.append(f"⏸️ Paused for {governor['paused_for']:.1f}s after a 429")
+    queue = moderation_queue.stats()
+    lines += [
+        "**Moderation Queue**",
+        f"Queued: {queue['queued']}/{queue['max_backlog']} · Active: {queue['active']}/{queue['workers']} · "
+        f"Processed: {queue['processed']} · Shed: {queue['shed']}",
+        f"Queue-to-done: p50 {format_ms(queue['p50'])} · p95 {format_ms(queue['p95'])} · p99 {format_ms(queue['p99'])}",
+    ]
+
+    hedging = moderation_hedging.stats()
+    lines += [
+        "**Deadlines & Hedging**",
+        f"Time to verdict: p50 {format_ms(time_to_verdict.percentile(50))} · "
+        f"p95 {format_ms(time_to_verdict.percentile(95))} · p99 {format_ms(time_to_verdict.percentile(99))}",
+        f"Hedge delay: {format_ms(hedging['delay'])} · Hedged: {hedging['hedged']}/{hedging['calls']} · "
+        f"Hedge wins: {hedging['hedge_wins']} · Skipped (governor backlog): {hedging['skipped']}",
+        f"Failure policy: {MODERATION_FAILURE_POLICY} · Fallbacks: "
+        + (", ".join(f"{reason} {count}" for (reason, _), count in moderation_fallbacks.items()) or "none")
+        + f" · Rechecks pending: {len(moderation_rechecks)}",
+    ]
+    lines += [
+        "**Batching**",
+        f"Window: {batch['window_seconds'] * 1000:.0f}ms / {batch['max_batch_size']} messages",
+        f"Messages: {batch['messages']} · Requests: {batch['requests']}",
+        f"Verdict latency: p50 {format_ms(batch['p50'])} · p95 {format_ms(batch['p95'])} · p99 {format_ms(batch['p99'])}",
+    ]
+    if batch["requests_per_message"] is not None:
+        lines.append(f"Requests/message: {batch['requests_per_message']:.2f}")
+
+    cache = verdict_cache.stats()
+    lines += [
+        "**Verdict Cache**",
+        f"Entries: {cache['entries']}/{cache['max_entries']} · In flight: {cache['in_flight']}",
+        f"Hits: {cache['hits']} · Misses: {cache['misses']} · Coalesced: {cache['coalesced']} · Evicted: {cache['evictions']}",
+    ]
+    if cache["hit_rate"] is not None:
+        lines.append(f"Hit rate: {cache['hit_rate']:.1%}")
+
+    pre = prefilter.stats()
+    lines += [
+        "**Pre-filter**",
+        f"Lexicon terms: {pre['lexicon_terms']} · Settled SAFE: {pre['settled_safe']} · "
+        f"Settled DELETE: {pre['settled_delete']} · Escalated: {pre['escalated']}",
+    ]
+    if pre["escalation_rate"] is not None:
+        lines.append(f"Escalation rate: {pre['escalation_rate']:.1%}")
+
+    log = log_writer.stats()
+    lines += [
+        "**Log Channels**",
+        f"Channels: {log['channels']} · Queued: {log['queued']} (max {log['max_buffer']} each) · "
+        f"Entries sent: {log['sent_entries']} in {log['sent_messages']} messages",
+        f"Dropped: {log['dropped']} · Failed: {log['failed']} · 429s: {log['rate_limited']}",
+    ]
+
+    evidence = evidence_store.stats()
+    lines += [
+        "**Evidence Store**",
+        f"Users: {evidence['users']}/{evidence['max_users']} · "
+        f"Memory: {evidence['bytes'] / (1024 * 1024):.1f}/{evidence['max_bytes'] / (1024 * 1024):.0f} MiB · "
+        f"Evicted: {evidence['evicted']}",
+        f"Pending writes: {evidence['pending']} · Persisted: {evidence['persisted']} · "
+        f"Rehydrated: {evidence['rehydrated']} · Dropped: {evidence['dropped']}",
+    ]
+
+    flood = flood_throttle.stats()
+    lines += [
+        "**Flood Throttle**",
+        f"Tracked users: {flood['users']}/{flood['max_users']} · Throttled: {flood['throttled']} · "
+        f"Active bursts: {len(flood_episodes)} · Evicted: {flood['evicted']}",
+    ]
+
+    edits = edit_tracker.stats()
+    lines += [
+        "**Edits**",
+        f"Tracked: {edits['tracked']}/{edits['max_messages']} · Unchanged text skipped: {edits['unchanged']} · "
+        f"Changed region only: {edits['partial']} · Full text: {edits['full']}",
+    ]
+
+    raids = raid_detector.active_raids()
+    if raids:
+        lines.append("**Raid Mode**")
+        lines += [
+            f"Guild {guild_id}: {raid.trigger} · {format_duration(time.monotonic() - raid.started_at)} · "
+            f"Deleted: {raid.deleted} · Banned: {raid.banned} · Ban queue: {len(raid_bans.get(guild_id, ()))}"
+            for guild_id, raid in raids.items()
+        ]
+
+    if channel_scans:
+        lines.append("**History Scans**")
+        lines += [describe_channel_scan(channel_id, scan) for channel_id, scan in channel_scans.items()]
+
+    state = moderation_state.stats()
+    spooled_bytes = await asyncio.to_thread(media_spool.total_bytes)
+    lines += [
+        "**Startup**",
+        format_startup_report(),
+        "**Guilds**",
+        f"Serving: {len(bot.guilds)} on {bot.shard_count or 1} shards · Configured: {len(guild_configs)}",
+        "**State Cache**",
+        f"Jailed: {state['jailed']} · Exempt: {state['exempt']}",
+        "**Media**",
+        f"Pending reviews: {len(pending_media_reviews)} · Fingerprints: {len(media_fingerprints)} · "
+        f"Auto-resolved: {media_fingerprints.auto_resolved} · "
+        f"Spooled: {spooled_bytes / (1024 * 1024):.1f}/{MEDIA_SPOOL_MAX_TOTAL_BYTES / (1024 * 1024):.0f} MB",
+    ]
+    await interaction.response.send_message("📊 **Moderation Stats**\n" + "\n".join(lines), ephemeral=True)
+
+mark_startup("imported")
+
+
 def start_bot_with_retries(retry_delay_seconds: int = 5):
     if not DISCORD_TOKEN:
         raise RuntimeError("DISCORD_TOKEN is not configured.")
@@ -937,16 +2891,17 @@ def start_bot_with_retries(retry_delay_seconds: int = 5):
             time.sleep(retry_delay_seconds)
 
 
-try:
-    start_bot_with_retries()
-except Exception as e:
-    print(f"❌ Bot failed to run after retries: {e}")
-finally:
-    try:
-        asyncio.run(engine.dispose())
-    except Exception as e:
-        print(f"⚠️ Failed to dispose database engine on shutdown: {e}")
+if __name__ == "__main__":
     try:
-        asyncio.run(openai_client.close())
+        start_bot_with_retries()
     except Exception as e:
-        print(f"⚠️ Failed to close OpenAI client on shutdown: {e}")
+        print(f"❌ Bot failed to run after retries: {e}")
+    finally:
+        try:
+            asyncio.run(engine.dispose())
+        except Exception as e:
+            print(f"⚠️ Failed to dispose database engine on shutdown: {e}")
+        try:
+            asyncio.run(openai_client.close())
+        except Exception as e:
+            print(f"⚠️ Failed to close OpenAI client on shutdown: {e}")
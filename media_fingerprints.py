@@ -0,0 +1,100 @@
+HASH_BITS = 64
+
+
+def dhash_file(path, hash_size=8):
+    """Difference hash of an image file as a 64-bit int, or None if it can't be read as an image."""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(path) as image:
+            # Let JPEG decode at reduced size; we only need a 9x8 grayscale grid.
+            image.draft("L", (hash_size * 8, hash_size * 8))
+            pixels = list(image.convert("L").resize((hash_size + 1, hash_size)).getdata())
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+class MultiIndexHashIndex:
+    """Hamming-radius lookups over 64-bit hashes using multi-index hashing.
+
+    Each hash is split into ``max_distance + 1`` disjoint chunks. Any hash
+    within ``max_distance`` bits of the query must match it exactly on at
+    least one chunk (pigeonhole), so a lookup only checks the few entries
+    sharing a chunk value instead of scanning everything.
+    """
+
+    def __init__(self, max_distance=4, bits=HASH_BITS):
+        self.max_distance = max_distance
+        chunk_count = max_distance + 1
+        bounds = [round(i * bits / chunk_count) for i in range(chunk_count + 1)]
+        self._chunks = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self._tables = [{} for _ in self._chunks]
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def add(self, hash_value, value):
+        if hash_value not in self._values:
+            for table, (shift, mask) in zip(self._tables, self._chunks):
+                table.setdefault((hash_value >> shift) & mask, []).append(hash_value)
+        self._values[hash_value] = value
+
+    def nearest(self, hash_value):
+        """Return ``(distance, value)`` for the closest stored hash within range, or None."""
+        exact = self._values.get(hash_value)
+        if exact is not None:
+            return 0, exact
+
+        best = None
+        seen = set()
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            for candidate in table.get((hash_value >> shift) & mask, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = (candidate ^ hash_value).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, candidate)
+        if best is None:
+            return None
+        return best[0], self._values[best[1]]
+
+
+class FingerprintIndex:
+    """Remembers moderator decisions by exact SHA-256 and by perceptual hash.
+
+    Only an exact SHA-256 match repeats an approval. A perceptual match can
+    only repeat a disapproval, since a near-identical image (a meme template
+    with a new caption) can say something the approved one didn't.
+    """
+
+    def __init__(self, max_distance=4):
+        self._exact = {}
+        self._perceptual = MultiIndexHashIndex(max_distance)
+        self.auto_resolved = 0
+
+    def __len__(self):
+        return len(self._exact)
+
+    def record(self, sha256, phash, decision):
+        self._exact[sha256] = decision
+        if phash is not None and decision == "disapproved":
+            self._perceptual.add(phash, decision)
+
+    def lookup(self, sha256, phash):
+        decision = self._exact.get(sha256)
+        if decision is not None:
+            return decision
+        if phash is not None:
+            match = self._perceptual.nearest(phash)
+            if match is not None:
+                return match[1]
+        return None
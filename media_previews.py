@@ -0,0 +1,126 @@
+import asyncio
+import io
+import json
+import os
+import shutil
+
+PREVIEW_MAX_EDGE = 640
+PREVIEW_JPEG_QUALITY = 80
+# Refuse to decode anything bigger than this; draft mode keeps JPEGs far below it.
+PREVIEW_MAX_PIXELS = 50_000_000
+CONTACT_SHEET_COLUMNS = 3
+CONTACT_SHEET_ROWS = 2
+CONTACT_SHEET_TILE_WIDTH = 320
+
+
+def image_thumbnail(path, max_edge=PREVIEW_MAX_EDGE, max_pixels=PREVIEW_MAX_PIXELS):
+    """JPEG bytes of ``path`` scaled to fit ``max_edge``, or None if it isn't a readable image."""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            if width * height > max_pixels:
+                return None
+            # A still frame could hide what later frames show, so animations are reviewed in full.
+            if getattr(image, "is_animated", False):
+                return None
+            # JPEGs decode straight at (close to) the target size, which bounds memory per job.
+            image.draft("RGB", (max_edge, max_edge))
+            frame = image.convert("RGB")
+            frame.thumbnail((max_edge, max_edge))
+            output = io.BytesIO()
+            frame.save(output, format="JPEG", quality=PREVIEW_JPEG_QUALITY, optimize=True)
+            return output.getvalue()
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def _with_memory_limit(args, max_bytes):
+    # The limit is set by a shell in the child rather than a preexec_fn, which
+    # can deadlock when forking while Pillow runs in worker threads.
+    if os.name != "posix":  # No ulimit on Windows; ffmpeg then runs without a memory cap.
+        return args
+    return ("/bin/sh", "-c", f'ulimit -v {max_bytes // 1024} && exec "$0" "$@"', *args)
+
+
+class VideoPreviewer:
+    """Builds keyframe contact sheets for videos with ffmpeg, in a subprocess off the event loop.
+
+    Only keyframes are decoded, spread evenly across the video and tiled
+    into one JPEG. Each ffmpeg run is capped at ``max_memory_bytes`` of
+    address space, ``timeout`` seconds, and ``max_output_bytes`` of output.
+    Without ffmpeg on the PATH ``contact_sheet()`` always returns None.
+    """
+
+    def __init__(
+        self,
+        *,
+        ffmpeg=None,
+        ffprobe=None,
+        timeout=30.0,
+        max_memory_bytes=512 * 1024 * 1024,
+        max_output_bytes=4 * 1024 * 1024,
+    ):
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+        self.ffprobe = ffprobe or shutil.which("ffprobe")
+        self.timeout = timeout
+        self.max_memory_bytes = max_memory_bytes
+        self.max_output_bytes = max_output_bytes
+
+    @property
+    def available(self):
+        return bool(self.ffmpeg and self.ffprobe)
+
+    async def contact_sheet(self, path):
+        if not self.available:
+            return None
+        probe = await self._run(
+            self.ffprobe, "-v", "error", "-show_entries", "format=duration", "-of", "json", path,
+        )
+        try:
+            duration = float(json.loads(probe)["format"]["duration"]) if probe else 0.0
+        except (KeyError, TypeError, ValueError):
+            duration = 0.0
+        tiles = CONTACT_SHEET_COLUMNS * CONTACT_SHEET_ROWS
+        # Sample evenly across the video; very short or unknown-length clips just take the first keyframes.
+        sample = f"fps={tiles}/{duration:.3f}," if duration > 0 else ""
+        return await self._run(
+            self.ffmpeg, "-v", "error", "-threads", "1",
+            "-skip_frame", "nokey", "-i", path,
+            "-vf", f"{sample}scale={CONTACT_SHEET_TILE_WIDTH}:-2,tile={CONTACT_SHEET_COLUMNS}x{CONTACT_SHEET_ROWS}",
+            "-frames:v", "1", "-vsync", "vfr", "-f", "image2pipe", "-vcodec", "mjpeg", "-q:v", "5", "-",
+        )
+
+    async def _run(self, *args):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *_with_memory_limit(args, self.max_memory_bytes),
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except OSError as e:
+            print(f"⚠️ Failed to start {args[0]}: {e}")
+            return None
+        try:
+            output = await asyncio.wait_for(self._read_limited(process), self.timeout)
+        except asyncio.TimeoutError:
+            output = None
+        finally:
+            if process.returncode is None:
+                process.kill()
+            # Drain what's left of stdout; the process isn't reaped until its pipe closes.
+            await process.communicate()
+        if process.returncode != 0:
+            return None
+        return output
+
+    async def _read_limited(self, process):
+        output = bytearray()
+        while chunk := await process.stdout.read(64 * 1024):
+            output += chunk
+            if len(output) > self.max_output_bytes:
+                return None
+        await process.wait()
+        return bytes(output)
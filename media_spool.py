@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from collections import Counter
+
+import aiohttp
+
+SPOOL_CHUNK_BYTES = 64 * 1024
+INCOMING_GRACE_SECONDS = 60 * 60
+
+
+class MediaTooLarge(Exception):
+    pass
+
+
+class MediaSpool:
+    """Content-addressed on-disk store for attachments awaiting moderator review.
+
+    Files are streamed straight from the CDN to disk and named by their
+    SHA-256 digest, so an identical repost shares one file. The spool does
+    not track which reviews reference which files. Callers pass the set of
+    digests that are still referenced when pruning.
+
+    Each file ``store_attachment()`` returns is held until the caller
+    passes its digest to ``release()``. Held files are never removed or
+    pruned, so an upload that is still being fingerprinted, previewed or
+    posted keeps its file even if an identical upload was just resolved.
+    """
+
+    def __init__(self, root, *, max_file_bytes):
+        self.root = root
+        self.max_file_bytes = max_file_bytes
+        self._session = None
+        self._held = Counter()
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, digest):
+        return os.path.join(self.root, digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path_for(digest))
+
+    async def store_attachment(self, attachment):
+        size = getattr(attachment, "size", None)
+        if size is not None and size > self.max_file_bytes:
+            raise MediaTooLarge(f"{attachment.filename} is {size} bytes (limit {self.max_file_bytes}).")
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+
+        digest = hashlib.sha256()
+        written = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".incoming-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async with self._session.get(attachment.url) as response:
+                    response.raise_for_status()
+                    async for chunk in response.content.iter_chunked(SPOOL_CHUNK_BYTES):
+                        written += len(chunk)
+                        if written > self.max_file_bytes:
+                            raise MediaTooLarge(f"{attachment.filename} exceeded {self.max_file_bytes} bytes while downloading.")
+                        digest.update(chunk)
+                        # Disk writes go through a worker thread so slow disks don't stall the event loop.
+                        await asyncio.to_thread(f.write, chunk)
+            hexdigest = digest.hexdigest()
+            # Hold before the file appears under its digest, so a concurrent prune can't take it.
+            self._held[hexdigest] += 1
+            try:
+                await asyncio.to_thread(os.replace, temp_path, self.path_for(hexdigest))
+            except BaseException:
+                self.release(hexdigest)
+                raise
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        return {"filename": attachment.filename, "sha256": hexdigest, "size": written}
+
+    def release(self, digest):
+        self._held[digest] -= 1
+        if self._held[digest] <= 0:
+            del self._held[digest]
+
+    def held_digests(self):
+        return set(self._held)
+
+    def remove(self, digest):
+        if digest in self._held:
+            return
+        try:
+            os.remove(self.path_for(digest))
+        except FileNotFoundError:
+            pass
+
+    def total_bytes(self):
+        total = 0
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    total += entry.stat().st_size
+        return total
+
+    def prune(self, referenced_digests):
+        """Delete spooled files that are neither held nor referenced. Returns bytes freed."""
+        freed = 0
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                # Holds are checked live too: an upload may have finished since the caller's snapshot.
+                if not entry.is_file() or entry.name in referenced_digests or entry.name in self._held:
+                    continue
+                try:
+                    stat = entry.stat()
+                    # Leave in-progress downloads alone; only sweep ones a crash left behind.
+                    if entry.name.startswith(".incoming-") and time.time() - stat.st_mtime < INCOMING_GRACE_SECONDS:
+                        continue
+                    freed += stat.st_size
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        return freed
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
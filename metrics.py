@@ -0,0 +1,252 @@
+import bisect
+import contextvars
+import json
+import time
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_TIMER = _NoopTimer()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, registry, name, help, labelnames=()):
+        self._registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+
+    def inc(self, *labelvalues, amount=1):
+        if not self._registry.enabled:
+            return
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        for labelvalues, value in self._values.items():
+            yield self.name + _labels(self.labelnames, labelvalues), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self._registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, *labelvalues):
+        if not self._registry.enabled:
+            return
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def time(self, *labelvalues):
+        if not self._registry.enabled:
+            return NOOP_TIMER
+        return _HistogramTimer(self, labelvalues)
+
+    def samples(self):
+        for labelvalues, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield self.name + "_bucket" + _labels(self.labelnames, labelvalues, [("le", le)]), cumulative
+            yield self.name + "_sum" + _labels(self.labelnames, labelvalues), total
+            yield self.name + "_count" + _labels(self.labelnames, labelvalues), cumulative
+
+
+class _HistogramTimer:
+    __slots__ = ("_histogram", "_labelvalues", "_start")
+
+    def __init__(self, histogram, labelvalues):
+        self._histogram = histogram
+        self._labelvalues = labelvalues
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start, *self._labelvalues)
+        return False
+
+
+class Callback:
+    """A gauge or counter read from existing state at scrape time, so it costs nothing in between."""
+
+    def __init__(self, name, help, read, kind="gauge", labelnames=()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = labelnames
+        self._read = read
+
+    def samples(self):
+        value = self._read()
+        if value is None:
+            return
+        if isinstance(value, dict):
+            for labelvalues, labelled in value.items():
+                if labelled is not None:
+                    yield self.name + _labels(self.labelnames, labelvalues), labelled
+        else:
+            yield self.name, value
+
+
+class MetricsRegistry:
+    """Prometheus-style metrics served as text from a local aiohttp endpoint.
+
+    Counters and histograms can be created and updated unconditionally;
+    while the registry is disabled every update returns immediately.
+    """
+
+    def __init__(self, *, enabled=False):
+        self.enabled = enabled
+        self._metrics = []
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(self, name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, help, labelnames, buckets))
+
+    def callback(self, name, help, read, kind="gauge", labelnames=()):
+        return self._register(Callback(name, help, read, kind, labelnames))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                print(f"⚠️ Failed to collect metric {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{sample} {value}" for sample, value in samples)
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host, port):
+        async def handle_metrics(request):
+            return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Tracer:
+    """Writes one JSON line per traced message, listing the timed stages it went through."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.enabled = bool(path)
+        self._file = None
+        self.written = 0
+
+    def begin(self, **attributes):
+        if not self.enabled:
+            return
+        _current_trace.set({
+            "started_at": time.time(),
+            "attributes": attributes,
+            "spans": [],
+            "_start": time.perf_counter(),
+        })
+
+    def record_span(self, name, start, duration, error=None):
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        span = {
+            "name": name,
+            "offset_ms": round((start - trace["_start"]) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+        }
+        if error:
+            span["error"] = error
+        trace["spans"].append(span)
+
+    def finish(self, **attributes):
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        _current_trace.set(None)
+        trace["duration_ms"] = round((time.perf_counter() - trace.pop("_start")) * 1000, 3)
+        trace["attributes"].update(attributes)
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(trace, default=str) + "\n")
+            self.written += 1
+        except OSError as e:
+            print(f"⚠️ Failed to write trace to {self.path}; tracing disabled: {e}")
+            self.enabled = False
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class StageTimer:
+    """Times one pipeline stage into a labelled histogram and, when tracing, the current trace."""
+
+    __slots__ = ("_histogram", "_tracer", "_name", "_start")
+
+    def __init__(self, histogram, tracer, name):
+        self._histogram = histogram
+        self._tracer = tracer
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        self._histogram.observe(duration, self._name)
+        if self._tracer.enabled:
+            self._tracer.record_span(self._name, self._start, duration, exc_type.__name__ if exc_type else None)
+        return False
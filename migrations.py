@@ -0,0 +1,60 @@
+import hashlib
+import json
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import DBAPIError
+
+SCHEMA_FINGERPRINT_PREFIX = "schema-"
+
+
+def schema_fingerprint(metadata):
+    """A short hash of every table, column and index the models declare."""
+    description = []
+    for table in sorted(metadata.tables.values(), key=lambda table: table.name):
+        description.append([
+            table.name,
+            [[column.name, str(column.type), column.primary_key, column.nullable] for column in table.columns],
+            sorted([index.name, [column.name for column in index.columns]] for index in table.indexes),
+        ])
+    digest = hashlib.sha256(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()
+    return SCHEMA_FINGERPRINT_PREFIX + digest[:16]
+
+
+async def run_migrations(engine, metadata, migrations_table, migrations):
+    """Bring the database up to date, returning the IDs of the migrations that ran.
+
+    ``migrations`` is an ordered list of ``(migration_id, apply)`` pairs,
+    where ``apply(conn)`` runs inside its own transaction and the ID is
+    recorded in ``migrations_table`` alongside it. The current schema
+    fingerprint is recorded the same way, so when nothing has changed a
+    single SELECT is all a restart costs; ``create_all`` only runs when a
+    model or migration was added since the last boot.
+    """
+    required = {schema_fingerprint(metadata)} | {migration_id for migration_id, _ in migrations}
+    try:
+        async with engine.connect() as conn:
+            applied = set((await conn.execute(select(migrations_table.c.migration_id))).scalars())
+    except DBAPIError:
+        # A fresh database has no migrations table yet.
+        applied = set()
+    if required <= applied:
+        return []
+
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+
+    ran = []
+    for migration_id, apply in migrations:
+        if migration_id in applied:
+            continue
+        async with engine.begin() as conn:
+            await apply(conn)
+            await conn.execute(insert(migrations_table).values(migration_id=migration_id))
+        ran.append(migration_id)
+
+    async with engine.begin() as conn:
+        await conn.execute(
+            delete(migrations_table).where(migrations_table.c.migration_id.startswith(SCHEMA_FINGERPRINT_PREFIX))
+        )
+        await conn.execute(insert(migrations_table).values(migration_id=schema_fingerprint(metadata)))
+    return ran
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+from latency_stats import LatencyRecorder
+
+
+class ModerationBatcher:
+    """Collects messages that arrive close together and classifies them in one request.
+
+    Strict and lenient messages are batched separately because they use
+    different prompts. A batch is dispatched when it reaches
+    ``max_batch_size`` or when ``window_seconds`` have passed since its
+    first message arrived, whichever comes first.
+    """
+
+    def __init__(self, classify_batch, *, window_seconds=0.1, max_batch_size=20):
+        self._classify_batch = classify_batch
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._pending = {False: [], True: []}
+        self._timers = {}
+        self._dispatches = set()
+        self.latency = LatencyRecorder()
+        self.messages = 0
+        self.requests = 0
+
+    async def submit(self, message_content, *, lenient=False):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending[lenient]
+        batch.append((message_content, future, time.perf_counter()))
+        self.messages += 1
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(lenient)
+        elif lenient not in self._timers:
+            self._timers[lenient] = loop.call_later(self.window_seconds, self._flush, lenient)
+
+        return await asyncio.shield(future)
+
+    def _flush(self, lenient):
+        timer = self._timers.pop(lenient, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending[lenient]
+        if not batch:
+            return
+        self._pending[lenient] = []
+        task = asyncio.create_task(self._dispatch(batch, lenient))
+        self._dispatches.add(task)
+        task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch, lenient):
+        self.requests += 1
+        try:
+            verdicts = await self._classify_batch([content for content, _, _ in batch], lenient=lenient)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        for (_, future, queued_at), verdict in zip(batch, verdicts):
+            self.latency.record(finished - queued_at)
+            if not future.done():
+                future.set_result(verdict)
+
+    async def drain(self):
+        for lenient in list(self._pending):
+            self._flush(lenient)
+        if self._dispatches:
+            await asyncio.gather(*self._dispatches, return_exceptions=True)
+
+    def requests_per_message(self):
+        if not self.messages:
+            return None
+        return self.requests / self.messages
+
+    def stats(self):
+        return {
+            "messages": self.messages,
+            "requests": self.requests,
+            "requests_per_message": self.requests_per_message(),
+            "window_seconds": self.window_seconds,
+            "max_batch_size": self.max_batch_size,
+            **self.latency.summary(),
+        }
@@ -0,0 +1,208 @@
+import asyncio
+import time
+import traceback
+from collections import OrderedDict, deque
+
+from latency_stats import LatencyRecorder
+
+
+class _Entry:
+    __slots__ = ("seq", "channel_id", "user_id", "job", "queued_at", "previous", "finished")
+
+    def __init__(self, seq, channel_id, user_id, job, previous, finished):
+        self.seq = seq
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.job = job
+        self.queued_at = time.perf_counter()
+        self.previous = previous
+        self.finished = finished
+
+
+class _FairScheduler:
+    """Per-user FIFOs, handed out round-robin by channel, then by user within a channel.
+
+    A user sits in the ring of the channel their *oldest* pending job
+    belongs to, so each user's jobs are always handed out in arrival order,
+    even when they span channels.
+    """
+
+    def __init__(self):
+        self.users = {}
+        self.channels = {}
+        self.channel_ring = deque()
+
+    def add(self, entry):
+        jobs = self.users.get(entry.user_id)
+        if jobs is None:
+            jobs = self.users[entry.user_id] = deque()
+        jobs.append(entry)
+        if len(jobs) == 1:
+            self._schedule(entry.user_id)
+
+    def _schedule(self, user_id):
+        channel_id = self.users[user_id][0].channel_id
+        ready_users = self.channels.get(channel_id)
+        if ready_users is None:
+            ready_users = self.channels[channel_id] = deque()
+            self.channel_ring.append(channel_id)
+        ready_users.append(user_id)
+
+    def _unschedule(self, user_id, channel_id):
+        ready_users = self.channels[channel_id]
+        ready_users.remove(user_id)
+        if not ready_users:
+            del self.channels[channel_id]
+            self.channel_ring.remove(channel_id)
+
+    def _advance(self, user_id):
+        jobs = self.users[user_id]
+        jobs.popleft()
+        if jobs:
+            self._schedule(user_id)
+        else:
+            del self.users[user_id]
+
+    def next(self):
+        if not self.channel_ring:
+            return None
+        channel_id = self.channel_ring.popleft()
+        ready_users = self.channels[channel_id]
+        user_id = ready_users.popleft()
+        if ready_users:
+            self.channel_ring.append(channel_id)
+        else:
+            del self.channels[channel_id]
+        entry = self.users[user_id][0]
+        self._advance(user_id)
+        return entry
+
+    def drop_head(self, entry):
+        # Shedding always removes the globally oldest job, which is the head of its user's FIFO.
+        self._unschedule(entry.user_id, entry.channel_id)
+        self._advance(entry.user_id)
+
+
+class ModerationQueue:
+    """Bounded ingestion queue between on_message and the moderation pipeline.
+
+    A pool of workers takes jobs round-robin across channels, and across
+    users within a channel, so one busy channel or one spammer cannot
+    starve the rest. ``classify(job)`` runs concurrently, even for jobs
+    from the same user, but ``act(job, verdict)`` runs strictly in each
+    user's arrival order, so side effects such as warning counts stay
+    consistent. When the backlog passes ``max_backlog``, the oldest jobs
+    are shed and passed to ``on_shed``.
+    """
+
+    def __init__(self, classify, act, *, workers=64, max_backlog=5_000, on_shed=None):
+        self._classify = classify
+        self._act = act
+        self._on_shed = on_shed
+        self.workers = workers
+        self.max_backlog = max_backlog
+        self._scheduler = _FairScheduler()
+        self._ready = asyncio.Semaphore(0)
+        self._pending = OrderedDict()
+        self._last_by_user = {}
+        self._seq = 0
+        self._tasks = []
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.active = 0
+        self.processed = 0
+        self.shed = 0
+        self.latency = LatencyRecorder()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, channel_id, user_id, job):
+        self._seq += 1
+        finished = asyncio.get_running_loop().create_future()
+        entry = _Entry(self._seq, channel_id, user_id, job, self._last_by_user.get(user_id), finished)
+        self._last_by_user[user_id] = finished
+        self._pending[entry.seq] = entry
+        self._idle.clear()
+        self._scheduler.add(entry)
+        self._ready.release()
+
+        while len(self._pending) > self.max_backlog:
+            _, oldest = self._pending.popitem(last=False)
+            self._scheduler.drop_head(oldest)
+            self.shed += 1
+            # Still hand the user's turn on once everything queued before this job has acted.
+            self._finish_after(oldest)
+            if self._on_shed:
+                self._on_shed(oldest.job)
+
+    async def join(self):
+        await self._idle.wait()
+
+    async def _work(self):
+        while True:
+            await self._ready.acquire()
+            entry = self._scheduler.next()
+            if entry is None:
+                # The job this permit was for has been shed.
+                continue
+
+            del self._pending[entry.seq]
+            self.active += 1
+            try:
+                await self._run(entry)
+            finally:
+                self.active -= 1
+                self.processed += 1
+                self.latency.record(time.perf_counter() - entry.queued_at)
+                self._finish(entry)
+                if not self._pending and not self.active:
+                    self._idle.set()
+
+    async def _run(self, entry):
+        try:
+            verdict = await self._classify(entry.job)
+        except Exception:
+            traceback.print_exc()
+            verdict = None
+        if entry.previous is not None:
+            await entry.previous
+        if verdict is None:
+            return
+        try:
+            await self._act(entry.job, verdict)
+        except Exception:
+            traceback.print_exc()
+
+    def _finish(self, entry):
+        if not entry.finished.done():
+            entry.finished.set_result(None)
+        if self._last_by_user.get(entry.user_id) is entry.finished:
+            del self._last_by_user[entry.user_id]
+
+    def _finish_after(self, entry):
+        if entry.previous is None or entry.previous.done():
+            self._finish(entry)
+        else:
+            entry.previous.add_done_callback(lambda _: self._finish(entry))
+
+    def __len__(self):
+        return len(self._pending)
+
+    def stats(self):
+        return {
+            "queued": len(self._pending),
+            "max_backlog": self.max_backlog,
+            "active": self.active,
+            "workers": self.workers,
+            "processed": self.processed,
+            "shed": self.shed,
+            **self.latency.summary(),
+        }
@@ -0,0 +1,248 @@
+import asyncio
+import heapq
+import itertools
+import random
+import re
+import time
+
+import openai
+
+from latency_stats import LatencyRecorder
+
+LIVE = 0
+STAFF = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {LIVE: "live", STAFF: "staff", BACKGROUND: "background"}
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset_duration(value):
+    """Parse OpenAI reset headers such as ``"1s"``, ``"6m0s"`` or ``"120ms"`` into seconds."""
+    if not value:
+        return None
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.refill_per_second = per_minute / 60
+        self.tokens = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def wait_time(self, amount):
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def take(self, amount):
+        self._refill()
+        # May go negative when a request used more than estimated; later requests pay it back.
+        self.tokens -= amount
+
+    def observe(self, limit, remaining):
+        self._refill()
+        if limit:
+            self.capacity = float(limit)
+            self.refill_per_second = limit / 60
+        if remaining is not None:
+            self.tokens = min(self.tokens, float(remaining))
+
+
+class OpenAIGovernor:
+    """Shared admission control for every OpenAI call the bot makes.
+
+    Requests wait in a priority queue (live moderation, then staff commands,
+    then background work) and are admitted when a concurrency slot, a
+    request token and enough estimated LLM tokens are available. Both
+    buckets resize themselves from the ``x-ratelimit-*`` response headers.
+    429s, timeouts and 5xx responses are retried with jittered exponential
+    backoff, and a 429 pauses admission for everyone until its retry-after
+    has passed.
+
+    ``request`` is a zero-argument callable returning a ``with_raw_response``
+    coroutine, so the governor can read headers before parsing.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency=8,
+        requests_per_minute=3_500,
+        tokens_per_minute=90_000,
+        max_retries=4,
+        base_backoff_seconds=0.5,
+        max_backoff_seconds=20.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._changed = asyncio.Event()
+        self._pump_task = None
+        self._paused_until = 0.0
+        self.wait_times = {priority: LatencyRecorder() for priority in PRIORITY_NAMES}
+        self.completed = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+
+    async def call(self, request, *, priority=LIVE, estimated_tokens=500):
+        attempt = 0
+        while True:
+            await self._acquire(priority, estimated_tokens)
+            try:
+                raw = await request()
+            except RETRYABLE_ERRORS as e:
+                self._release()
+                if isinstance(e, openai.RateLimitError):
+                    self.rate_limited += 1
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+                continue
+            except asyncio.CancelledError:
+                self._release()
+                raise
+            except BaseException:
+                self._release()
+                self.failures += 1
+                raise
+
+            self._release()
+            self.completed += 1
+            self._observe(raw.headers)
+            response = raw.parse()
+            usage = getattr(response, "usage", None)
+            if usage is not None and usage.total_tokens > estimated_tokens:
+                self.tokens.take(usage.total_tokens - estimated_tokens)
+            return response
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** attempt))
+        response = getattr(error, "response", None)
+        if isinstance(error, openai.RateLimitError) and response is not None:
+            retry_after = response.headers.get("retry-after-ms")
+            retry_after = float(retry_after) / 1000 if retry_after else parse_reset_duration(response.headers.get("retry-after"))
+            if retry_after:
+                delay = max(delay, retry_after)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._changed.set()
+        return delay
+
+    def _observe(self, headers):
+        def number(name):
+            value = headers.get(name)
+            try:
+                return int(value) if value is not None else None
+            except ValueError:
+                return None
+
+        self.requests.observe(number("x-ratelimit-limit-requests"), number("x-ratelimit-remaining-requests"))
+        self.tokens.observe(number("x-ratelimit-limit-tokens"), number("x-ratelimit-remaining-tokens"))
+
+    async def _acquire(self, priority, estimated_tokens):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future, estimated_tokens, time.monotonic()))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        self._changed.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Admitted just as we were cancelled: hand the slot back.
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        self.in_flight -= 1
+        self._changed.set()
+
+    async def _pump(self):
+        while self._waiters:
+            priority, _, future, estimated_tokens, queued_at = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            wait = None
+            if self.in_flight < self.max_concurrency:
+                wait = max(
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(estimated_tokens),
+                    self._paused_until - time.monotonic(),
+                )
+                if wait <= 0:
+                    heapq.heappop(self._waiters)
+                    self.requests.take(1)
+                    self.tokens.take(estimated_tokens)
+                    self.in_flight += 1
+                    self.wait_times[priority].record(time.monotonic() - queued_at)
+                    future.set_result(None)
+                    continue
+
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def has_backlog(self):
+        """Whether any request is still waiting for admission."""
+        return any(not future.done() for _, _, future, _, _ in self._waiters)
+
+    def queue_depths(self):
+        depths = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future, _, _ in self._waiters:
+            if not future.done():
+                depths[PRIORITY_NAMES[priority]] += 1
+        return depths
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queued": self.queue_depths(),
+            "wait_p95": {
+                PRIORITY_NAMES[priority]: recorder.percentile(95)
+                for priority, recorder in self.wait_times.items()
+            },
+            "completed": self.completed,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "requests_per_minute": self.requests.capacity,
+            "tokens_per_minute": self.tokens.capacity,
+            "paused_for": max(0.0, self._paused_until - time.monotonic()),
+        }
@@ -0,0 +1,195 @@
+import re
+import unicodedata
+from collections import Counter
+
+SAFE = "SAFE"
+DELETE = "DELETE"
+ESCALATE = None
+
+ZERO_WIDTH_CHARS = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u200e\u200f\u2060\u2061\u2062\u2063\u2064\ufeff\u00ad\u034f\u180e"), None)
+HOMOGLYPHS = str.maketrans({
+    # Cyrillic
+    "\u0430": "a", "\u0432": "b", "\u0435": "e", "\u0451": "e", "\u043a": "k", "\u043c": "m",
+    "\u043d": "h", "\u043e": "o", "\u0440": "p", "\u0441": "c", "\u0442": "t", "\u0443": "y",
+    "\u0445": "x", "\u0456": "i", "\u0457": "i", "\u0458": "j", "\u0455": "s", "\u0501": "d",
+    "\u051b": "q", "\u051d": "w", "\u04af": "y", "\u04bb": "h",
+    # Greek
+    "\u03b1": "a", "\u03b2": "b", "\u03b5": "e", "\u03b7": "n", "\u03b9": "i", "\u03ba": "k",
+    "\u03bd": "v", "\u03bf": "o", "\u03c1": "p", "\u03c4": "t", "\u03c5": "u", "\u03c7": "x",
+    "\u03b3": "y", "\u03c2": "s",
+})
+LEETSPEAK = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "6": "g", "7": "t", "8": "b", "9": "g",
+    "@": "a", "$": "s", "€": "e", "£": "l",
+})
+# Regional indicator symbols (🇦-🇿) read as letters, and NFKC leaves them alone.
+REGIONAL_INDICATORS = str.maketrans({0x1F1E6 + offset: chr(ord("a") + offset) for offset in range(26)})
+SKIN_TONE_MODIFIERS = frozenset(map(chr, range(0x1F3FB, 0x1F400)))
+REPEATED_CHARS = re.compile(r"(.)\1+")
+SEPARATORS = re.compile(r"[\W_]+")
+# Runs like "s l u r" or "s.l.u.r" are joined back into one token.
+SPACED_LETTERS = re.compile(r"\b(?:\w )+\w\b")
+
+URL_PATTERN = re.compile(r"https?://\S+", re.IGNORECASE)
+CUSTOM_EMOJI_PATTERN = re.compile(r"<a?:\w+:\d+>")
+MENTION_PATTERN = re.compile(r"<(?:@[!&]?|#)\d+>")
+
+SAFE_CHATTER = frozenset({
+    "lol", "lmao", "lmfao", "rofl", "haha", "hahaha", "xd", "gg", "ggs", "gg wp", "wp", "glhf",
+    "ok", "okay", "k", "kk", "yes", "yeah", "yep", "ya", "no", "nope", "nah", "ty", "thx",
+    "thanks", "thank you", "np", "yw", "hi", "hey", "hello", "yo", "sup", "bye", "gn", "gm",
+    "brb", "afk", "idk", "ikr", "omg", "wow", "nice", "cool", "true", "same", "fr", "real",
+    "bet", "w", "l", "rip", "f", "oof", "hmm", "huh", "what", "why", "ez", "pog", "poggers",
+})
+
+
+def normalize_text(message_content):
+    """Fold common filter-evasion tricks so lexicon terms match their disguised forms.
+
+    Repeated letters are kept; :func:`squash_repeats` folds stretched
+    spellings separately, since squashing would also merge distinct words.
+    """
+    text = unicodedata.normalize("NFKC", message_content).translate(ZERO_WIDTH_CHARS)
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = text.translate(HOMOGLYPHS).translate(LEETSPEAK).translate(REGIONAL_INDICATORS)
+    text = SEPARATORS.sub(" ", text)
+    text = SPACED_LETTERS.sub(lambda match: match.group(0).replace(" ", ""), text)
+    return " ".join(text.split())
+
+
+def squash_repeats(normalized_text):
+    return REPEATED_CHARS.sub(r"\1", normalized_text)
+
+
+def simplify_text(message_content):
+    return " ".join(SEPARATORS.sub(" ", message_content.casefold()).split())
+
+
+class PrefilterInput:
+    __slots__ = ("content", "lenient", "normalized", "squashed", "simplified")
+
+    def __init__(self, content, lenient):
+        self.content = content
+        self.lenient = lenient
+        self.normalized = normalize_text(content)
+        self.squashed = squash_repeats(self.normalized)
+        self.simplified = simplify_text(content)
+
+
+class Lexicon:
+    """Compiled whole-word matcher over normalized lexicon terms.
+
+    Terms are matched as written, and terms without doubled letters are
+    also matched against the squashed text to catch stretched spellings
+    ("sluuuur"). Terms with doubled letters are never squashed, so "coon"
+    doesn't match "con".
+    """
+
+    def __init__(self, terms=()):
+        normalized_terms = sorted({normalize_text(term) for term in terms} - {""}, key=len, reverse=True)
+        self.size = len(normalized_terms)
+        self._pattern = self._compile(normalized_terms)
+        self._stretched_pattern = self._compile(
+            [term for term in normalized_terms if squash_repeats(term) == term]
+        )
+
+    @staticmethod
+    def _compile(terms):
+        if not terms:
+            return None
+        return re.compile(r"\b(?:" + "|".join(map(re.escape, terms)) + r")\b")
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(line.strip() for line in f if line.strip() and not line.startswith("#"))
+
+    def search(self, normalized_text, squashed_text=None):
+        if self._pattern is not None and self._pattern.search(normalized_text):
+            return True
+        if self._stretched_pattern is None:
+            return False
+        if squashed_text is None:
+            squashed_text = squash_repeats(normalized_text)
+        return self._stretched_pattern.search(squashed_text) is not None
+
+
+def lexicon_stage(lexicon):
+    def stage(item):
+        if lexicon.search(item.normalized, item.squashed):
+            return DELETE
+        return ESCALATE
+    stage.__name__ = "lexicon"
+    return stage
+
+
+def blank_stage(item):
+    if not item.content.strip():
+        return SAFE
+    return ESCALATE
+
+
+def is_emoji_char(char):
+    # Pictographs are "So"; skin tones, variation selectors, keycaps and ZWJ glue them into sequences.
+    # Regional indicators are "So" too, but they spell words, so they're text.
+    if char in SKIN_TONE_MODIFIERS or char == "\u200d":
+        return True
+    if unicodedata.category(char) == "So":
+        return not "\U0001F1E6" <= char <= "\U0001F1FF"
+    return unicodedata.category(char) in ("Mn", "Me")
+
+
+def decoration_only_stage(item):
+    # Messages made only of emoji, links and mentions carry no text for the LLM to judge.
+    # Numbers and other symbols still escalate: "1488" is a dog whistle, not decoration.
+    stripped = URL_PATTERN.sub(" ", item.content)
+    stripped = CUSTOM_EMOJI_PATTERN.sub(" ", stripped)
+    stripped = MENTION_PATTERN.sub(" ", stripped)
+    if all(char.isspace() or is_emoji_char(char) for char in stripped):
+        return SAFE
+    return ESCALATE
+
+
+def chatter_stage(item):
+    if item.simplified in SAFE_CHATTER:
+        return SAFE
+    return ESCALATE
+
+
+class Prefilter:
+    """CPU-only pre-classification that settles obvious messages before the LLM.
+
+    Each stage receives a :class:`PrefilterInput` and returns ``SAFE``,
+    ``DELETE`` or ``ESCALATE``; the first definite answer wins. Callers can
+    pass their own stage list to plug in extra heuristics.
+    """
+
+    def __init__(self, stages=None, *, lexicon=None):
+        self.lexicon = lexicon or Lexicon()
+        if stages is None:
+            stages = [lexicon_stage(self.lexicon), blank_stage, decoration_only_stage, chatter_stage]
+        self.stages = list(stages)
+        self.outcomes = Counter()
+
+    def classify(self, message_content, *, lenient=False):
+        item = PrefilterInput(message_content, lenient)
+        for stage in self.stages:
+            verdict = stage(item)
+            if verdict is not ESCALATE:
+                self.outcomes[(stage.__name__, verdict)] += 1
+                return verdict
+        self.outcomes[("escalate", None)] += 1
+        return ESCALATE
+
+    def stats(self):
+        total = sum(self.outcomes.values())
+        escalated = self.outcomes[("escalate", None)]
+        return {
+            "classified": total,
+            "settled_safe": sum(n for (_, verdict), n in self.outcomes.items() if verdict == SAFE),
+            "settled_delete": sum(n for (_, verdict), n in self.outcomes.items() if verdict == DELETE),
+            "escalated": escalated,
+            "escalation_rate": escalated / total if total else None,
+            "lexicon_terms": self.lexicon.size,
+        }
@@ -0,0 +1,170 @@
+import re
+import time
+from collections import OrderedDict
+
+STARTED = "started"
+WHITESPACE = re.compile(r"\s+")
+
+
+class SlidingWindowCounter:
+    """Events in the last ``window_seconds``, kept in a fixed ring of time buckets."""
+
+    __slots__ = ("bucket_seconds", "_counts", "_slots")
+
+    def __init__(self, window_seconds=60.0, buckets=12):
+        self.bucket_seconds = window_seconds / buckets
+        self._counts = [0] * buckets
+        self._slots = [-1] * buckets
+
+    def add(self, now, amount=1):
+        slot = int(now // self.bucket_seconds)
+        index = slot % len(self._counts)
+        if self._slots[index] != slot:
+            self._slots[index] = slot
+            self._counts[index] = 0
+        self._counts[index] += amount
+        return self.total(now)
+
+    def total(self, now):
+        slot = int(now // self.bucket_seconds)
+        size = len(self._counts)
+        return sum(count for count, bucket_slot in zip(self._counts, self._slots) if 0 <= slot - bucket_slot < size)
+
+
+class Raid:
+    """One guild's counters, plus what happened while it was in raid mode."""
+
+    def __init__(self, window_seconds):
+        self.joins = SlidingWindowCounter(window_seconds)
+        self.new_account_messages = SlidingWindowCounter(window_seconds)
+        self.contents = OrderedDict()
+        self.active = False
+        self.started_at = None
+        self.calm_since = None
+        self.trigger = None
+        self.joined = 0
+        self.deleted = 0
+        self.banned = 0
+
+
+class RaidDetector:
+    """Puts a guild into raid mode when joins or new-account traffic surge, and out again once it calms down.
+
+    Three rates are tracked per guild over a sliding ``window_seconds``:
+    joins, messages from new accounts, and how often one piece of
+    new-account content repeats. Raid mode starts as soon as any of them
+    reaches its threshold. It ends once every rate has stayed below
+    ``exit_ratio`` of its threshold for ``calm_seconds``, checked by
+    ``check()``, which the caller runs periodically.
+    """
+
+    def __init__(
+        self,
+        *,
+        window_seconds=60.0,
+        join_threshold=15,
+        new_account_message_threshold=40,
+        duplicate_threshold=6,
+        min_duplicate_chars=12,
+        exit_ratio=0.5,
+        calm_seconds=120.0,
+        max_tracked_contents=2_048,
+    ):
+        self.window_seconds = window_seconds
+        self.join_threshold = join_threshold
+        self.new_account_message_threshold = new_account_message_threshold
+        self.duplicate_threshold = duplicate_threshold
+        self.min_duplicate_chars = min_duplicate_chars
+        self.exit_ratio = exit_ratio
+        self.calm_seconds = calm_seconds
+        self.max_tracked_contents = max_tracked_contents
+        self._raids = {}
+
+    def _raid(self, guild_id):
+        raid = self._raids.get(guild_id)
+        if raid is None:
+            raid = self._raids[guild_id] = Raid(self.window_seconds)
+        return raid
+
+    def record_join(self, guild_id, now=None):
+        """Count a join; returns ``STARTED`` if it tipped the guild into raid mode."""
+        now = time.monotonic() if now is None else now
+        raid = self._raid(guild_id)
+        joins = raid.joins.add(now)
+        if raid.active:
+            raid.joined += 1
+            return None
+        if joins >= self.join_threshold:
+            return self._start(raid, now, f"{joins} joins in {self.window_seconds:.0f}s")
+        return None
+
+    def record_message(self, guild_id, content, *, new_account, now=None):
+        """Count a message; returns ``(transition, repeats)`` where ``repeats`` is how often its content recurred."""
+        if not new_account:
+            return None, 0
+        now = time.monotonic() if now is None else now
+        raid = self._raid(guild_id)
+        messages = raid.new_account_messages.add(now)
+        repeats = self._count_content(raid, content, now)
+        if raid.active:
+            return None, repeats
+        if messages >= self.new_account_message_threshold:
+            return self._start(raid, now, f"{messages} new-account messages in {self.window_seconds:.0f}s"), repeats
+        if repeats >= self.duplicate_threshold:
+            return self._start(raid, now, f"the same message posted {repeats} times by new accounts"), repeats
+        return None, repeats
+
+    def _count_content(self, raid, content, now):
+        normalized = WHITESPACE.sub(" ", content or "").strip().lower()
+        # Short messages ("hi", "gm") repeat innocently whenever new members arrive together.
+        if len(normalized) < self.min_duplicate_chars:
+            return 0
+        counter = raid.contents.get(normalized)
+        if counter is None:
+            counter = raid.contents[normalized] = SlidingWindowCounter(self.window_seconds)
+            if len(raid.contents) > self.max_tracked_contents:
+                raid.contents.popitem(last=False)
+        else:
+            raid.contents.move_to_end(normalized)
+        return counter.add(now)
+
+    def _start(self, raid, now, trigger):
+        raid.active = True
+        raid.started_at = now
+        raid.calm_since = None
+        raid.trigger = trigger
+        raid.joined = raid.deleted = raid.banned = 0
+        return STARTED
+
+    def check(self, now=None):
+        """Return ``(guild_id, raid)`` for every raid that just ended, and forget idle guilds."""
+        now = time.monotonic() if now is None else now
+        ended = []
+        for guild_id, raid in list(self._raids.items()):
+            joins = raid.joins.total(now)
+            messages = raid.new_account_messages.total(now)
+            repeats = max((counter.total(now) for counter in raid.contents.values()), default=0)
+            if not raid.active:
+                if not joins and not messages:
+                    del self._raids[guild_id]
+                continue
+            calm = (
+                joins < self.join_threshold * self.exit_ratio
+                and messages < self.new_account_message_threshold * self.exit_ratio
+                and repeats < self.duplicate_threshold * self.exit_ratio
+            )
+            if not calm:
+                raid.calm_since = None
+            elif raid.calm_since is None:
+                raid.calm_since = now
+            elif now - raid.calm_since >= self.calm_seconds:
+                raid.active = False
+                ended.append((guild_id, raid))
+        return ended
+
+    def active_raid(self, guild_id):
+        raid = self._raids.get(guild_id)
+        return raid if raid is not None and raid.active else None
+
+    def active_raids(self):
+        return {guild_id: raid for guild_id, raid in self._raids.items() if raid.active}
@@ -0,0 +1,50 @@
+class ModerationStateCache:
+    """In-memory mirror of the jailed and exempt tables, keyed by (guild_id, user_id).
+
+    Reads are served from memory. Writers update the database first and then
+    call the matching setter here (write-through). Periodic reconciliation
+    replaces the mirror with a fresh snapshot. A snapshot is discarded if any
+    write landed while it was being loaded, so it can never roll back a newer
+    write.
+    """
+
+    def __init__(self):
+        self.jailed = set()
+        self.exempt = set()
+        self._writes = 0
+
+    def snapshot_token(self):
+        return self._writes
+
+    def apply_snapshot(self, token, *, jailed, exempt):
+        if token != self._writes:
+            return False
+        self.jailed = set(jailed)
+        self.exempt = set(exempt)
+        return True
+
+    def is_jailed(self, key):
+        return key in self.jailed
+
+    def is_exempt(self, key):
+        return key in self.exempt
+
+    def set_jailed(self, key, jailed):
+        self._writes += 1
+        if jailed:
+            self.jailed.add(key)
+        else:
+            self.jailed.discard(key)
+
+    def set_exempt(self, key, exempt):
+        self._writes += 1
+        if exempt:
+            self.exempt.add(key)
+        else:
+            self.exempt.discard(key)
+
+    def stats(self):
+        return {
+            "jailed": len(self.jailed),
+            "exempt": len(self.exempt),
+        }
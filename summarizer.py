@@ -0,0 +1,108 @@
+import asyncio
+
+MAP_PROMPT = (
+    "Summarize this part of a Discord conversation in a few short sentences. "
+    "Keep who said what when it matters, decisions, and open questions."
+)
+REDUCE_PROMPT = (
+    "These are summaries of consecutive parts of one Discord conversation, oldest first. "
+    "Merge them into a single short, clear paragraph."
+)
+PREVIOUS_SUMMARY_PREFIX = "Summary of the conversation before this point: "
+
+
+def estimate_tokens(text):
+    # Same rough four-characters-per-token rule the governor starts from.
+    return len(text) // 4 + 1
+
+
+class MapReduceSummarizer:
+    """Summarizes an arbitrarily long stream of chat lines with bounded prompt sizes.
+
+    Lines are consumed as they arrive and cut into chunks of at most
+    ``chunk_tokens`` estimated tokens. Each chunk is summarized as soon as
+    it is full, with up to ``max_concurrency`` calls in flight, while the
+    stream keeps being read. The partial summaries (plus an earlier rolling
+    summary, if given) are then merged ``reduce_fan_in`` at a time until
+    one remains.
+
+    ``complete(system_prompt, text)`` returns the model's reply.
+    ``on_progress(progress)``, if given, is awaited with a dict of counts
+    whenever a chunk is dispatched or finished.
+    """
+
+    def __init__(self, complete, *, chunk_tokens=3_000, max_concurrency=4, reduce_fan_in=8):
+        self._complete = complete
+        self.chunk_tokens = chunk_tokens
+        self.max_concurrency = max_concurrency
+        self.reduce_fan_in = reduce_fan_in
+
+    async def summarize(self, lines, *, newest_first=False, previous_summary=None, on_progress=None):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        progress = {"messages": 0, "chunks": 0, "summarized": 0}
+
+        async def report():
+            if on_progress:
+                await on_progress(dict(progress))
+
+        async def summarize_chunk(chunk):
+            async with semaphore:
+                partial = await self._complete(MAP_PROMPT, "\n".join(reversed(chunk) if newest_first else chunk))
+            progress["summarized"] += 1
+            await report()
+            return partial
+
+        tasks = []
+        try:
+            chunk = []
+            chunk_tokens = 0
+            max_line_chars = self.chunk_tokens * 4
+            async for line in lines:
+                progress["messages"] += 1
+                line = line[:max_line_chars]
+                tokens = estimate_tokens(line)
+                if chunk and chunk_tokens + tokens > self.chunk_tokens:
+                    tasks.append(asyncio.create_task(summarize_chunk(chunk)))
+                    progress["chunks"] += 1
+                    await report()
+                    chunk, chunk_tokens = [], 0
+                chunk.append(line)
+                chunk_tokens += tokens
+            if chunk:
+                tasks.append(asyncio.create_task(summarize_chunk(chunk)))
+                progress["chunks"] += 1
+                await report()
+
+            partials = list(await asyncio.gather(*tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if newest_first:
+            partials.reverse()
+        if not partials:
+            return previous_summary
+        if previous_summary:
+            partials.insert(0, PREVIOUS_SUMMARY_PREFIX + previous_summary)
+        return await self._reduce(partials)
+
+    async def _reduce(self, partials):
+        while len(partials) > 1:
+            groups = []
+            group, group_tokens = [], 0
+            for partial in partials:
+                tokens = estimate_tokens(partial)
+                # Always pair at least two summaries, or an oversized one could stall the reduction.
+                if len(group) >= 2 and (len(group) >= self.reduce_fan_in or group_tokens + tokens > self.chunk_tokens):
+                    groups.append(group)
+                    group, group_tokens = [], 0
+                group.append(partial)
+                group_tokens += tokens
+            groups.append(group)
+            partials = await asyncio.gather(*(self._merge(group) for group in groups))
+        return partials[0]
+
+    async def _merge(self, group):
+        if len(group) == 1:
+            return group[0]
+        return await self._complete(REDUCE_PROMPT, "\n\n".join(group))
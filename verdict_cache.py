@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_content(message_content):
+    normalized = unicodedata.normalize("NFKC", message_content).casefold()
+    return " ".join(normalized.split())
+
+
+def content_key(message_content, lenient):
+    digest = hashlib.blake2b(normalize_content(message_content).encode("utf-8"), digest_size=16).digest()
+    return digest, bool(lenient)
+
+
+class VerdictCache:
+    """Bounded LRU + TTL cache of moderation verdicts keyed on normalized content.
+
+    Identical messages that arrive while a verdict is still being computed
+    share the pending computation instead of starting their own.
+    Only fixed-size digests are stored, so memory stays bounded by
+    ``max_entries`` no matter how long the cached messages are.
+    """
+
+    def __init__(self, *, max_entries=50_000, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    async def get_or_compute(self, message_content, lenient, compute):
+        key = content_key(message_content, lenient)
+        entry = self._entries.get(key)
+        if entry is not None:
+            verdict, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return verdict
+            del self._entries[key]
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        generation = self._generation
+        pending = asyncio.ensure_future(compute())
+        self._in_flight[key] = pending
+        # Settle from a callback so the verdict is still cached if every waiter gave up on it.
+        pending.add_done_callback(lambda done: self._settle(key, done, generation))
+        return await asyncio.shield(pending)
+
+    def _settle(self, key, pending, generation):
+        if self._in_flight.get(key) is pending:
+            del self._in_flight[key]
+        if pending.cancelled() or pending.exception() is not None:
+            return
+        # A verdict computed before an invalidation may already be stale.
+        if generation == self._generation:
+            self._store(key, pending.result())
+
+    def _store(self, key, verdict):
+        self._entries[key] = (verdict, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self):
+        self._entries.clear()
+        self._in_flight.clear()
+        self._generation += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses + self.coalesced
+        if not lookups:
+            return None
+        return (self.hits + self.coalesced) / lookups
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate(),
+        }
@@ -0,0 +1,71 @@
+from collections import deque
+
+
+class WhitelistMatcher:
+    """Aho-Corasick index over the whitelisted phrases.
+
+    The automaton is rebuilt only when the phrase set changes; matching a
+    message is a single pass over its characters regardless of how many
+    phrases are whitelisted.
+    """
+
+    def __init__(self, phrases=()):
+        self.phrases = frozenset()
+        self._automaton = ([{}], [0], [False])
+        self._matches_everything = False
+        self.rebuild(phrases)
+
+    def rebuild(self, phrases):
+        phrases = frozenset(phrases)
+        automaton = self._build(phrase for phrase in phrases if phrase)
+        # Swap all state in one go so concurrent readers never see a half-built index.
+        self._automaton = automaton
+        self._matches_everything = "" in phrases
+        self.phrases = phrases
+
+    def matches(self, text):
+        if self._matches_everything:
+            return True
+        goto, fail, output = self._automaton
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
+
+    def __len__(self):
+        return len(self.phrases)
+
+    @staticmethod
+    def _build(phrases):
+        goto = [{}]
+        output = [False]
+        for phrase in phrases:
+            state = 0
+            for char in phrase:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append(False)
+                state = next_state
+            output[state] = True
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                if fail[next_state] == next_state:
+                    fail[next_state] = 0
+                output[next_state] = output[next_state] or output[fail[next_state]]
+        return goto, fail, output